@@ -66,6 +66,22 @@ def create_app(config_class=Config):
     from app.database.db_pool import init_pool
     init_pool(app)
 
+    # Cola de trabajos en segundo plano (compare, transferencias, aplicar soluciones)
+    from app.utils.job_queue import init_job_queue
+    init_job_queue(app)
+
+    # Procesos para las comparaciones binarias grandes (fuera del GIL del servidor web)
+    from app.utils.process_pool import init_process_pool
+    init_process_pool(app)
+
+    # Caché de resultados de compatibilidad (ORI2 vs ORI1 por hash de contenido)
+    from app.utils.compatibility_cache import compatibility_cache
+    compatibility_cache.configure(app.config.get('COMPATIBILITY_CACHE_SIZE', 1024))
+
+    # Cargar el catálogo de dropdowns una sola vez (se recarga si cambia el XLSX)
+    from app.database.dropdown_catalog import init_catalog
+    init_catalog(app)
+
     # Verificar conectividad S3 una sola vez al arrancar (solo en producción)
     if app.config.get('STORAGE_TYPE') == 's3':
         with app.app_context():
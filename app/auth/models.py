@@ -119,8 +119,8 @@ class SupabaseUser(UserMixin):
             if not access_token:
                 return None
             
-            # Obtener usuario usando el cliente de auth
-            user_data = supabase_auth.get_user(access_token)
+            # Obtener usuario (validación local del token + caché)
+            user_data = supabase_auth.get_cached_user(access_token)
             
             if user_data and user_data.get('id') == user_id:
                 return SupabaseUser(user_data)
@@ -1,5 +1,6 @@
 from supabase import create_client, Client
 from flask import current_app, session
+from app.auth.user_cache import user_cache, token_expiry
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,6 +11,7 @@ class SupabaseAuthClient:
     def __init__(self):
         self.supabase: Client = None
         self.service_supabase: Client = None
+        self.jwt_secret = None
         
     def init_app(self, app):
         """Inicializar cliente Supabase"""
@@ -26,6 +28,13 @@ class SupabaseAuthClient:
                 app.config['SUPABASE_SERVICE_ROLE_KEY']
             )
             
+            # Validación local de tokens y caché de usuarios
+            self.jwt_secret = app.config.get('SUPABASE_JWT_SECRET')
+            user_cache.configure(
+                app.config.get('USER_CACHE_SIZE', 1024),
+                app.config.get('USER_CACHE_TTL', 300)
+            )
+            
             logger.info("Supabase auth client initialized successfully")
             
         except Exception as e:
@@ -100,6 +109,26 @@ class SupabaseAuthClient:
             logger.error(f"Error getting user: {e}")
             return None
     
+    def get_cached_user(self, access_token=None):
+        """Obtener usuario actual validando el token localmente y usando la caché"""
+        token = access_token or session.get('access_token')
+        if not token:
+            return None
+        
+        user_data = user_cache.get(token)
+        if user_data is not None:
+            return user_data
+        
+        # Token caducado o con firma inválida: no hace falta preguntar a Supabase
+        expires_at = token_expiry(token, self.jwt_secret)
+        if expires_at is None:
+            return None
+        
+        user_data = self.get_user(token)
+        if user_data:
+            user_cache.set(token, user_data, expires_at)
+        return user_data
+    
     def get_user_by_id(self, user_id):
         """Obtener usuario por ID usando service client"""
         try:
@@ -124,6 +153,7 @@ class SupabaseAuthClient:
             response = self.supabase.auth.refresh_session(refresh_token)
             
             if response and response.session:
+                user_cache.invalidate(session.get('access_token'))
                 # Actualizar tokens en sesión
                 session['access_token'] = response.session.access_token
                 session['refresh_token'] = response.session.refresh_token
@@ -137,6 +167,9 @@ class SupabaseAuthClient:
     
     def sign_out(self):
         """Cerrar sesión"""
+        # El token deja de ser válido aunque Supabase no responda
+        user_cache.invalidate(session.get('access_token'))
+        
         try:
             # Cerrar sesión en Supabase
             self.supabase.auth.sign_out()
@@ -0,0 +1,114 @@
+"""
+Caché local de usuarios autenticados con Supabase.
+
+Evita una llamada HTTP a Supabase en cada request autenticado:
+- Los tokens de acceso (JWT) se validan localmente (firma HS256 + exp) cuando
+  hay SUPABASE_JWT_SECRET configurado; si no, solo se comprueba exp y la firma
+  la valida Supabase la primera vez que se ve el token
+- Los datos del usuario se guardan en una caché LRU acotada, con TTL, indexada
+  por el hash SHA-256 del token (el token en claro nunca se guarda)
+- Una entrada nunca sobrevive a la expiración del propio token
+"""
+
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+
+def token_expiry(access_token, jwt_secret=None):
+    """
+    Validar el token localmente y devolver su expiración
+
+    Args:
+        access_token (str): JWT de acceso de Supabase
+        jwt_secret (str): Secreto JWT del proyecto (opcional)
+
+    Returns:
+        float: Timestamp de expiración, o None si el token no es válido
+    """
+    try:
+        header = jwt.get_unverified_header(access_token)
+        if jwt_secret and header.get('alg') == 'HS256':
+            # Firma y exp verificadas sin salir del proceso
+            claims = jwt.decode(
+                access_token, jwt_secret, algorithms=['HS256'],
+                options={'verify_aud': False, 'require': ['exp']}
+            )
+        else:
+            # Sin secreto (o claves asimétricas): solo exp; la firma la valida Supabase
+            claims = jwt.decode(access_token, options={'verify_signature': False, 'require': ['exp']})
+            if claims['exp'] <= time.time():
+                return None
+        return float(claims['exp'])
+    except jwt.InvalidTokenError as e:
+        logger.info(f"Access token rejected locally: {e}")
+        return None
+
+
+class UserCache:
+    """Caché LRU con TTL de datos de usuario, indexada por hash de token"""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_size, ttl):
+        with self._lock:
+            self.max_size = max_size
+            self.ttl = ttl
+            self._entries.clear()
+
+    @staticmethod
+    def _key(access_token):
+        return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+    def get(self, access_token):
+        """Devolver los datos de usuario cacheados, o None si no hay entrada válida"""
+        key = self._key(access_token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user_data, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user_data
+
+    def set(self, access_token, user_data, token_expires_at=None):
+        """Guardar datos de usuario hasta el TTL o la expiración del token (lo que llegue antes)"""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+
+        key = self._key(access_token)
+        with self._lock:
+            self._entries[key] = (user_data, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, access_token):
+        if not access_token:
+            return
+        with self._lock:
+            self._entries.pop(self._key(access_token), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Instancia global (por proceso)
+user_cache = UserCache()
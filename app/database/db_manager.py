@@ -22,7 +22,7 @@ import os
 import logging
 from typing import Optional, List, Dict, Any, Union, Tuple
 from flask import current_app
-import pandas as pd
+from app.database.dropdown_catalog import get_catalog
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -387,16 +387,7 @@ class DatabaseManager:
             return None
 
     def get_field_values(self, field_name, filters=None):
-        df = pd.read_excel('app/static/Dropdowninfo.xlsx')
-        df.columns = [c.strip().lower() for c in df.columns]
-        if field_name not in df.columns:
-            return []
-        if field_name != 'vehicle_type' and filters:
-            for key, value in filters.items():
-                if key in df.columns and value:
-                    df = df[df[key] == value]
-        values = df[field_name].dropna().unique().tolist()
-        return values
+        return get_catalog().get_field_values(field_name, filters)
 
     def get_child_fields(self, parent_field: str) -> List[str]:
         """
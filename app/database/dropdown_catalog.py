@@ -0,0 +1,223 @@
+"""
+In-memory catalog of the vehicle dropdown values.
+
+The workbook in ``app/static/Dropdowninfo.xlsx`` is parsed once and kept as a
+set of lookup indexes:
+
+- per field: the distinct values of the column, in workbook order
+- per (field, value): the rows holding that value, used to resolve the
+  cascading ``parent_field``/``parent_value`` filters
+- per (cascade, selection): the pruned tree of the cascading selects, so the
+  browser can fill every level from a single response
+
+The file's mtime is checked on every lookup and the workbook is re-parsed
+when it changes, so editing the spreadsheet does not require a restart.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from typing import Optional, List, Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'Dropdowninfo.xlsx'
+)
+
+# Field that is always listed in full, whatever the current selection is
+ROOT_FIELD = 'vehicle_type'
+
+# Cascade of the vehicle selects (same order as searchAOrder in static/js/main.js)
+CASCADE_FIELDS = ('vehicle_type', 'make', 'model', 'engine', 'ecu_type')
+
+
+class _CatalogSnapshot:
+    """Immutable set of indexes built from one version of the workbook."""
+
+    def __init__(self, df: pd.DataFrame, mtime: float):
+        self.mtime = mtime
+        self.columns: Dict[str, List[Any]] = {}
+        self.values: Dict[str, Tuple[Any, ...]] = {}
+        self.rows: Dict[Tuple[str, Any], np.ndarray] = {}
+        self.filtered: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], Tuple[Any, ...]] = {}
+        self.trees: Dict[Tuple[Tuple[str, ...], Tuple[Tuple[str, Any], ...]], list] = {}
+
+        for column in df.columns:
+            cells = df[column].tolist()
+            present = df[column].notna().tolist()
+            self.columns[column] = cells
+
+            positions: Dict[Any, List[int]] = {}
+            for row, (value, is_present) in enumerate(zip(cells, present)):
+                if is_present:
+                    positions.setdefault(value, []).append(row)
+
+            self.values[column] = tuple(positions)
+            for value, value_rows in positions.items():
+                self.rows[(column, value)] = np.asarray(value_rows, dtype=np.int64)
+
+    def lookup(self, field_name: str, filters: Tuple[Tuple[str, Any], ...]) -> Tuple[Any, ...]:
+        if not filters:
+            return self.values[field_name]
+
+        key = (field_name, filters)
+        cached = self.filtered.get(key)
+        if cached is not None:
+            return cached
+
+        selected = None
+        for column, value in filters:
+            try:
+                value_rows = self.rows.get((column, value))
+            except TypeError:
+                value_rows = None
+            if value_rows is None:
+                # Unknown value: nothing matches, and it is not worth caching
+                return ()
+            selected = value_rows if selected is None else np.intersect1d(selected, value_rows, assume_unique=True)
+
+        cells = self.columns[field_name]
+        result = tuple(dict.fromkeys(
+            cells[row] for row in selected.tolist() if not pd.isna(cells[row])
+        ))
+        self.filtered[key] = result
+        return result
+
+    def tree(self, fields: Tuple[str, ...], selection: Tuple[Tuple[str, Any], ...]) -> list:
+        key = (fields, selection)
+        cached = self.trees.get(key)
+        if cached is not None:
+            return cached
+
+        selected = dict(selection)
+        result = self._build_tree(fields, selected, range(len(self.columns[fields[0]])))
+
+        # Only selections made of known values are cached, so the cache stays bounded
+        if all((column, value) in self.rows for column, value in selection):
+            self.trees[key] = result
+        return result
+
+    def _build_tree(self, fields: Tuple[str, ...], selected: Dict[str, Any], rows) -> list:
+        field_name = fields[0]
+        cells = self.columns[field_name]
+
+        groups: Dict[Any, List[int]] = {}
+        for row in rows:
+            value = cells[row]
+            if pd.isna(value):
+                continue
+            if field_name in selected and value != selected[field_name]:
+                continue
+            groups.setdefault(value, []).append(row)
+
+        if len(fields) == 1:
+            return list(groups)
+        return [[value, self._build_tree(fields[1:], selected, value_rows)] for value, value_rows in groups.items()]
+
+
+class DropdownCatalog:
+    """Thread-safe, mtime-aware access to the dropdown workbook."""
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_CatalogSnapshot] = None
+
+    def _load(self, mtime: float) -> None:
+        df = pd.read_excel(self.path)
+        df.columns = [str(c).strip().lower() for c in df.columns]
+        self._snapshot = _CatalogSnapshot(df, mtime)
+        logger.info(f"Dropdown catalog loaded from {self.path} ({len(df)} rows, mtime={mtime})")
+
+    def _current(self) -> Optional[_CatalogSnapshot]:
+        snapshot = self._snapshot
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            if snapshot is None:
+                logger.error(f"Dropdown catalog not available: {e}")
+            return snapshot
+
+        if snapshot is not None and snapshot.mtime == mtime:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or self._snapshot.mtime != mtime:
+                try:
+                    self._load(mtime)
+                except Exception as e:
+                    # Keep serving the previous version if the new one cannot be parsed
+                    logger.error(f"Error loading dropdown catalog: {e}")
+            return self._snapshot
+
+    def get_field_values(self, field_name: str, filters: Optional[Dict[str, Any]] = None) -> List[Any]:
+        snapshot = self._current()
+        if snapshot is None or field_name not in snapshot.columns:
+            return []
+
+        active = ()
+        if field_name != ROOT_FIELD and filters:
+            active = tuple(sorted(
+                (key, value) for key, value in filters.items()
+                if key in snapshot.columns and value
+            ))
+
+        return list(snapshot.lookup(field_name, active))
+
+    def _tree_request(self, fields, selection):
+        snapshot = self._current()
+        fields = tuple(fields)
+        if snapshot is None or not fields or any(f not in snapshot.columns for f in fields):
+            return None
+
+        active = tuple(sorted(
+            (key, value) for key, value in (selection or {}).items()
+            if key in fields and value
+        ))
+
+        # The tree only depends on the workbook version and the request, so the
+        # validator is computed without building or serializing the tree
+        etag = hashlib.sha1(repr((self.path, snapshot.mtime, fields, active)).encode('utf-8')).hexdigest()
+        return snapshot, fields, active, etag
+
+    def get_tree_etag(self, fields=CASCADE_FIELDS, selection: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        request = self._tree_request(fields, selection)
+        return request[3] if request else None
+
+    def get_tree(self, fields=CASCADE_FIELDS, selection: Optional[Dict[str, Any]] = None) -> Optional[Tuple[list, str]]:
+        """
+        Return the cascade ``fields`` as a tree pruned to ``selection``, plus its ETag.
+
+        Each level is a list of ``[value, children]`` pairs and the last level a
+        plain list of values. A selected field keeps only the selected value, so
+        the tree holds exactly the options reachable from the partial selection.
+        Returns None if the catalog is unavailable or a field is unknown.
+        """
+        request = self._tree_request(fields, selection)
+        if request is None:
+            return None
+        snapshot, fields, active, etag = request
+        return snapshot.tree(fields, active), etag
+
+
+_catalog: Optional[DropdownCatalog] = None
+
+
+def init_catalog(app) -> DropdownCatalog:
+    """Create the process-wide catalog and parse the workbook up front."""
+    global _catalog
+    _catalog = DropdownCatalog(os.path.join(app.root_path, 'static', 'Dropdowninfo.xlsx'))
+    _catalog._current()
+    return _catalog
+
+
+def get_catalog() -> DropdownCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = DropdownCatalog()
+    return _catalog
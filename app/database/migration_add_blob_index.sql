@@ -0,0 +1,17 @@
+-- Migration: content index of stored blobs (4 KB block hashes) for ORI2 -> ORI1 lookups
+-- Run once against existing databases (dev and production)
+-- Existing ORI1 blobs are indexed the next time they are compared with an ORI2
+CREATE TABLE IF NOT EXISTS blob_signatures (
+    sha256 CHAR(64) PRIMARY KEY REFERENCES file_blobs(sha256) ON DELETE CASCADE,
+    block_size INTEGER NOT NULL,
+    block_count INTEGER NOT NULL,
+    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS blob_block_hashes (
+    block_hash BIGINT NOT NULL,
+    sha256 CHAR(64) NOT NULL REFERENCES blob_signatures(sha256) ON DELETE CASCADE,
+    PRIMARY KEY (block_hash, sha256)
+);
+
+CREATE INDEX IF NOT EXISTS idx_blob_block_hashes_sha256 ON blob_block_hashes(sha256);
@@ -0,0 +1,12 @@
+-- Migration: memoized ORI2 vs ORI1 compatibility results
+-- Run once against existing databases (dev and production)
+CREATE TABLE IF NOT EXISTS compatibility_results (
+    ori2_sha256 CHAR(64) NOT NULL,
+    ori1_sha256 CHAR(64) NOT NULL,
+    bit_size SMALLINT NOT NULL,
+    threshold REAL NOT NULL,
+    early_exit VARCHAR(10) NOT NULL,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ori2_sha256, ori1_sha256, bit_size, threshold, early_exit)
+);
@@ -0,0 +1,12 @@
+-- Migration: content-addressed file blobs with reference counting
+-- Run once against existing databases (dev and production)
+-- Existing files keep their per-solution keys and a NULL sha256
+ALTER TABLE file_metadata ADD COLUMN IF NOT EXISTS sha256 CHAR(64);
+CREATE TABLE IF NOT EXISTS file_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    s3_key VARCHAR(500) NOT NULL,
+    file_size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_file_metadata_sha256 ON file_metadata(sha256);
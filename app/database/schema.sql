@@ -10,6 +10,9 @@ $$ LANGUAGE plpgsql;
 -- LIMPIAR TABLAS PROBLEMÁTICAS ANTES DE RECREAR
 DROP TABLE IF EXISTS solution_types CASCADE;
 DROP TABLE IF EXISTS file_metadata CASCADE;
+DROP TABLE IF EXISTS blob_block_hashes CASCADE;
+DROP TABLE IF EXISTS blob_signatures CASCADE;
+DROP TABLE IF EXISTS file_blobs CASCADE;
 DROP TABLE IF EXISTS differences_metadata CASCADE;
 DROP TABLE IF EXISTS solutions CASCADE;
 
@@ -96,11 +99,35 @@ CREATE TABLE file_metadata (
     file_name VARCHAR(255) NOT NULL,
     file_size INTEGER NOT NULL,
     s3_key VARCHAR(500) NOT NULL, -- Ruta en S3
+    sha256 CHAR(64), -- Hash del contenido (blob en file_blobs); NULL en archivos antiguos
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (solution_id) REFERENCES solutions(id) ON DELETE CASCADE,
     UNIQUE(solution_id, file_type)
 );
 
+-- Blobs direccionados por contenido: un objeto por SHA-256, compartido entre soluciones
+CREATE TABLE IF NOT EXISTS file_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    s3_key VARCHAR(500) NOT NULL, -- blobs/{sha[:2]}/{sha256}
+    file_size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0, -- Filas de file_metadata que lo referencian
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Índice de contenido de los blobs (hashes de bloques de 4 KB) para encontrar ORI1 casi idénticos
+CREATE TABLE IF NOT EXISTS blob_signatures (
+    sha256 CHAR(64) PRIMARY KEY REFERENCES file_blobs(sha256) ON DELETE CASCADE,
+    block_size INTEGER NOT NULL,
+    block_count INTEGER NOT NULL, -- Bloques distintos indexados (sin los de un solo byte repetido)
+    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS blob_block_hashes (
+    block_hash BIGINT NOT NULL,
+    sha256 CHAR(64) NOT NULL REFERENCES blob_signatures(sha256) ON DELETE CASCADE,
+    PRIMARY KEY (block_hash, sha256)
+);
+
 -- CAMBIO: solution_id ahora es INTEGER
 CREATE TABLE differences_metadata (
     id SERIAL PRIMARY KEY,
@@ -112,6 +139,32 @@ CREATE TABLE differences_metadata (
     UNIQUE(solution_id)
 );
 
+-- Resultados de compatibilidad memoizados: (hash ORI2, hash ORI1, bit size, umbral, modo de salida anticipada) -> resultado
+CREATE TABLE IF NOT EXISTS compatibility_results (
+    ori2_sha256 CHAR(64) NOT NULL,
+    ori1_sha256 CHAR(64) NOT NULL,
+    bit_size SMALLINT NOT NULL,
+    threshold REAL NOT NULL,
+    early_exit VARCHAR(10) NOT NULL,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ori2_sha256, ori1_sha256, bit_size, threshold, early_exit)
+);
+
+-- Trabajos en segundo plano (compare, transferencias, compatibilidad, MOD2)
+CREATE TABLE IF NOT EXISTS jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'succeeded', 'failed'
+    params JSONB,
+    result JSONB,
+    error TEXT,
+    created_by TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
 -- ELIMINAR TABLAS DE ALMACENAMIENTO DE ARCHIVOS (si existen)
 DROP TABLE IF EXISTS file_differences;
 DROP TABLE IF EXISTS file_storage;
@@ -120,7 +173,10 @@ DROP TABLE IF EXISTS ori1_files;
 -- Índices para las nuevas tablas de metadatos
 CREATE INDEX IF NOT EXISTS idx_file_metadata_solution ON file_metadata(solution_id);
 CREATE INDEX IF NOT EXISTS idx_file_metadata_solution_type ON file_metadata(solution_id, file_type);
+CREATE INDEX IF NOT EXISTS idx_file_metadata_sha256 ON file_metadata(sha256);
+CREATE INDEX IF NOT EXISTS idx_blob_block_hashes_sha256 ON blob_block_hashes(sha256);
 CREATE INDEX IF NOT EXISTS idx_differences_metadata_solution ON differences_metadata(solution_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_by ON jobs(created_by, created_at);
 
 -- Eliminar triggers existentes antes de recrear
 DROP TRIGGER IF EXISTS update_users_timestamp ON users;
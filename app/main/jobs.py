@@ -0,0 +1,525 @@
+"""
+Background jobs of the main blueprint.
+
+Each slow step of the add-solution and apply-solution workflows runs as a
+job (see app.utils.job_queue):
+- compare: ORI1 vs MOD1 comparison and temp upload of both files
+- store_solution: transfer of ORI1/MOD1 and storage of the differences
+- compatibility: ORI2 vs ORI1 similarity check before applying
+- compatibility_scan: ORI2 ranked against every solution of a search
+- apply: MOD2 generation and upload
+
+Handlers only receive JSON parameters, so whatever they need from the
+session is passed in by the route. Their results are applied back to the
+session by the matching finisher once the browser reaches
+/jobs/<job_id>/complete.
+"""
+
+import os
+import time
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, session, flash, redirect, url_for
+from app.database.db_manager import DatabaseManager
+from app.utils.binary_handler import BinaryHandler, MAX_INCOMPATIBLE_POINTS
+from app.utils.diff_engine import DTYPE_MAP, PatchSet, PatchRegion, iter_regions, write_regions, read_regions
+from app.utils.blob_store import hash_file, get_file_sha256
+from app.utils.compatibility_cache import compatibility_cache
+from app.utils.content_index import is_indexed, index_blob
+from app.utils.job_queue import job_handler, JobError, JOB_SUCCEEDED
+from app.utils.storage_factory import get_file_storage
+
+logger = logging.getLogger(__name__)
+
+# Título mostrado en la página de espera de cada tipo de trabajo
+JOB_TITLES = {
+    'compare': 'Comparing files',
+    'store_solution': 'Saving solution files',
+    'compatibility': 'Checking compatibility',
+    'compatibility_scan': 'Scanning solutions',
+    'apply': 'Applying solution'
+}
+
+
+@job_handler('compare')
+def run_compare(params):
+    """Comparar ORI1 vs MOD1 y subir ambos archivos con un temp_solution_id"""
+    bit_size = params['bit_size']
+    ori1_info = params['ori1']
+    mod1_info = params['mod1']
+
+    binary_handler = BinaryHandler()
+    binary_handler.set_read_size(bit_size)
+
+    # Comparar por bloques y escribir las regiones según se generan, sin
+    # reunir todas las diferencias en memoria
+    logger.info(f"Comparing files: {ori1_info['temp_path']} vs {mod1_info['temp_path']} with {bit_size}-bit size")
+    filename = f"differences_{int(time.time() * 1000000)}.bin"
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    differences = binary_handler.iter_file_differences(ori1_info['temp_path'], mod1_info['temp_path'])
+    with open(filepath, 'wb') as f:
+        _, total_differences = write_regions(f, iter_regions(differences), bit_size)
+
+    # Subir archivos temporales al storage para que puedan ser transferidos posteriormente;
+    # la deduplicación contra blobs existentes se hace al transferirlos
+    temp_solution_id = f"temp_{int(time.time())}"
+    storage = get_file_storage()
+
+    stored_files = {}
+    for file_type, file_info in (('ori1', ori1_info), ('mod1', mod1_info)):
+        sha256 = hash_file(file_info['temp_path'])
+        with open(file_info['temp_path'], 'rb') as f:
+            stored = storage.store_stream(temp_solution_id, file_type, file_info['filename'], f, sha256=sha256)
+        if stored:
+            stored_files[file_type] = {'file_key': stored['key'], 'sha256': stored['sha256']}
+        else:
+            logger.error(f"Failed to upload {file_type.upper()} to storage with temp ID {temp_solution_id}")
+    logger.info(f"📁 Archivos subidos temporalmente con ID: {temp_solution_id}")
+
+    # Limpiar archivos temporales del disco local
+    temp_dir = params.get('temp_dir')
+    if temp_dir and os.path.exists(temp_dir):
+        try:
+            shutil.rmtree(temp_dir)
+            logger.info(f"🧹 Limpieza de directorio temporal: {temp_dir}")
+        except Exception as e:
+            logger.warning(f"Error cleaning up temp directory: {e}")
+
+    return {
+        'bit_size': bit_size,
+        'temp_solution_id': temp_solution_id,
+        'differences_file': filename,
+        'total_differences': total_differences,
+        'files': stored_files
+    }
+
+
+@job_handler('store_solution')
+def run_store_solution(params):
+    """Transferir ORI1 + MOD1 a la solución y guardar sus diferencias"""
+    solution_id = params['solution_id']
+    temp_solution_id = params.get('temp_solution_id')
+    storage = get_file_storage()
+
+    # TRANSFERIR ORI1 + MOD1 PERMANENTEMENTE para trazabilidad completa
+    if temp_solution_id:
+        logger.info(f"🔄 Iniciando transferencia de ORI1 + MOD1 permanente: {temp_solution_id} -> {solution_id}")
+        if storage.transfer_temp_files(temp_solution_id, solution_id, files=params.get('files')):
+            logger.info(f"✅ ORI1 + MOD1 transferred permanently from {temp_solution_id} to {solution_id}")
+            index_ori1(storage, solution_id)
+        else:
+            logger.error(f"❌ Failed to transfer ORI1 + MOD1 from {temp_solution_id} to {solution_id}")
+    else:
+        logger.warning(f"⚠️ No temp_solution_id found in session - ORI1 + MOD1 no se transferirán")
+
+    filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], params['differences_file'])
+    try:
+        bit_size, regions = read_regions(open(filepath, 'rb'), close=True)
+    except (FileNotFoundError, ValueError):
+        raise JobError('Solution saved, but its comparison data was missing. Please regenerate its differences.')
+
+    # Guardar diferencias (regiones) en el storage según se leen
+    total_differences = storage.store_differences_stream(solution_id, regions, bit_size)
+    if total_differences is None:
+        raise JobError('Solution saved, but its differences could not be stored. Please regenerate its differences.')
+    logger.info(f"Differences stored for solution {solution_id}")
+
+    try:
+        os.remove(filepath)
+    except OSError:
+        pass
+
+    return {'solution_id': solution_id, 'total_differences': total_differences}
+
+
+def index_ori1(storage, solution_id, ori1_sha256=None, ori1_file_data=None):
+    """Añadir el ORI1 de la solución al índice de contenido si aún no está indexado"""
+    ori1_sha256 = ori1_sha256 or get_file_sha256(solution_id, 'ori1')
+    if not ori1_sha256 or is_indexed(ori1_sha256):
+        return
+    if ori1_file_data is None:
+        _, ori1_file_data = storage.get_file_view(solution_id, 'ori1')
+    if ori1_file_data:
+        index_blob(ori1_sha256, ori1_file_data)
+
+
+def check_similarity(storage, solution_id, ori2_info, bit_size, ori2_file_data=None):
+    """
+    Compare the user's ORI2 with the solution's ORI1, memoized by content hash.
+
+    A repeat check of the same ORI2 against an ORI1 with the same content
+    (and bit size, threshold and early-exit mode) is answered from the
+    compatibility cache without downloading either file. ORI1 files stored
+    before content hashing have no hash and are always compared.
+
+    The comparison stops early once the similarity cannot reach
+    COMPATIBILITY_MIN_SIMILARITY (the low-compatibility limit of the
+    confirmation page); such results carry ``early_exit`` and the bounds.
+
+    ``ori2_file_data`` lets a caller checking several solutions download the
+    ORI2 only once.
+
+    Raises:
+        JobError: If one of the files cannot be read
+    """
+    ori2_sha256 = ori2_info.get('sha256')
+    ori1_sha256 = get_file_sha256(solution_id, 'ori1') if ori2_sha256 else None
+    threshold = current_app.config.get('COMPATIBILITY_MIN_SIMILARITY', 70)
+
+    if ori1_sha256:
+        cached = compatibility_cache.get(ori2_sha256, ori1_sha256, bit_size, threshold, 'below')
+        if cached:
+            logger.info(f"Compatibility of ORI2 {ori2_sha256[:12]} with solution {solution_id} served from cache")
+            return cached
+
+    if ori2_file_data is None:
+        _, ori2_file_data = storage.get_file_view(ori2_info['solution_id'], 'ori2', ori2_info.get('file_key'))
+    if not ori2_file_data:
+        raise JobError('Error retrieving ORI2 file from storage')
+
+    _, ori1_file_data = storage.get_file_view(solution_id, 'ori1')
+    if not ori1_file_data:
+        logger.error(f"ORI1 file not found for solution {solution_id}")
+        raise JobError(f'Esta solución (ID: {solution_id}) no tiene archivo ORI1 disponible. Por favor, selecciona una solución diferente o contacta al administrador para que complete esta solución.')
+
+    # ORI1 guardados antes del índice de contenido se indexan al descargarlos
+    if ori1_sha256:
+        index_ori1(storage, solution_id, ori1_sha256, ori1_file_data)
+
+    # Calcular compatibilidad comparando ORI2 vs ORI1 directamente
+    binary_handler = BinaryHandler()
+    binary_handler.set_read_size(bit_size)
+
+    ori2_data = binary_handler.parse_bytes(ori2_file_data)
+    ori1_data = binary_handler.parse_bytes(ori1_file_data)
+
+    compatibility_result = binary_handler.calculate_similarity(
+        ori2_data, ori1_data,
+        threshold=threshold, early_exit='below'
+    )
+
+    # Mapear campos de similarity a formato de compatibility esperado por el template
+    compatibility_result['compatibility_percentage'] = compatibility_result['similarity_percentage']
+    compatibility_result['matching_points'] = compatibility_result['identical_bytes']
+    compatibility_result['total_points'] = compatibility_result['total_bytes']
+    compatibility_result['incompatible_points'] = []
+    compatibility_result['analysis_type'] = 'similarity_based'
+    compatibility_result['ori2_file_size'] = len(ori2_file_data)
+
+    # calculate_similarity reports errors as an all-zero result: never cache those
+    if ori1_sha256 and compatibility_result['total_bytes']:
+        compatibility_cache.set(ori2_sha256, ori1_sha256, bit_size, threshold, 'below', compatibility_result)
+
+    return compatibility_result
+
+
+def _solution_info(solution):
+    """Campos de la solución mostrados junto a un resultado de compatibilidad"""
+    return {
+        'id': solution['id'],
+        'vehicle_type': solution['vehicle_type'],
+        'make': solution['make'],
+        'model': solution['model'],
+        'engine': solution['engine'],
+        'year': solution['year'],
+        'ecu_type': solution['ecu_type'],
+        'hardware_number': solution['hardware_number'],
+        'software_number': solution['software_number']
+    }
+
+
+@job_handler('compatibility')
+def run_compatibility(params):
+    """Calcular la compatibilidad del ORI2 del usuario con el ORI1 de la solución"""
+    solution_id = params['solution_id']
+    ori2_info = params['ori2']
+
+    storage = get_file_storage()
+    # Solo hace falta el bit size y el total, no las regiones
+    bit_size, total_differences = storage.get_differences_info(solution_id)
+
+    if not bit_size or not total_differences:
+        logger.warning(f"No differences found for solution {solution_id}")
+        raise JobError(f'No differences found for solution {solution_id}. This solution may not have been created through the complete comparison process. Please contact the administrator to regenerate the differences for this solution.')
+
+    compatibility_result = check_similarity(storage, solution_id, ori2_info, bit_size)
+    ori2_filename = ori2_info.get('filename')
+
+    solution = DatabaseManager().get_solution_by_id(solution_id)
+    if not solution:
+        logger.error(f"Solution {solution_id} not found in database")
+        raise JobError(f'Solution {solution_id} not found in database')
+
+    logger.info(f"Compatibility result for solution {solution_id}: {compatibility_result['compatibility_percentage']}%")
+
+    return {
+        'solution_id': solution_id,
+        'compatibility_result': compatibility_result,
+        'solution_info': _solution_info(solution),
+        'analysis_details': {
+            'total_differences': total_differences,
+            'ori2_filename': ori2_filename
+        }
+    }
+
+
+def _read_sample(regions, bit_size, total_points, max_points):
+    """
+    Up to ``max_points`` difference points spread evenly over a region stream
+    of ``total_points`` points; True if some were left out.
+    """
+    bytes_per_value = bit_size // 8
+    sample = []
+    try:
+        if total_points <= max_points:
+            return list(regions), False
+
+        step = total_points / max_points
+        taken = 0
+        position = 0
+        for region in regions:
+            count = region.length // bytes_per_value
+            while taken < max_points:
+                index = int(taken * step)
+                if index >= position + count:
+                    break
+                start = (index - position) * bytes_per_value
+                end = start + bytes_per_value
+                sample.append(PatchRegion(region.offset + start, region.original[start:end], region.modified[start:end]))
+                taken += 1
+            if taken >= max_points:
+                break
+            position += count
+        return sample, True
+    finally:
+        # Stop the download of the rest of the differences
+        close = getattr(regions, 'close', None)
+        if close:
+            close()
+
+
+def _quick_check(app, storage, solution_id, ori2_arrays, max_points):
+    """
+    First pass of a scan: ORI2 values at ``max_points`` difference points
+    sampled evenly across the solution's differences stream.
+    """
+    with app.app_context():
+        entry = {'solution_id': solution_id, 'similarity_percentage': None, 'error': None}
+
+        solution = DatabaseManager().get_solution_by_id(solution_id)
+        if not solution:
+            entry['error'] = 'Solution not found'
+            return entry
+        entry['solution_info'] = _solution_info(solution)
+
+        _, total_points = storage.get_differences_info(solution_id)
+        opened = storage.open_differences(solution_id) if total_points else None
+        if not opened:
+            entry['error'] = 'No differences stored'
+            return entry
+        bit_size, regions = opened
+
+        try:
+            sample, sampled = _read_sample(regions, bit_size, total_points, max_points)
+        except ValueError as e:
+            logger.error(f"Error reading differences of solution {solution_id}: {e}")
+            entry['error'] = 'Differences data is corrupted'
+            return entry
+        if not sample:
+            entry['error'] = 'No differences stored'
+            return entry
+
+        binary_handler = BinaryHandler()
+        binary_handler.set_read_size(bit_size)
+        result = binary_handler.calculate_compatibility_from_differences(
+            ori2_arrays[bit_size], PatchSet(sample, bit_size), max_incompatible_points=0
+        )
+
+        entry.update({
+            'bit_size': bit_size,
+            'checked_points': result['total_points'],
+            'sampled': sampled,
+            'differences_percentage': result['compatibility_percentage'],
+            'incompatible_points': result['incompatible_count']
+        })
+        return entry
+
+
+def _full_check(app, storage, entry, ori2_info, ori2_file_data):
+    """Second pass of a scan: whole-file similarity against the solution's ORI1."""
+    with app.app_context():
+        try:
+            result = check_similarity(storage, entry['solution_id'], ori2_info, entry['bit_size'], ori2_file_data)
+            entry['similarity_percentage'] = result['compatibility_percentage']
+            entry['similarity_bounds'] = result.get('similarity_bounds')
+        except JobError as e:
+            entry['error'] = str(e)
+        return entry
+
+
+def _similarity_rank(entry):
+    # Una comparación que paró antes de tiempo solo tiene cotas: se ordena por la superior
+    bounds = entry.get('similarity_bounds')
+    return bounds[1] if bounds else entry['similarity_percentage'] or 0
+
+
+@job_handler('compatibility_scan')
+def run_compatibility_scan(params):
+    """Ordenar las soluciones de una búsqueda por compatibilidad con el ORI2 del usuario"""
+    solution_ids = params['solution_ids']
+    ori2_info = params['ori2']
+    top_k = current_app.config.get('COMPATIBILITY_SCAN_TOP_K', 5)
+    max_workers = current_app.config.get('COMPATIBILITY_SCAN_WORKERS', 4)
+    max_points = current_app.config.get('COMPATIBILITY_SCAN_MAX_POINTS', MAX_INCOMPATIBLE_POINTS)
+    app = current_app._get_current_object()
+
+    storage = get_file_storage()
+    _, ori2_file_data = storage.get_file_view(ori2_info['solution_id'], 'ori2', ori2_info.get('file_key'))
+    if not ori2_file_data:
+        raise JobError('Error retrieving ORI2 file from storage')
+
+    # El ORI2 se descarga y decodifica una sola vez para todas las soluciones
+    ori2_arrays = {bit_size: BinaryHandler().parse_bytes(ori2_file_data, bit_size) for bit_size in DTYPE_MAP}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        entries = list(executor.map(
+            lambda solution_id: _quick_check(app, storage, solution_id, ori2_arrays, max_points), solution_ids
+        ))
+
+        failed = [entry for entry in entries if entry['error']]
+        checked = sorted(
+            (entry for entry in entries if not entry['error']),
+            key=lambda entry: entry['differences_percentage'], reverse=True
+        )
+        top = list(executor.map(
+            lambda entry: _full_check(app, storage, entry, ori2_info, ori2_file_data), checked[:top_k]
+        ))
+
+    top.sort(key=lambda entry: (entry['error'] is None, _similarity_rank(entry),
+                                entry['differences_percentage']), reverse=True)
+    ranking = top + checked[top_k:] + failed
+
+    logger.info(f"Compatibility scan of ORI2 {ori2_info.get('filename')}: {len(checked)}/{len(entries)} solutions checked, "
+                f"full similarity on {len(top)}")
+
+    return {
+        'ori2_filename': ori2_info.get('filename'),
+        'top_k': top_k,
+        'ranking': ranking
+    }
+
+
+@job_handler('apply')
+def run_apply(params):
+    """Generar el MOD2 aplicando las diferencias de la solución al ORI2"""
+    solution_id = params['solution_id']
+    ori2_info = params['ori2']
+    mod2_filename = params['mod2_filename']
+
+    storage = get_file_storage()
+    opened = storage.open_differences(solution_id)
+    if not opened:
+        raise JobError(f'No differences found for solution {solution_id}')
+    bit_size, regions = opened
+
+    ori2_filename, ori2_file_data = storage.get_file_view(ori2_info['solution_id'], 'ori2', ori2_info.get('file_key'))
+    if not ori2_file_data:
+        raise JobError('Error retrieving ORI2 file from storage')
+
+    binary_handler = BinaryHandler()
+    binary_handler.set_read_size(bit_size)
+
+    # Generar MOD2 en memoria (sin archivos temporales), aplicando las
+    # regiones según se descargan
+    mod2_data = binary_handler.apply_differences_to_bytes(ori2_file_data, regions)
+    if mod2_data is None:
+        raise JobError('Error applying solution')
+
+    mod2_key = storage.upload_temp_file(mod2_data, mod2_filename, 'mod2', ori2_info['solution_id'])
+    if not mod2_key:
+        raise JobError('Error storing MOD2 file')
+
+    return {
+        'mod2': {
+            'solution_id': ori2_info['solution_id'],
+            'filename': mod2_filename,
+            'file_key': mod2_key
+        }
+    }
+
+
+def _finish_compare(job):
+    if job['status'] != JOB_SUCCEEDED:
+        flash(f"Error comparing files: {job['error']}", 'danger')
+        return redirect(url_for('main.add_solution'))
+
+    result = job['result']
+    uploaded_files = session.get('uploaded_files', {})
+    for file_type, stored in result['files'].items():
+        if file_type in uploaded_files:
+            uploaded_files[file_type].update(stored)
+
+    session['bit_size'] = result['bit_size']
+    session['temp_solution_id'] = result['temp_solution_id']
+    session['differences_file'] = result['differences_file']
+    session.modified = True
+
+    flash(f"Files compared successfully. {result['total_differences']} differences found.", 'success')
+    return redirect(url_for('main.add_solution'))
+
+
+def _finish_store_solution(job):
+    if job['status'] == JOB_SUCCEEDED:
+        flash('Solution added successfully', 'success')
+    else:
+        flash(job['error'], 'danger')
+    return redirect(url_for('main.solution_detail', solution_id=job['params']['solution_id']))
+
+
+def _finish_compatibility(job):
+    if job['status'] != JOB_SUCCEEDED:
+        flash(job['error'], 'warning')
+        return redirect(url_for('main.modify_file'))
+
+    session['compatibility_check'] = job['result']
+    session.modified = True
+    return redirect(url_for('main.confirm_compatibility'))
+
+
+def _finish_compatibility_scan(job):
+    if job['status'] != JOB_SUCCEEDED:
+        flash(job['error'], 'warning')
+        return redirect(url_for('main.modify_file'))
+    return redirect(url_for('main.compatibility_scan_results', job_id=job['id']))
+
+
+def _finish_apply(job):
+    if job['status'] != JOB_SUCCEEDED:
+        flash(job['error'], 'danger')
+        return redirect(url_for('main.modify_file'))
+
+    if 'files' not in session:
+        session['files'] = {}
+    session['files']['mod2'] = job['result']['mod2']
+
+    # Limpiar datos de compatibilidad de la sesión
+    session.pop('compatibility_check', None)
+    session.modified = True
+
+    flash('Solution applied successfully', 'success')
+    return redirect(url_for('main.choose_mod2_filename'))
+
+
+_FINISHERS = {
+    'compare': _finish_compare,
+    'store_solution': _finish_store_solution,
+    'compatibility': _finish_compatibility,
+    'compatibility_scan': _finish_compatibility_scan,
+    'apply': _finish_apply
+}
+
+
+def finish_job(job):
+    """Aplicar a la sesión el resultado de un trabajo terminado y redirigir al siguiente paso"""
+    return _FINISHERS[job['job_type']](job)
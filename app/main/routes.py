@@ -10,17 +10,25 @@ This module provides the main application routes including:
 
 import os
 import json
+import mmap
 import tempfile
 from flask import render_template, url_for, flash, redirect, request, session, current_app, send_from_directory, make_response, jsonify
 from flask_login import login_required, current_user, logout_user
 from werkzeug.utils import secure_filename
 from app.main import bp
 from app.database.db_manager import DatabaseManager
+from app.database.dropdown_catalog import get_catalog, CASCADE_FIELDS
 from app.utils.binary_handler import BinaryHandler
+from app.utils.diff_engine import PatchSet, read_regions
 from app.utils.storage_factory import get_file_storage
+from app.utils.streams import iter_stream
+from app.utils.blob_store import hash_file
+from app.utils.content_index import find_candidates
+from app.utils.job_queue import get_job_queue, get_job, JOB_SUCCEEDED, JOB_FAILED
+from app.main.jobs import finish_job, JOB_TITLES
 import uuid
 import json
-from flask import send_file
+from flask import send_file, Response
 import io
 
 import logging
@@ -46,6 +54,31 @@ def cleanup_temp_files(session_id):
 
 ALLOWED_EXTENSIONS = {'bin', 'ori', 'mod', 'dtf'}
 
+def enqueue_job(job_type, params):
+    """Queue a background job for the current user and send them to its status page."""
+    job_id = get_job_queue().submit(job_type, params, created_by=str(current_user.id))
+    if not job_id:
+        return None
+    return redirect(url_for('main.job_status', job_id=job_id))
+
+def get_own_job(job_id):
+    """Return the job if it belongs to the current user, None otherwise."""
+    job = get_job(job_id)
+    if not job or job['created_by'] != str(current_user.id):
+        return None
+    return job
+
+def find_ori2_candidates(file_path, sha256):
+    """Solutions whose ORI1 matches the uploaded ORI2 by content (see app.utils.content_index)."""
+    if not os.path.getsize(file_path):
+        return []
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return find_candidates(
+            data, sha256,
+            limit=current_app.config.get('CONTENT_INDEX_MAX_CANDIDATES', 10),
+            min_score=current_app.config.get('CONTENT_INDEX_MIN_SCORE', 0.5)
+        )
+
 def allowed_file(filename):
     """Check if file has an allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -146,9 +179,6 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        file_data = file.read()
-        
-        logger.info(f"Uploading file: {filename} (type: {file_type}, size: {len(file_data)} bytes)")
         
         # OPTIMIZADO: Guardar archivos temporalmente en disco en lugar de sesión
         # Crear directorio temporal único para esta sesión
@@ -161,10 +191,12 @@ def upload_file():
         temp_dir = os.path.join(tempfile.gettempdir(), 'solutionmanager', session['temp_session_id'])
         os.makedirs(temp_dir, exist_ok=True)
         
-        # Guardar archivo en disco temporal
+        # Guardar archivo en disco temporal (en streaming, sin cargarlo entero en memoria)
         temp_file_path = os.path.join(temp_dir, f"{file_type}_{filename}")
-        with open(temp_file_path, 'wb') as f:
-            f.write(file_data)
+        file.save(temp_file_path)
+        file_size = os.path.getsize(temp_file_path)
+        
+        logger.info(f"Uploading file: {filename} (type: {file_type}, size: {file_size} bytes)")
         
         # Guardar solo metadata en sesión (no el archivo completo)
         if 'uploaded_files' not in session:
@@ -173,7 +205,7 @@ def upload_file():
         session['uploaded_files'][file_type] = {
             'filename': filename,
             'temp_path': temp_file_path,
-            'size': len(file_data)
+            'size': file_size
         }
         
         # Mantener compatibilidad con el sistema existente
@@ -188,12 +220,21 @@ def upload_file():
             # Subir archivo ORI2 a S3 con solution_id temporal
             storage = get_file_storage()
             try:
-                if storage.store_file(temp_solution_id, 'ori2', filename, file_data):
+                sha256 = hash_file(temp_file_path)
+                with open(temp_file_path, 'rb') as f:
+                    stored = storage.store_stream(temp_solution_id, 'ori2', filename, f, sha256=sha256)
+                if stored:
                     session['files'][file_type] = {
                         'filename': filename,
-                        'solution_id': temp_solution_id
+                        'solution_id': temp_solution_id,
+                        'file_key': stored['key'],
+                        'sha256': stored['sha256']
                     }
                     logger.info(f"✅ ORI2 uploaded to S3 with temp solution_id: {temp_solution_id}")
+                    
+                    # Proponer soluciones cuyo ORI1 coincide por contenido, sin datos del vehículo
+                    session['ori2_candidates'] = find_ori2_candidates(temp_file_path, stored['sha256'])
+                    logger.info(f"🔎 {len(session['ori2_candidates'])} soluciones candidatas por contenido del ORI2")
                 else:
                     logger.error("Failed to upload ORI2 to S3")
                     flash('Error uploading ORI2 file to storage', 'danger')
@@ -225,7 +266,10 @@ def upload_file():
                 search_params[field] = value
         
         if file_type == 'ori2':
-            flash('ORI2 file uploaded successfully', 'success')
+            if session.get('ori2_candidates'):
+                flash(f"ORI2 file uploaded successfully. {len(session['ori2_candidates'])} solutions match its content.", 'success')
+            else:
+                flash('ORI2 file uploaded successfully', 'success')
             return redirect(url_for('main.modify_file', **search_params))
         else:
             flash(f'{file_type.upper()} file uploaded successfully', 'success')
@@ -293,7 +337,8 @@ def upload_both_files():
             # Store in session with the structure expected by compare_files
             session['uploaded_files'][file_type] = {
                 'filename': filename,
-                'temp_path': temp_file_path
+                'temp_path': temp_file_path,
+                'size': os.path.getsize(temp_file_path)
             }
             files_processed.append(f"{file_type.upper()}: {filename}")
             
@@ -328,75 +373,29 @@ def compare_files():
         
     bit_size = int(request.form.get('bit_size', 8))
     
-    try:
-        binary_handler = BinaryHandler()
-        binary_handler.set_read_size(bit_size)
-        
-        # Leer archivos desde disco temporal (nueva implementación)
-        ori1_info = session['uploaded_files']['ori1']
-        mod1_info = session['uploaded_files']['mod1']
-        
-        ori1_temp_path = ori1_info['temp_path']
-        mod1_temp_path = mod1_info['temp_path']
-        
-        # Verificar que los archivos existen
-        if not os.path.exists(ori1_temp_path) or not os.path.exists(mod1_temp_path):
-            flash('Temporary files not found. Please re-upload the files.', 'danger')
-            return redirect(url_for('main.add_solution'))
-        
-        logger.info(f"Comparing files: {ori1_temp_path} vs {mod1_temp_path} with {bit_size}-bit size")
-        
-        # Comparar archivos
-        differences = binary_handler.compare_files(ori1_temp_path, mod1_temp_path)
-        
-        session['bit_size'] = bit_size
-
-        # --- NUEVO: Subir archivos a S3 con temp_solution_id para posterior transferencia ---
-        import time
-        temp_solution_id = f"temp_{int(time.time())}"
-        
-        # Subir archivos temporales a S3 para que puedan ser transferidos posteriormente
-        storage = get_file_storage()
-        
-        with open(ori1_temp_path, 'rb') as f:
-            ori1_data = f.read()
-        with open(mod1_temp_path, 'rb') as f:
-            mod1_data = f.read()
-            
-        storage.store_file(temp_solution_id, 'ori1', ori1_info['filename'], ori1_data)
-        storage.store_file(temp_solution_id, 'mod1', mod1_info['filename'], mod1_data)
-        
-        session['temp_solution_id'] = temp_solution_id
-        logger.info(f"📁 Archivos subidos temporalmente con ID: {temp_solution_id}")
-
-        # Guardar diferencias en archivo JSON
-        filename = f"differences_{int(time.time() * 1000000)}.json"
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        with open(filepath, 'w') as f:
-            json.dump([
-                (diff[0], diff[1], diff[2]) for diff in differences
-            ], f)
-        session['differences_file'] = filename
-        session.modified = True
-
-        flash(f'Files compared successfully. {len(differences)} differences found.', 'success')
-        
-        # Limpiar archivos temporales del disco local
-        try:
-            if 'temp_session_id' in session:
-                import shutil
-                temp_dir = os.path.join(tempfile.gettempdir(), 'solutionmanager', session['temp_session_id'])
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                    logger.info(f"🧹 Limpieza de directorio temporal: {temp_dir}")
-        except Exception as e:
-            logger.warning(f"Error cleaning up temp directory: {e}")
-                
+    ori1_info = session['uploaded_files']['ori1']
+    mod1_info = session['uploaded_files']['mod1']
+    
+    # Verificar que los archivos existen
+    if not os.path.exists(ori1_info['temp_path']) or not os.path.exists(mod1_info['temp_path']):
+        flash('Temporary files not found. Please re-upload the files.', 'danger')
         return redirect(url_for('main.add_solution'))
-    except Exception as e:
-        logger.error(f"Error comparing files: {e}")
-        flash(f'Error comparing files: {str(e)}', 'danger')
+    
+    # La comparación y la subida temporal se ejecutan en segundo plano
+    temp_dir = None
+    if 'temp_session_id' in session:
+        temp_dir = os.path.join(tempfile.gettempdir(), 'solutionmanager', session['temp_session_id'])
+    
+    response = enqueue_job('compare', {
+        'bit_size': bit_size,
+        'ori1': {'temp_path': ori1_info['temp_path'], 'filename': ori1_info['filename']},
+        'mod1': {'temp_path': mod1_info['temp_path'], 'filename': mod1_info['filename']},
+        'temp_dir': temp_dir
+    })
+    if response is None:
+        flash('Error comparing files: the comparison could not be queued', 'danger')
         return redirect(url_for('main.add_solution'))
+    return response
 
 @bp.route('/modify_file', methods=['GET', 'POST'])
 @login_required
@@ -422,6 +421,14 @@ def modify_file():
         with DatabaseManager() as db:
             solutions = db.search_solutions(filters)
     
+    # Sin búsqueda, mostrar las soluciones propuestas por el contenido del ORI2
+    content_matches = {}
+    if not search_performed and session.get('files', {}).get('ori2') and session.get('ori2_candidates'):
+        content_matches = {candidate['solution_id']: candidate for candidate in session['ori2_candidates']}
+        with DatabaseManager() as db:
+            for solution_id in content_matches:
+                solutions.extend(db.search_solutions({'id': solution_id}))
+    
     with DatabaseManager() as db:
         vehicle_types = db.get_field_values('vehicle_type')
     
@@ -430,6 +437,7 @@ def modify_file():
         title='Modify File',
         solutions=solutions,
         search_performed=search_performed,
+        content_matches=content_matches,
         vehicle_types=vehicle_types
     )
 
@@ -443,9 +451,10 @@ def compare_results():
     filename = session['differences_file']
     filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
     try:
-        with open(filepath, 'r') as f:
-            differences = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
+        with open(filepath, 'rb') as f:
+            bit_size, regions = read_regions(f)
+            differences = PatchSet(list(regions), bit_size).to_diff()
+    except (FileNotFoundError, ValueError):
         flash('Comparison data is missing or corrupted. Please re-compare files.', 'danger')
         session.pop('differences_file', None)
         return redirect(url_for('main.compare'))
@@ -498,19 +507,10 @@ def solution_detail(solution_id):
         
         # Obtener diferencias desde S3
         storage = get_file_storage()
-        differences_data, total_differences = storage.get_differences(solution_id)
+        differences, total_differences = storage.get_differences(solution_id)
 
-        differences = []
-        has_differences = False
-        if differences_data:
-            has_differences = True
-            for diff in differences_data:
-                address = diff['memory_address']
-                ori1_value = diff['ori1_value']
-                mod1_value = diff['mod1_value']
-                bit_size = diff['bit_size']
-                differences.append((address, ori1_value, mod1_value, bit_size))
-        else:
+        has_differences = bool(differences)
+        if not has_differences:
             logger.warning(f"No differences found for solution {solution_id}")
 
         ori1_info = storage.get_file_info(solution_id, 'ori1')
@@ -550,10 +550,7 @@ def add_solution():
 
             filename = session['differences_file']
             filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            try:
-                with open(filepath, 'r') as f:
-                    differences = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
+            if not os.path.exists(filepath):
                 flash('Comparison data is missing or corrupted. Please re-compare files.', 'danger')
                 session.pop('differences_file', None)
                 return redirect(url_for('main.add_solution'))
@@ -593,46 +590,20 @@ def add_solution():
                 solution_id = db.add_solution(vehicle_info, solution_types, created_by=current_user.id)
                 
                 if solution_id:
-                    bit_size = session.get('bit_size', 8)
-                    
-                    # TRANSFERIR ORI1 + MOD1 PERMANENTEMENTE para trazabilidad completa
+                    # Transferencia de ORI1 + MOD1 y guardado de diferencias en segundo plano
                     temp_solution_id = session.get('temp_solution_id')
                     logger.info(f"🔍 TRANSFER DEBUG: solution_id={solution_id}, temp_solution_id={temp_solution_id}")
-                    
-                    if temp_solution_id:
-                        logger.info(f"🔄 Iniciando transferencia de ORI1 + MOD1 permanente: {temp_solution_id} -> {solution_id}")
-                        storage = get_file_storage()
-                        
-                        try:
-                            transfer_result = storage.transfer_temp_files(temp_solution_id, solution_id)
-                            if transfer_result:
-                                logger.info(f"✅ ORI1 + MOD1 transferred permanently from {temp_solution_id} to {solution_id}")
-                                logger.info(f"🎯 BENEFICIO: Trazabilidad completa - ambos archivos asociados a solución {solution_id}")
-                            else:
-                                logger.error(f"❌ Failed to transfer ORI1 + MOD1 from {temp_solution_id} to {solution_id}")
-                        except Exception as e:
-                            logger.error(f"❌ Exception during transfer_temp_files: {e}")
-                    else:
-                        logger.warning(f"⚠️ No temp_solution_id found in session - ORI1 + MOD1 no se transferirán")
-                    
-                    # Preparar diferencias para S3 storage
-                    differences_for_storage = []
-                    for address, ori1_value, mod1_value in differences:
-                        differences_for_storage.append({
-                            'memory_address': address,
-                            'ori1_value': ori1_value,
-                            'mod1_value': mod1_value,
-                            'bit_size': bit_size
-                        })
-                    
-                    # Guardar diferencias en S3
-                    storage = get_file_storage()
-                    if storage.store_differences(solution_id, differences_for_storage):
-                        logger.info(f"Differences stored in S3 for solution {solution_id}")
-                    else:
-                        logger.error(f"Failed to store differences in S3 for solution {solution_id}")
+                    job_response = enqueue_job('store_solution', {
+                        'solution_id': solution_id,
+                        'temp_solution_id': temp_solution_id,
+                        'differences_file': filename,
+                        'files': {
+                            file_type: {key: file_info.get(key) for key in ('filename', 'file_key', 'sha256', 'size')}
+                            for file_type, file_info in session.get('uploaded_files', {}).items()
+                            if file_type in ('ori1', 'mod1')
+                        }
+                    })
 
-                    flash('Solution added successfully', 'success')
                     # Clean up uploaded files and related session data
                     session.pop('files', None)
                     session.pop('uploaded_files', None)  # NUEVO: Limpiar uploaded_files
@@ -655,7 +626,10 @@ def add_solution():
                             session.pop('temp_session_id', None)
                     
                     session.modified = True
-                    return redirect(url_for('main.solution_detail', solution_id=solution_id))
+                    if job_response is None:
+                        flash('Solution saved, but its files could not be queued for storage. Please regenerate its differences.', 'warning')
+                        return redirect(url_for('main.solution_detail', solution_id=solution_id))
+                    return job_response
                 else:
                     flash('Error adding solution', 'danger')
         
@@ -844,119 +818,76 @@ def apply_solution(solution_id):
         flash('Please upload ORI2 file first', 'warning')
         return redirect(url_for('main.modify_file'))
     
-    try:
-        # Obtener diferencias desde S3
-        storage = get_file_storage()
-        differences_data, total_differences = storage.get_differences(solution_id)
-        
-        if not differences_data:
-            flash(f'No differences found for solution {solution_id}. This solution may not have been created through the complete comparison process. Please contact the administrator to regenerate the differences for this solution.', 'warning')
-            logger.warning(f"No differences found for solution {solution_id}")
-            return redirect(url_for('main.modify_file'))
-        
-        # Obtener archivo ORI2 desde S3
-        ori2_info = session['files']['ori2']
-        if not ori2_info or 'solution_id' not in ori2_info:
-            logger.error(f"ORI2 info missing or invalid: {ori2_info}")
-            flash('ORI2 file information is missing. Please upload ORI2 file first.', 'warning')
-            return redirect(url_for('main.modify_file'))
-        
-        ori2_filename, ori2_file_data = storage.get_file(ori2_info['solution_id'], 'ori2')
-        
-        if not ori2_file_data:
-            flash('Error retrieving ORI2 file from storage', 'danger')
-            return redirect(url_for('main.modify_file'))
-        
-        # Crear archivo temporal ORI2 para procesar
-        with tempfile.NamedTemporaryFile(mode='wb', suffix='.ori', delete=False) as ori2_temp:
-            ori2_temp.write(ori2_file_data)
-            ori2_temp_path = ori2_temp.name
-        
-        try:
-            # Obtener archivo ORI1 de la solución desde S3
-            ori1_filename, ori1_file_data = storage.get_file(solution_id, 'ori1')
-            
-            if not ori1_file_data:
-                logger.error(f"ORI1 file not found for solution {solution_id}")
-                flash(f'Esta solución (ID: {solution_id}) no tiene archivo ORI1 disponible. Por favor, selecciona una solución diferente o contacta al administrador para que complete esta solución.', 'warning')
-                return redirect(url_for('main.modify_file'))
-            
-            # Crear archivo temporal ORI1 para procesar
-            with tempfile.NamedTemporaryFile(mode='wb', suffix='.ori', delete=False) as ori1_temp:
-                ori1_temp.write(ori1_file_data)
-                ori1_temp_path = ori1_temp.name
-            
-            # Calcular compatibilidad comparando ORI2 vs ORI1 directamente
-            binary_handler = BinaryHandler()
-            bit_size = differences_data[0]['bit_size'] if differences_data else 8
-            binary_handler.set_read_size(bit_size)
+    ori2_info = session['files']['ori2']
+    if not ori2_info or 'solution_id' not in ori2_info:
+        logger.error(f"ORI2 info missing or invalid: {ori2_info}")
+        flash('ORI2 file information is missing. Please upload ORI2 file first.', 'warning')
+        return redirect(url_for('main.modify_file'))
+    
+    # El cálculo de compatibilidad se ejecuta en segundo plano
+    response = enqueue_job('compatibility', {
+        'solution_id': solution_id,
+        'ori2': {
+            'solution_id': ori2_info['solution_id'],
+            'file_key': ori2_info.get('file_key'),
+            'filename': ori2_info.get('filename'),
+            'sha256': ori2_info.get('sha256')
+        }
+    })
+    if response is None:
+        flash('Error checking compatibility: the check could not be queued', 'danger')
+        return redirect(url_for('main.modify_file'))
+    return response
 
-            # Leer datos de ambos archivos
-            ori2_data = binary_handler.read_file(ori2_temp_path)
-            ori1_data = binary_handler.read_file(ori1_temp_path)
+@bp.route('/solutions/scan', methods=['POST'])
+@login_required
+def scan_solutions():
+    """Rank the solutions of the current search by compatibility with the ORI2 file."""
+    if 'files' not in session or 'ori2' not in session['files']:
+        flash('Please upload ORI2 file first', 'warning')
+        return redirect(url_for('main.modify_file'))
+    
+    ori2_info = session['files']['ori2']
+    if not ori2_info or 'solution_id' not in ori2_info:
+        logger.error(f"ORI2 info missing or invalid in scan_solutions: {ori2_info}")
+        flash('ORI2 file information is missing. Please upload ORI2 file first.', 'warning')
+        return redirect(url_for('main.modify_file'))
+    
+    solution_ids = []
+    for value in request.form.getlist('solution_id'):
+        if value.isdigit() and int(value) not in solution_ids:
+            solution_ids.append(int(value))
+    if not solution_ids:
+        flash('No solutions to scan. Search for solutions first.', 'warning')
+        return redirect(url_for('main.modify_file'))
+    
+    # Todas las soluciones se comprueban en un único trabajo en segundo plano
+    response = enqueue_job('compatibility_scan', {
+        'solution_ids': solution_ids,
+        'ori2': {
+            'solution_id': ori2_info['solution_id'],
+            'file_key': ori2_info.get('file_key'),
+            'filename': ori2_info.get('filename'),
+            'sha256': ori2_info.get('sha256')
+        }
+    })
+    if response is None:
+        flash('Error scanning solutions: the scan could not be queued', 'danger')
+        return redirect(url_for('main.modify_file'))
+    return response
 
-            # ESTRATEGIA CORREGIDA: Comparar ORI2 del usuario vs ORI1 de la solución
-            compatibility_result = binary_handler.calculate_similarity(ori2_data, ori1_data)
-            
-            # Convertir resultado de similitud a formato compatible con template
-            # Mapear campos de similarity a formato de compatibility esperado por el template
-            compatibility_result['compatibility_percentage'] = compatibility_result['similarity_percentage']
-            compatibility_result['matching_points'] = compatibility_result['identical_bytes']
-            compatibility_result['total_points'] = compatibility_result['total_bytes']
-            compatibility_result['incompatible_points'] = []  # No hay detalles específicos de puntos incompatibles con similitud
-            compatibility_result['analysis_type'] = 'similarity_based'
-            compatibility_result['ori2_file_size'] = len(ori2_file_data)  # Agregar tamaño del archivo ORI2
-            
-            # Obtener información de la solución para mostrar en el modal
-            from app.database.db_manager import DatabaseManager
-            db = DatabaseManager()
-            solution = db.get_solution_by_id(solution_id)
-            
-            if not solution:
-                logger.error(f"Solution {solution_id} not found in database")
-                flash(f'Solution {solution_id} not found in database', 'danger')
-                return redirect(url_for('main.modify_file'))
-            
-            # Guardar datos en sesión para la confirmación
-            session['compatibility_check'] = {
-                'solution_id': solution_id,
-                'compatibility_result': compatibility_result,
-                'solution_info': {
-                    'id': solution['id'],
-                    'vehicle_type': solution['vehicle_type'],
-                    'make': solution['make'],
-                    'model': solution['model'],
-                    'engine': solution['engine'],
-                    'year': solution['year'],
-                    'ecu_type': solution['ecu_type'],
-                    'hardware_number': solution['hardware_number'],
-                    'software_number': solution['software_number']
-                },
-                'analysis_details': {
-                    'total_differences': total_differences,
-                    'ori2_filename': ori2_filename
-                }
-            }
-            session.modified = True
-            
-            logger.info(f"Redirecting to compatibility confirmation for solution {solution_id}")
-            logger.info(f"Compatibility result: {compatibility_result['compatibility_percentage']}%")
-            
-            # Redirigir a página de confirmación de compatibilidad
-            return redirect(url_for('main.confirm_compatibility'))
-            
-        finally:
-            # Limpiar archivos temporales
-            try:
-                os.unlink(ori2_temp_path)
-                os.unlink(ori1_temp_path)  # Limpiar también el archivo ORI1 temporal
-            except Exception as e:
-                logger.warning(f"Error cleaning up temp files: {e}")
-                
-    except Exception as e:
-        logger.error(f"Error checking compatibility: {e}")
-        flash(f'Error checking compatibility: {str(e)}', 'danger')
+@bp.route('/solutions/scan/<job_id>')
+@login_required
+def compatibility_scan_results(job_id):
+    """Show the ranked results of a compatibility scan."""
+    job = get_own_job(job_id)
+    if not job or job['job_type'] != 'compatibility_scan' or job['status'] != JOB_SUCCEEDED:
+        flash('Scan results not available', 'warning')
         return redirect(url_for('main.modify_file'))
+    
+    return render_template('main/compatibility_scan.html',
+                         title='Compatibility Scan',
+                         scan=job['result'])
 
 @bp.route('/solutions/confirm_compatibility')
 @login_required
@@ -987,100 +918,116 @@ def apply_solution_confirmed(solution_id):
         flash('Invalid compatibility check session', 'warning')
         return redirect(url_for('main.modify_file'))
     
-    try:
-        # Obtener diferencias desde S3
-        storage = get_file_storage()
-        differences_data, total_differences = storage.get_differences(solution_id)
-        
-        if not differences_data:
-            flash(f'No differences found for solution {solution_id}', 'warning')
-            return redirect(url_for('main.modify_file'))
-        
-        # Convertir formato de diferencias
-        differences = []
-        bit_size = 8  # Default
-        for diff in differences_data:
-            address = diff['memory_address']
-            ori1_value = diff['ori1_value']
-            mod1_value = diff['mod1_value']
-            bit_size = diff['bit_size']
-            differences.append((address, ori1_value, mod1_value))
-        
-        # Obtener archivo ORI2 desde S3
-        ori2_info = session['files']['ori2']
-        if not ori2_info or 'solution_id' not in ori2_info:
-            logger.error(f"ORI2 info missing or invalid in apply_solution_confirmed: {ori2_info}")
-            flash('ORI2 file information is missing. Please upload ORI2 file first.', 'warning')
-            return redirect(url_for('main.modify_file'))
-        
-        ori2_filename, ori2_file_data = storage.get_file(ori2_info['solution_id'], 'ori2')
-        
-        if not ori2_file_data:
-            flash('Error retrieving ORI2 file from storage', 'danger')
-            return redirect(url_for('main.modify_file'))
-        
-        # Crear archivo temporal para procesar
-        with tempfile.NamedTemporaryFile(mode='wb', suffix='.ori', delete=False) as ori2_temp:
-            ori2_temp.write(ori2_file_data)
-            ori2_temp_path = ori2_temp.name
-        
-        try:
-            binary_handler = BinaryHandler()
-            binary_handler.set_read_size(bit_size)
-            ori2_data = binary_handler.read_file(ori2_temp_path)
-            
-            # Use the original ORI2 base name if available
-            ori2_base_name = session.get('ori2_base_name', 'mod2')
-            mod2_filename = f"{ori2_base_name}.mod"
-            
-            # Crear archivo MOD2 temporal
-            with tempfile.NamedTemporaryFile(mode='wb', suffix='.mod', delete=False) as mod2_temp:
-                mod2_temp_path = mod2_temp.name
-            
-            success = binary_handler.write_mod2(ori2_data, differences, mod2_temp_path)
-            
-            if success:
-                # Leer el archivo MOD2 generado
-                with open(mod2_temp_path, 'rb') as f:
-                    mod2_data = f.read()
-                
-                # Guardar MOD2 en S3
-                if ori2_info and 'solution_id' in ori2_info:
-                    mod2_stored = storage.store_file(ori2_info['solution_id'], 'mod2', mod2_filename, mod2_data)
-                    
-                    if mod2_stored:
-                        if 'files' not in session:
-                            session['files'] = {}
-                        session['files']['mod2'] = {'solution_id': ori2_info['solution_id'], 'filename': mod2_filename}
-                        
-                        # Limpiar datos de compatibilidad de la sesión
-                        session.pop('compatibility_check', None)
-                        session.modified = True
-                        
-                        flash('Solution applied successfully', 'success')
-                        return redirect(url_for('main.choose_mod2_filename'))
-                    else:
-                        flash('Error storing MOD2 file', 'danger')
-                else:
-                    logger.error("ORI2 info missing when trying to store MOD2")
-                    flash('Error storing MOD2 file - ORI2 information missing', 'danger')
-            else:
-                flash('Error applying solution', 'danger')
-        
-        finally:
-            # Limpiar archivos temporales
-            try:
-                os.unlink(ori2_temp_path)
-                if 'mod2_temp_path' in locals():
-                    os.unlink(mod2_temp_path)
-            except Exception as e:
-                logger.warning(f"Error cleaning up temp files: {e}")
-                
+    ori2_info = session['files']['ori2']
+    if not ori2_info or 'solution_id' not in ori2_info:
+        logger.error(f"ORI2 info missing or invalid in apply_solution_confirmed: {ori2_info}")
+        flash('ORI2 file information is missing. Please upload ORI2 file first.', 'warning')
         return redirect(url_for('main.modify_file'))
-    except Exception as e:
-        logger.error(f"Error applying solution: {e}")
-        flash(f'Error applying solution: {str(e)}', 'danger')
+    
+    # Use the original ORI2 base name if available
+    ori2_base_name = session.get('ori2_base_name', 'mod2')
+    
+    # La generación del MOD2 se ejecuta en segundo plano
+    response = enqueue_job('apply', {
+        'solution_id': solution_id,
+        'ori2': {'solution_id': ori2_info['solution_id'], 'file_key': ori2_info.get('file_key')},
+        'mod2_filename': f"{ori2_base_name}.mod"
+    })
+    if response is None:
+        flash('Error applying solution: the job could not be queued', 'danger')
         return redirect(url_for('main.modify_file'))
+    return response
+
+@bp.route('/api/solutions/<int:solution_id>/structure')
+@login_required
+def get_structure_check(solution_id):
+    """
+    API endpoint comparing the structure of a solution's ORI1 with another file.
+    
+    Query args:
+        compare: 'ori2' (the uploaded ORI2, default) or 'mod1' (the solution's MOD1)
+        bit_size: 8, 16 or 32 (default: bit size of the solution's differences)
+    """
+    compare = request.args.get('compare', 'ori2')
+    if compare not in ('ori2', 'mod1'):
+        return jsonify({'error': 'compare must be ori2 or mod1'}), 400
+    
+    storage = get_file_storage()
+    bit_size = request.args.get('bit_size', type=int)
+    if not bit_size:
+        # Only the header of the differences is read, not the regions
+        bit_size, _ = storage.get_differences_info(solution_id)
+        bit_size = bit_size or 8
+    if bit_size not in (8, 16, 32):
+        return jsonify({'error': 'bit_size must be 8, 16 or 32'}), 400
+    
+    if compare == 'ori2':
+        ori2_info = session.get('files', {}).get('ori2')
+        if not ori2_info or 'solution_id' not in ori2_info:
+            return jsonify({'error': 'Please upload ORI2 file first'}), 400
+        _, other_data = storage.get_file_view(ori2_info['solution_id'], 'ori2', ori2_info.get('file_key'))
+    else:
+        _, other_data = storage.get_file_view(solution_id, 'mod1')
+    
+    _, ori1_data = storage.get_file_view(solution_id, 'ori1')
+    if not ori1_data or not other_data:
+        return jsonify({'error': 'File not found'}), 404
+    
+    binary_handler = BinaryHandler()
+    binary_handler.set_read_size(bit_size)
+    try:
+        result = binary_handler.verify_structure(ori1_data, other_data)
+    except Exception as e:
+        logger.error(f"Error checking structure of solution {solution_id}: {e}")
+        return jsonify({'error': 'Error checking file structure'}), 500
+    
+    result.update({'solution_id': solution_id, 'compare': compare, 'bit_size': bit_size})
+    return jsonify(result)
+
+@bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    """Show a waiting page until the background job finishes."""
+    job = get_own_job(job_id)
+    if not job:
+        flash('Job not found', 'warning')
+        return redirect(url_for('main.home'))
+    
+    if job['status'] in (JOB_SUCCEEDED, JOB_FAILED):
+        return redirect(url_for('main.job_complete', job_id=job_id))
+    
+    return render_template('main/job_status.html',
+                         title=JOB_TITLES.get(job['job_type'], 'Processing'),
+                         job=job)
+
+@bp.route('/api/jobs/<job_id>')
+@login_required
+def get_job_status(job_id):
+    """API endpoint polled by the waiting page."""
+    job = get_own_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify({
+        'id': job['id'],
+        'job_type': job['job_type'],
+        'status': job['status'],
+        'error': job['error']
+    })
+
+@bp.route('/jobs/<job_id>/complete')
+@login_required
+def job_complete(job_id):
+    """Apply the result of a finished job to the session and continue the workflow."""
+    job = get_own_job(job_id)
+    if not job:
+        flash('Job not found', 'warning')
+        return redirect(url_for('main.home'))
+    
+    if job['status'] not in (JOB_SUCCEEDED, JOB_FAILED):
+        return redirect(url_for('main.job_status', job_id=job_id))
+    
+    return finish_job(job)
 
 @bp.route('/solutions/<int:solution_id>/regenerate_differences', methods=['GET', 'POST'])
 @login_required  
@@ -1121,58 +1068,33 @@ def regenerate_differences(solution_id):
             return render_template('main/regenerate_differences.html', solution=solution)
         
         try:
-            # Crear archivos temporales
-            with tempfile.NamedTemporaryFile(mode='wb', suffix='.ori', delete=False) as ori1_temp:
-                ori1_file.save(ori1_temp.name)
-                ori1_temp_path = ori1_temp.name
+            # Comparar archivos en memoria
+            binary_handler = BinaryHandler()
+            binary_handler.set_read_size(bit_size)
             
-            with tempfile.NamedTemporaryFile(mode='wb', suffix='.mod', delete=False) as mod1_temp:
-                mod1_file.save(mod1_temp.name)
-                mod1_temp_path = mod1_temp.name
+            ori1_data = binary_handler.parse_bytes(ori1_file.read())
+            mod1_data = binary_handler.parse_bytes(mod1_file.read())
             
-            try:
-                # Comparar archivos
-                binary_handler = BinaryHandler()
-                binary_handler.set_read_size(bit_size)
-                
-                ori1_data = binary_handler.read_file(ori1_temp_path)
-                mod1_data = binary_handler.read_file(mod1_temp_path)
-                
-                if len(ori1_data) != len(mod1_data):
-                    flash('Files have different sizes and cannot be compared', 'danger')
-                    return render_template('main/regenerate_differences.html', solution=solution)
-                
-                differences = binary_handler.compare_files(ori1_data, mod1_data)
-                
-                if not differences:
-                    flash('No differences found between the files', 'warning')
-                    return render_template('main/regenerate_differences.html', solution=solution)
-                
-                # Preparar diferencias para almacenamiento
-                differences_for_storage = []
-                for address, ori1_value, mod1_value in differences:
-                    differences_for_storage.append({
-                        'memory_address': address,
-                        'ori1_value': ori1_value,
-                        'mod1_value': mod1_value,
-                        'bit_size': bit_size
-                    })
-                
-                # Guardar diferencias
-                if storage.store_differences(solution_id, differences_for_storage):
-                    flash(f'Successfully regenerated {len(differences)} differences for solution {solution_id}', 'success')
-                    logger.info(f"Regenerated {len(differences)} differences for solution {solution_id}")
-                    return redirect(url_for('main.solution_detail', solution_id=solution_id))
-                else:
-                    flash('Error storing differences', 'danger')
-                    
-            finally:
-                # Limpiar archivos temporales
-                try:
-                    os.unlink(ori1_temp_path)
-                    os.unlink(mod1_temp_path)
-                except Exception as e:
-                    logger.warning(f"Error cleaning up temp files: {e}")
+            if len(ori1_data) != len(mod1_data):
+                flash('Files have different sizes and cannot be compared', 'danger')
+                return render_template('main/regenerate_differences.html', solution=solution)
+            
+            differences = binary_handler.diff_data(ori1_data, mod1_data)
+            
+            if not differences:
+                flash('No differences found between the files', 'warning')
+                return render_template('main/regenerate_differences.html', solution=solution)
+            
+            # Preparar diferencias para almacenamiento
+            differences_for_storage = PatchSet.from_diff(differences)
+            
+            # Guardar diferencias
+            if storage.store_differences(solution_id, differences_for_storage):
+                flash(f'Successfully regenerated {len(differences)} differences for solution {solution_id}', 'success')
+                logger.info(f"Regenerated {len(differences)} differences for solution {solution_id}")
+                return redirect(url_for('main.solution_detail', solution_id=solution_id))
+            else:
+                flash('Error storing differences', 'danger')
                     
         except Exception as e:
             logger.error(f"Error regenerating differences: {e}")
@@ -1195,23 +1117,44 @@ def download_mod2():
             return redirect(url_for('main.solutions'))
         
         storage = get_file_storage()
+        range_header = request.headers.get('Range')
         
-        # Descargar archivo desde S3
-        mod2_filename, mod2_data = storage.get_file(mod2_info['solution_id'], 'mod2')
-        
-        if not mod2_data:
-            flash('No MOD2 file available', 'warning')
-            return redirect(url_for('main.solutions'))
-        
-        # Use user-provided filename if available
-        download_filename = session.pop('mod2_download_name', None)
+        # Use user-provided filename if available (kept for resumed range requests)
+        if range_header:
+            download_filename = session.get('mod2_download_name')
+        else:
+            download_filename = session.pop('mod2_download_name', None)
         if not download_filename:
             ori2_base_name = session.get('ori2_base_name', 'mod2')
             download_filename = f"{ori2_base_name}.mod"
         
-        # Crear respuesta con el archivo
-        response = make_response(mod2_data)
-        response.headers['Content-Type'] = 'application/octet-stream'
+        # Modo presigned: S3 sirve el archivo directamente
+        if current_app.config.get('S3_DOWNLOAD_MODE') == 'presigned' and hasattr(storage, 'get_download_url'):
+            download_url = storage.get_download_url(
+                mod2_info['solution_id'], 'mod2', download_filename, mod2_info.get('file_key')
+            )
+            if download_url:
+                session['mod2_downloaded'] = True
+                session.modified = True
+                return redirect(download_url)
+        
+        # Descargar en streaming desde el storage (sin cargar el archivo en memoria)
+        stream = storage.open_stream(mod2_info['solution_id'], 'mod2', mod2_info.get('file_key'), range_header)
+        
+        if not stream:
+            flash('No MOD2 file available', 'warning')
+            return redirect(url_for('main.solutions'))
+        
+        response = Response(
+            iter_stream(stream['body'], stream['content_length']),
+            status=206 if stream['content_range'] else 200,
+            mimetype='application/octet-stream',
+            direct_passthrough=True
+        )
+        response.headers['Content-Length'] = str(stream['content_length'])
+        response.headers['Accept-Ranges'] = 'bytes'
+        if stream['content_range']:
+            response.headers['Content-Range'] = stream['content_range']
         response.headers['Content-Disposition'] = f'attachment; filename="{download_filename}"'
         
         session['mod2_downloaded'] = True
@@ -1238,6 +1181,30 @@ def get_dropdown_values(field_name):
     
     return {'values': values}
 
+@bp.route('/api/dropdown-tree')
+@login_required
+def get_dropdown_tree():
+    """API route returning every cascaded dropdown level for a partial selection."""
+    fields = request.args.get('fields')
+    fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else list(CASCADE_FIELDS)
+    selection = {field: request.args.get(field) for field in fields if request.args.get(field)}
+
+    catalog = get_catalog()
+    etag = catalog.get_tree_etag(fields, selection)
+    if etag is None:
+        return jsonify({'error': 'Unknown dropdown fields'}), 400
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        tree, etag = catalog.get_tree(fields, selection)
+        response = jsonify({'fields': fields, 'selection': selection, 'tree': tree})
+
+    response.set_etag(etag)
+    # Browsers may keep the tree but must revalidate it with If-None-Match
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @bp.route('/logout')
 @login_required
 def logout():
@@ -1257,6 +1224,9 @@ def logout():
 
 @bp.after_request
 def add_header(response):
+    # Solo el árbol de dropdowns se revalida por ETag; descargas y páginas no se cachean
+    if request.endpoint == 'main.get_dropdown_tree':
+        return response
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '-1'
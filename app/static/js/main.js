@@ -1,38 +1,40 @@
 document.addEventListener('DOMContentLoaded', function() {
     // --- Search A: Dropdowns ---
     const searchAOrder = ['vehicle_type', 'make', 'model', 'engine', 'ecu_type'];
-    const searchAParent = {
-        'make': 'vehicle_type',
-        'model': 'make',
-        'engine': 'model',
-        'ecu_type': 'engine'
-    };
 
-    function populateSelect(field, parentField = null, parentValue = null) {
+    // The whole cascade is fetched once from /api/dropdown-tree and every level
+    // is filled locally from it. Each tree level is a list of [value, children]
+    // pairs, the last level a plain list of values.
+    let dropdownTree = null;
+
+    function fillSelect(select, values) {
+        select.innerHTML = '<option value="">-- Select --</option>';
+        values.forEach(val => {
+            select.add(new Option(val, val));
+        });
+    }
+
+    function levelOptions(level) {
+        // Walk the tree following the values selected above `level`
+        let node = dropdownTree;
+        for (let i = 0; i < level; i++) {
+            const select = document.getElementById(searchAOrder[i]);
+            const value = select ? select.value : '';
+            const entry = node.find(pair => String(pair[0]) === value);
+            if (!entry) return [];
+            node = entry[1];
+        }
+        return level === searchAOrder.length - 1 ? node : node.map(pair => pair[0]);
+    }
+
+    function populateSelect(field) {
         const select = document.getElementById(field);
         if (!select) {
             // Element doesn't exist on this page, skip
             return;
         }
-        
-        let url = `/api/dropdown/${field}`;
-        if (parentField && parentValue) {
-            url += `?parent_field=${parentField}&parent_value=${encodeURIComponent(parentValue)}`;
-        }
-        fetch(url)
-            .then(response => response.json())
-            .then(data => {
-                select.innerHTML = '<option value="">-- Select --</option>';
-                if (data.values) {
-                    data.values.forEach(val => {
-                        select.innerHTML += `<option value="${val}">${val}</option>`;
-                    });
-                }
-                clearChildSelects(field);
-            })
-            .catch(error => {
-                console.error('Error fetching dropdown data:', error);
-            });
+        fillSelect(select, dropdownTree ? levelOptions(searchAOrder.indexOf(field)) : []);
+        clearChildSelects(field);
     }
 
     function clearChildSelects(field) {
@@ -47,16 +49,23 @@ document.addEventListener('DOMContentLoaded', function() {
     const vehicleTypeSelect = document.getElementById('vehicle_type');
     if (vehicleTypeSelect) {
         // Initial population for Search A
-        populateSelect('vehicle_type');
-        
+        fetch(`/api/dropdown-tree?fields=${searchAOrder.join(',')}`)
+            .then(response => response.json())
+            .then(data => {
+                dropdownTree = data.tree || [];
+                populateSelect('vehicle_type');
+            })
+            .catch(error => {
+                console.error('Error fetching dropdown data:', error);
+            });
+
         searchAOrder.forEach(function(field, idx) {
             const select = document.getElementById(field);
             if (!select) return;
             select.addEventListener('change', function() {
                 // Only populate the next field in the chain
                 if (idx < searchAOrder.length - 1) {
-                    const childField = searchAOrder[idx + 1];
-                    populateSelect(childField, field, select.value);
+                    populateSelect(searchAOrder[idx + 1]);
                 }
                 // Do NOT repopulate the current select!
             });
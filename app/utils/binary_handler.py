@@ -5,22 +5,62 @@ This module provides functionality for handling binary file operations including
 - Reading and writing binary files with configurable bit sizes
 - File comparison and difference detection
 - Structure verification
-- Mod2 file generation
+- Mod2 file generation, on disk or fully in memory
+- Offloading of large comparisons to the binary process pool
+- Memory-mapped, chunked parallel comparison of full-flash images
+- Applying streamed patch regions without loading all differences
 
 The module supports 8-bit, 16-bit, and 32-bit operations with proper
 byte ordering and alignment.
 """
 
 import os
+import mmap
+import math
+from statistics import NormalDist
 from pathlib import Path
-import struct
 import logging
+from collections.abc import Iterator
 from typing import List, Dict, Tuple, Optional, Union, Any
+import numpy as np
 from flask import current_app
+from app.utils.diff_engine import (DTYPE_MAP, DiffResult, PatchSet, diff_arrays, diff_arrays_chunked,
+                                   count_equal_chunked, as_arrays, apply_regions, iter_differences,
+                                   CHUNK_BYTES)
+from app.utils.process_pool import run_pooled
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# In-memory sources accepted wherever a file path is accepted
+BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+BinarySource = Union[str, Path, bytes, bytearray, memoryview, mmap.mmap]
+
+# From this size on files are memory-mapped instead of read, and compared in
+# parallel chunks in this process (not copied to the binary process pool)
+CHUNKED_MIN_BYTES = 8 * 1024 * 1024
+
+# Incompatible points detailed by calculate_compatibility_from_differences;
+# the rest are only counted
+MAX_INCOMPATIBLE_POINTS = 1000
+
+# Bytes compared per step by the thresholded similarity check
+SIMILARITY_BLOCK_BYTES = 1024 * 1024
+
+# Word positions sampled by estimate_similarity
+SIMILARITY_SAMPLE_SIZE = 65536
+
+# Region size of the per-block breakdown of verify_structure
+STRUCTURE_BLOCK_BYTES = 64 * 1024
+
+# Signed dtypes used to wrap neighbouring deltas modulo the word size
+SIGNED_DTYPE_MAP = {8: np.dtype('i1'), 16: np.dtype('<i2'), 32: np.dtype('<i4')}
+
+def _nbytes(*arrays: Any) -> int:
+    """Combined size of the NumPy arrays among ``arrays`` (lists count as small)."""
+    return sum(array.nbytes for array in arrays if isinstance(array, np.ndarray))
+
+
 class BinaryHandler:
     """
     Handles binary file operations with configurable bit sizes.
@@ -33,7 +73,7 @@ class BinaryHandler:
 
     Attributes:
         test_mode (bool): Flag for test environment
-        files (Dict[str, List[int]]): Cache of loaded file data
+        files (Dict[str, np.ndarray]): Cache of loaded file data
         read_size (int): Current read size in bits
         db_path (Optional[str]): Optional database path
     """
@@ -64,77 +104,100 @@ class BinaryHandler:
             raise ValueError("Read size must be 8, 16, or 32 bits")
         self.read_size = size
 
-    def read_file(self, file_path: Union[str, Path], read_size: Optional[int] = None) -> List[int]:
+    def read_file(self, file_path: BinarySource, read_size: Optional[int] = None) -> np.ndarray:
         """
         Read binary file with specified read size.
 
+        The whole file is loaded with a single read and decoded into a
+        little-endian NumPy array. A trailing partial word is zero-padded.
+        Bytes, memoryviews and mmaps are decoded in place without copying
+        (unless padding is needed). Files of CHUNKED_MIN_BYTES or more are
+        memory-mapped instead, so their pages are loaded on demand; those
+        arrays are not cached in ``self.files``.
+
         Args:
-            file_path: Path to binary file (.bin, .ori, .mod, .dtf, or .DTF)
+            file_path: Path to binary file (.bin, .ori, .mod, .dtf, or .DTF),
+                or an in-memory buffer with the file contents
             read_size: Optional bit size override
 
         Returns:
-            List[int]: List of integer values read from file
+            np.ndarray: Array of unsigned values read from file
 
         Raises:
             ValueError: If file extension not supported
             Exception: If file read fails
         """
+        if read_size:
+            self.set_read_size(read_size)
+
+        if isinstance(file_path, BUFFER_TYPES):
+            return self._decode(file_path)
+
         ext = Path(file_path).suffix.lower()
         if ext not in ['.bin', '.ori', '.mod', '.dtf']:
             raise ValueError(f"Unsupported file extension: {ext}. Must be .bin, .ori, .mod, .dtf, or .DTF")
-        if read_size:
-            self.set_read_size(read_size)
 
         try:
-            size_map = {8: 'B', 16: 'H', 32: 'I'}
-            format_char = size_map[self.read_size]
-            bytes_per_read = self.read_size // 8
-
-            data = []
             with open(file_path, 'rb') as f:
-                while True:
-                    chunk = f.read(bytes_per_read)
-                    if not chunk:
-                        break
-                    if len(chunk) < bytes_per_read:
-                        chunk = chunk.ljust(bytes_per_read, b'\x00')
-                    value = struct.unpack(f'<{format_char}', chunk)[0]
-                    data.append(value)
+                if os.fstat(f.fileno()).st_size >= CHUNKED_MIN_BYTES:
+                    # The mapping is released when the last array using it is dropped
+                    raw = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    raw = f.read()
 
-            file_name = Path(file_path).name
-            self.files[file_name] = data
+            data = self._decode(raw)
+
+            # Mapped files are not kept on the handler: the mapping and its
+            # descriptor are released as soon as the caller drops the array
+            if not isinstance(raw, mmap.mmap):
+                file_name = Path(file_path).name
+                self.files[file_name] = data
             return data
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {e}")
             raise
 
-    def write_file(self, file_path: Union[str, Path], data: List[int]) -> bool:
+    def _decode(self, raw: Union[bytes, bytearray, memoryview, mmap.mmap]) -> np.ndarray:
+        """
+        Decode raw bytes into an array of words for the current read size.
+
+        Args:
+            raw: Raw file contents (any buffer; not copied when word-aligned)
+
+        Returns:
+            np.ndarray: Read-only array of unsigned values
+        """
+        bytes_per_read = self.read_size // 8
+        remainder = len(raw) % bytes_per_read
+        if remainder:
+            raw = bytes(raw) + b'\x00' * (bytes_per_read - remainder)
+        return np.frombuffer(raw, dtype=DTYPE_MAP[self.read_size])
+
+    def write_file(self, file_path: Union[str, Path], data: Union[List[int], np.ndarray]) -> bool:
         """
         Write binary data to file.
 
         Args:
             file_path: Output file path
-            data: List of integer values to write
+            data: Integer values to write
 
         Returns:
             bool: True if write successful, False otherwise
         """
         try:
-            size_map = {8: 'B', 16: 'H', 32: 'I'}
-            format_char = size_map[self.read_size]
-            max_value = (1 << self.read_size) - 1
-
             ext = Path(file_path).suffix.lower()
             if ext not in ['.bin', '.ori', '.mod', '.dtf']:
                 logger.error(f"Unsupported file extension: {ext}")
                 return False
 
+            values = np.asarray(data)
+            out_of_range = self._out_of_range(values)
+            if out_of_range is not None:
+                logger.error(f"Value {out_of_range} out of range for {self.read_size}-bit storage")
+                return False
+
             with open(file_path, 'wb') as f:
-                for value in data:
-                    if not 0 <= value <= max_value:
-                        logger.error(f"Value {value} out of range for {self.read_size}-bit storage")
-                        return False
-                    f.write(struct.pack(f'<{format_char}', value))
+                f.write(values.astype(DTYPE_MAP[self.read_size]).tobytes())
 
             file_name = Path(file_path).name
             self.files[file_name] = data
@@ -143,7 +206,15 @@ class BinaryHandler:
             logger.error(f"Error writing file {file_path}: {e}")
             return False
 
-    def get_file_data(self, file_type: str) -> Optional[List[int]]:
+    def _out_of_range(self, values: np.ndarray) -> Optional[int]:
+        """First value that does not fit in the current read size, or None."""
+        if not values.size or values.dtype == DTYPE_MAP[self.read_size]:
+            return None
+        max_value = (1 << self.read_size) - 1
+        invalid = (values < 0) | (values > max_value)
+        return int(values[invalid][0]) if invalid.any() else None
+
+    def get_file_data(self, file_type: str) -> Optional[np.ndarray]:
         """
         Get file data by type.
 
@@ -151,21 +222,21 @@ class BinaryHandler:
             file_type: File type ('ori1', 'mod1', 'ori2', 'mod2')
 
         Returns:
-            Optional[List[int]]: File data if available
+            Optional[np.ndarray]: File data if available
         """
         return self.files.get(file_type)
 
-    def compare_files(self, file1_path: Union[str, Path],
-                     file2_path: Union[str, Path]) -> List[Tuple[int, int, int]]:
+    def compare_files(self, file1_path: BinarySource,
+                     file2_path: BinarySource) -> DiffResult:
         """
         Compare two binary files and return differences.
 
         Args:
-            file1_path: Path to first file
-            file2_path: Path to second file
+            file1_path: Path to (or buffer of) first file
+            file2_path: Path to (or buffer of) second file
 
         Returns:
-            List[Tuple[int, int, int]]: List of (offset, value1, value2) differences
+            DiffResult: Parallel offset/value arrays; iterates as (offset, value1, value2)
 
         Raises:
             Exception: If comparison fails
@@ -174,34 +245,74 @@ class BinaryHandler:
             file1_data = self.read_file(file1_path)
             file2_data = self.read_file(file2_path)
 
-            logger.debug(f"Comparing files: {file1_path} and {file2_path}")
-            logger.debug(f"File1 data: {file1_data}")
-            logger.debug(f"File2 data: {file2_data}")
+            logger.debug(f"Comparing files: {len(file1_data)} words vs {len(file2_data)} words")
 
-            differences = []
-            bytes_per_read = self.read_size // 8
-
-            min_len = min(len(file1_data), len(file2_data))
-            for i in range(min_len):
-                if file1_data[i] != file2_data[i]:
-                    byte_offset = i * bytes_per_read
-                    differences.append((byte_offset, file1_data[i], file2_data[i]))
-                    logger.debug(f"Found difference at offset {byte_offset}: {file1_data[i]} vs {file2_data[i]}")
-
-            logger.debug(f"Found {len(differences)} differences")
-            return differences
+            return self.diff_data(file1_data, file2_data)
         except Exception as e:
             logger.error(f"Error comparing files: {e}")
             raise
 
-    def verify_structure(self, file1_path: Union[str, Path],
-                        file2_path: Union[str, Path]) -> Dict[str, Any]:
+    def iter_file_differences(self, file1_path: BinarySource, file2_path: BinarySource,
+                              chunk_bytes: int = CHUNK_BYTES) -> Iterator:
+        """
+        Compare two binary files chunk by chunk, without collecting all differences.
+
+        Files of CHUNKED_MIN_BYTES or more are memory-mapped by read_file, so
+        only the pages of the current chunk need to be resident.
+
+        Args:
+            file1_path: Path to (or buffer of) first file
+            file2_path: Path to (or buffer of) second file
+            chunk_bytes: Bytes of each file compared per step
+
+        Yields:
+            DiffResult: Differences of each chunk, in offset order
+        """
+        file1_data = self.read_file(file1_path)
+        file2_data = self.read_file(file2_path)
+
+        logger.debug(f"Streaming comparison: {len(file1_data)} words vs {len(file2_data)} words")
+
+        yield from iter_differences(file1_data, file2_data, self.read_size, chunk_bytes)
+
+    def diff_data(self, file1_data: Union[List[int], np.ndarray],
+                  file2_data: Union[List[int], np.ndarray]) -> DiffResult:
+        """
+        Compare two already-decoded files.
+
+        Large arrays are diffed in the binary process pool when it is enabled;
+        from CHUNKED_MIN_BYTES on they are diffed in parallel chunks in this
+        process instead, so memory use stays bounded by the chunk size.
+
+        Args:
+            file1_data: Data from first file
+            file2_data: Data from second file
+
+        Returns:
+            DiffResult: Parallel offset/value arrays; iterates as (offset, value1, value2)
+        """
+        if _nbytes(file1_data, file2_data) >= CHUNKED_MIN_BYTES:
+            differences = diff_arrays_chunked(file1_data, file2_data, self.read_size)
+        else:
+            differences = run_pooled('diff_data', self.read_size, file1_data, file2_data)
+            if differences is None:
+                differences = diff_arrays(file1_data, file2_data, self.read_size)
+        logger.debug(f"Found {len(differences)} differences")
+        return differences
+
+    def verify_structure(self, file1_path: BinarySource,
+                        file2_path: BinarySource) -> Dict[str, Any]:
         """
         Verify structural similarity between two files.
 
+        Both files are compared on the deltas between neighbouring words,
+        wrapped modulo the word size, so a map shifted by a constant offset
+        still matches. The result includes the similarity of every
+        STRUCTURE_BLOCK_BYTES region to show where the structures diverge.
+
         Args:
-            file1_path: Path to first file
-            file2_path: Path to second file
+            file1_path: Path to (or buffer of) first file
+            file2_path: Path to (or buffer of) second file
 
         Returns:
             Dict: Structure verification results including:
@@ -209,6 +320,8 @@ class BinaryHandler:
                 - size1 (int): Size of first file
                 - size2 (int): Size of second file
                 - structural_similarity (float): Similarity percentage
+                - block_size (int): Bytes per region of the breakdown
+                - blocks (List[Dict]): offset and similarity of every region
 
         Raises:
             Exception: If verification fails
@@ -226,82 +339,197 @@ class BinaryHandler:
                     'size_match': False,
                     'size1': size1,
                     'size2': size2,
-                    'structural_similarity': 0
+                    'structural_similarity': 0,
+                    'block_size': STRUCTURE_BLOCK_BYTES,
+                    'blocks': []
                 }
 
-            pattern_matches = 0
-            total_comparisons = size1 - 1
-
-            for i in range(total_comparisons):
-                diff1 = file1_data[i + 1] - file1_data[i]
-                diff2 = file2_data[i + 1] - file2_data[i]
-
-                if self.read_size == 8:
-                    if diff1 < -128:
-                        diff1 += 256
-                    elif diff1 > 127:
-                        diff1 -= 256
-                    if diff2 < -128:
-                        diff2 += 256
-                    elif diff2 > 127:
-                        diff2 -= 256
-
-                pattern_similarity = abs(diff1 - diff2) <= 1
-                if pattern_similarity:
-                    pattern_matches += 1
-
-            similarity = (pattern_matches / total_comparisons * 95)  # Scale to ensure it's not 100%
-
-            logger.debug(f"Structure verification results:")
-            logger.debug(f"Size1: {size1}, Size2: {size2}")
-            logger.debug(f"Pattern matches: {pattern_matches}/{total_comparisons}")
-            logger.debug(f"Similarity: {similarity}%")
+            structure = run_pooled('_structure_similarity', self.read_size, file1_data, file2_data)
+            if structure is None:
+                structure = self._structure_similarity(file1_data, file2_data)
 
             return {
                 'size_match': True,
                 'size1': size1,
                 'size2': size2,
-                'structural_similarity': similarity
+                'structural_similarity': structure['similarity'],
+                'block_size': STRUCTURE_BLOCK_BYTES,
+                'blocks': structure['blocks']
             }
         except Exception as e:
             logger.error(f"Error verifying structure: {e}")
             raise
 
-    def write_mod2(self, original_data: List[int],
-                  differences: List[Tuple[int, int, int]],
+    def _structure_similarity(self, file1_data: np.ndarray, file2_data: np.ndarray) -> Dict[str, Any]:
+        """
+        Score how closely the neighbouring deltas of two equal-size files match.
+
+        Deltas are taken in the word dtype, so they wrap modulo 2**read_size,
+        and read as signed words; deltas within 1 of each other match.
+
+        Args:
+            file1_data: Data from first file
+            file2_data: Data from second file
+
+        Returns:
+            Dict: 'similarity' (percentage) and 'blocks', the similarity of each
+            STRUCTURE_BLOCK_BYTES region
+        """
+        total_comparisons = len(file1_data) - 1
+        if total_comparisons <= 0:
+            return {'similarity': 0, 'blocks': []}
+
+        dtype = DTYPE_MAP[self.read_size]
+        signed = SIGNED_DTYPE_MAP[self.read_size]
+        diff1 = np.diff(np.asarray(file1_data, dtype=dtype)).view(signed)
+        diff2 = np.diff(np.asarray(file2_data, dtype=dtype)).view(signed)
+
+        # Widen only for the comparison so opposite extremes do not wrap into a match
+        matches = np.abs(diff1.astype(np.int64) - diff2) <= 1
+        pattern_matches = int(np.count_nonzero(matches))
+
+        similarity = (pattern_matches / total_comparisons * 95)  # Scale to ensure it's not 100%
+
+        # Comparison i (word i vs word i + 1) belongs to the region of word i
+        words_per_block = max(1, STRUCTURE_BLOCK_BYTES // dtype.itemsize)
+        starts = np.arange(0, total_comparisons, words_per_block)
+        block_matches = np.add.reduceat(matches, starts, dtype=np.int64)
+        block_comparisons = np.diff(np.append(starts, total_comparisons))
+        blocks = [
+            {'offset': offset, 'similarity': round(block_similarity, 2)}
+            for offset, block_similarity in zip(
+                (starts * dtype.itemsize).tolist(),
+                (block_matches / block_comparisons * 95).tolist()
+            )
+        ]
+
+        logger.debug(f"Structure verification results:")
+        logger.debug(f"Size: {len(file1_data)}")
+        logger.debug(f"Pattern matches: {pattern_matches}/{total_comparisons}")
+        logger.debug(f"Similarity: {similarity}%")
+
+        return {'similarity': similarity, 'blocks': blocks}
+
+    def write_mod2(self, original_data: Union[List[int], np.ndarray],
+                  differences: Union[PatchSet, DiffResult, List[Tuple[int, int, int]]],
                   output_path: Union[str, Path]) -> bool:
         """
         Write Mod2 file based on original data and differences.
 
         Args:
             original_data: Original file data
-            differences: List of (offset, old_value, new_value) differences
+            differences: PatchSet, DiffResult or list of (offset, old_value, new_value) differences
             output_path: Output file path
 
         Returns:
             bool: True if write successful, False otherwise
         """
         try:
-            modified_data = list(original_data)
-            bytes_per_value = self.read_size // 8
-
-            for offset, _, new_value in differences:
-                index = offset // bytes_per_value
-                if index < len(modified_data):
-                    modified_data[index] = new_value
-
+            modified_data = self._apply_differences(original_data, differences)
             return self.write_file(output_path, modified_data)
         except Exception as e:
             logger.error(f"Error writing Mod2 file: {e}")
             return False
 
-    def calculate_similarity(self, file1_data: List[int], file2_data: List[int]) -> Dict[str, Any]:
+    def parse_bytes(self, data: Union[bytes, bytearray, memoryview, mmap.mmap],
+                    read_size: Optional[int] = None) -> np.ndarray:
+        """
+        Decode an in-memory binary file.
+
+        Args:
+            data: File contents
+            read_size: Optional bit size override
+
+        Returns:
+            np.ndarray: Array of unsigned values (shares memory with data when aligned)
+        """
+        if read_size:
+            self.set_read_size(read_size)
+        return self._decode(data)
+
+    def apply_differences_to_bytes(self, original: Union[bytes, bytearray, memoryview, mmap.mmap],
+                                   differences: Union[PatchSet, DiffResult, Iterator, List[Tuple[int, int, int]]]) -> Optional[bytes]:
+        """
+        Apply differences to an in-memory file and return the Mod2 contents.
+
+        Produces exactly the bytes write_mod2 would write to disk.
+
+        Args:
+            original: ORI2 file contents
+            differences: PatchSet, DiffResult, iterator of PatchRegion (e.g. from
+                storage.open_differences) or list of (offset, old_value, new_value) differences
+
+        Returns:
+            Optional[bytes]: Mod2 contents, or None if applying failed
+        """
+        try:
+            return self._apply_differences(self._decode(original), differences).tobytes()
+        except Exception as e:
+            logger.error(f"Error applying differences in memory: {e}")
+            return None
+
+    def _apply_differences(self, original_data: Union[List[int], np.ndarray],
+                           differences: Union[PatchSet, DiffResult, Iterator, List[Tuple[int, int, int]]]) -> np.ndarray:
+        """
+        Return a modified copy of original_data with differences applied.
+
+        Args:
+            original_data: Original file data
+            differences: PatchSet, DiffResult, iterator of PatchRegion or list of
+                (offset, old_value, new_value) differences
+
+        Returns:
+            np.ndarray: Modified words in the current read size
+
+        Raises:
+            ValueError: If a value does not fit in the current read size
+        """
+        original_data = np.asarray(original_data)
+        out_of_range = self._out_of_range(original_data)
+        if out_of_range is not None:
+            raise ValueError(f"Value {out_of_range} out of range for {self.read_size}-bit storage")
+
+        modified_data = original_data.astype(DTYPE_MAP[self.read_size])
+        bytes_per_value = self.read_size // 8
+
+        if isinstance(differences, PatchSet):
+            differences.apply(modified_data)
+        elif isinstance(differences, Iterator):
+            apply_regions(modified_data, differences)
+        else:
+            offsets, _, new_values = as_arrays(differences)
+            out_of_range = self._out_of_range(new_values)
+            if out_of_range is not None:
+                raise ValueError(f"Value {out_of_range} out of range for {self.read_size}-bit storage")
+            indices = offsets // bytes_per_value
+            in_range = indices < len(modified_data)
+            modified_data[indices[in_range]] = new_values[in_range]
+
+        return modified_data
+
+    def calculate_similarity(self, file1_data: Union[List[int], np.ndarray],
+                             file2_data: Union[List[int], np.ndarray],
+                             threshold: Optional[float] = None,
+                             early_exit: str = 'decided') -> Dict[str, Any]:
         """
         Calculate similarity percentage between two binary files based on identical bytes.
 
+        Large arrays are compared in the binary process pool when it is enabled,
+        or from CHUNKED_MIN_BYTES on in parallel chunks in this process.
+
+        With a ``threshold`` the files are compared in SIMILARITY_BLOCK_BYTES
+        blocks and the comparison stops as soon as the running bounds decide
+        the outcome: 'decided' stops on either side of the threshold, 'below'
+        only once the similarity can no longer reach it (so passing files
+        still get an exact value). After an early exit the counts and the
+        percentage describe the compared prefix only, and
+        ``similarity_bounds`` gives the range for the whole file.
+
         Args:
             file1_data: Data from first file
             file2_data: Data from second file
+            threshold: Optional similarity percentage to decide
+            early_exit: 'decided' or 'below'
 
         Returns:
             Dict: Similarity analysis containing:
@@ -311,38 +539,67 @@ class BinaryHandler:
                 - size_match (bool): Whether file sizes match
                 - file1_size (int): Size of first file
                 - file2_size (int): Size of second file
+                - meets_threshold (bool): Only with a threshold
+                - early_exit, compared_bytes, similarity_bounds: Only when the
+                  comparison stopped early; total_bytes is then compared_bytes
         """
         try:
+            if _nbytes(file1_data, file2_data) < CHUNKED_MIN_BYTES:
+                pooled = run_pooled('calculate_similarity', self.read_size, file1_data, file2_data,
+                                    threshold=threshold, early_exit=early_exit)
+                if pooled is not None:
+                    return pooled
+
             size1 = len(file1_data)
             size2 = len(file2_data)
             size_match = size1 == size2
             
             # Compare only up to the smaller file size
             min_size = min(size1, size2)
-            identical_bytes = 0
-            
-            for i in range(min_size):
-                if file1_data[i] == file2_data[i]:
-                    identical_bytes += 1
-            
             # Calculate similarity percentage based on the larger file size
             # This ensures that different file sizes will have lower similarity
             max_size = max(size1, size2) if size1 != size2 else min_size
-            similarity_percentage = (identical_bytes / max_size) * 100 if max_size > 0 else 0
+            
+            file1_data = np.asarray(file1_data[:min_size])
+            file2_data = np.asarray(file2_data[:min_size])
+            if threshold is None or max_size == 0:
+                identical_bytes = count_equal_chunked(file1_data, file2_data)
+                compared = min_size
+            else:
+                identical_bytes, compared = self._compare_until_decided(
+                    file1_data, file2_data, max_size, threshold, early_exit
+                )
+            
+            if compared < min_size:
+                similarity_percentage = identical_bytes / compared * 100
+            else:
+                similarity_percentage = (identical_bytes / max_size) * 100 if max_size > 0 else 0
             
             logger.debug(f"Similarity calculation:")
             logger.debug(f"File1 size: {size1}, File2 size: {size2}")
-            logger.debug(f"Identical bytes: {identical_bytes}/{min_size}")
+            logger.debug(f"Identical bytes: {identical_bytes}/{compared} compared of {min_size}")
             logger.debug(f"Similarity: {similarity_percentage:.2f}%")
             
-            return {
+            result = {
                 'similarity_percentage': round(similarity_percentage, 2),
                 'identical_bytes': identical_bytes,
-                'total_bytes': min_size,
+                'total_bytes': compared,
                 'size_match': size_match,
                 'file1_size': size1,
                 'file2_size': size2
             }
+            if compared < min_size:
+                lower = identical_bytes / max_size * 100
+                upper = (identical_bytes + min_size - compared) / max_size * 100
+                result.update({
+                    'early_exit': True,
+                    'compared_bytes': compared,
+                    'similarity_bounds': [round(lower, 2), round(upper, 2)]
+                })
+                result['meets_threshold'] = lower >= threshold
+            elif threshold is not None:
+                result['meets_threshold'] = similarity_percentage >= threshold
+            return result
         except Exception as e:
             logger.error(f"Error calculating similarity: {e}")
             return {
@@ -354,81 +611,184 @@ class BinaryHandler:
                 'file2_size': 0
             }
 
-    def calculate_compatibility_from_differences(self, ori2_data: List[int], differences_data: List[Dict]) -> Dict[str, Any]:
+    def _compare_until_decided(self, file1_data: np.ndarray, file2_data: np.ndarray, max_size: int,
+                               threshold: float, early_exit: str) -> Tuple[int, int]:
+        """
+        Count identical words block by block until ``threshold`` is decided.
+
+        Returns:
+            Tuple[int, int]: (identical words, words compared)
+        """
+        min_size = len(file1_data)
+        block = max(1, SIMILARITY_BLOCK_BYTES // file1_data.itemsize)
+        identical = 0
+        for start in range(0, min_size, block):
+            end = min(start + block, min_size)
+            identical += int(np.count_nonzero(file1_data[start:end] == file2_data[start:end]))
+            if end == min_size:
+                break
+            # Every remaining word matching / none matching
+            upper = (identical + min_size - end) / max_size * 100
+            lower = identical / max_size * 100
+            if upper < threshold or (early_exit == 'decided' and lower >= threshold):
+                return identical, end
+        return identical, min_size
+
+    def estimate_similarity(self, file1_data: Union[List[int], np.ndarray],
+                            file2_data: Union[List[int], np.ndarray],
+                            sample_size: int = SIMILARITY_SAMPLE_SIZE,
+                            confidence: float = 0.95,
+                            seed: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Estimate the similarity percentage from a random sample of word positions.
+
+        Reads ``sample_size`` random positions instead of both whole files and
+        reports a Wilson score interval for the result. Falls back to the
+        exact calculation when the sample would cover the files anyway.
+
+        Args:
+            file1_data: Data from first file
+            file2_data: Data from second file
+            sample_size: Number of positions compared
+            confidence: Confidence level of the interval (0-1)
+            seed: Optional seed for a reproducible sample
+
+        Returns:
+            Dict: The calculate_similarity fields (identical_bytes estimated)
+            plus estimated, sample_size, confidence and confidence_interval
+        """
+        try:
+            size1 = len(file1_data)
+            size2 = len(file2_data)
+            min_size = min(size1, size2)
+            max_size = max(size1, size2)
+            if sample_size <= 0 or sample_size >= min_size:
+                result = self.calculate_similarity(file1_data, file2_data)
+                result['estimated'] = False
+                return result
+
+            positions = np.random.default_rng(seed).integers(0, min_size, sample_size)
+            matches = int(np.count_nonzero(np.asarray(file1_data)[positions] == np.asarray(file2_data)[positions]))
+            rate = matches / sample_size
+
+            z = NormalDist().inv_cdf(0.5 + confidence / 2)
+            denominator = 1 + z * z / sample_size
+            centre = (rate + z * z / (2 * sample_size)) / denominator
+            margin = z * math.sqrt(rate * (1 - rate) / sample_size + z * z / (4 * sample_size ** 2)) / denominator
+            scale = min_size / max_size * 100
+
+            return {
+                'similarity_percentage': round(rate * scale, 2),
+                'identical_bytes': int(round(rate * min_size)),
+                'total_bytes': min_size,
+                'size_match': size1 == size2,
+                'file1_size': size1,
+                'file2_size': size2,
+                'estimated': True,
+                'sample_size': sample_size,
+                'confidence': confidence,
+                'confidence_interval': [round(max(0.0, centre - margin) * scale, 2),
+                                        round(min(1.0, centre + margin) * scale, 2)]
+            }
+        except Exception as e:
+            logger.error(f"Error estimating similarity: {e}")
+            return {
+                'similarity_percentage': 0,
+                'identical_bytes': 0,
+                'total_bytes': 0,
+                'size_match': False,
+                'file1_size': 0,
+                'file2_size': 0,
+                'estimated': True
+            }
+
+    def calculate_compatibility_from_differences(self, ori2_data: Union[List[int], np.ndarray],
+                                                 differences_data: Union[PatchSet, DiffResult, List[Dict]],
+                                                 max_incompatible_points: Optional[int] = MAX_INCOMPATIBLE_POINTS
+                                                 ) -> Dict[str, Any]:
         """
         Calculate compatibility based on differences data instead of full file comparison.
         
         This method compares the current values in ORI2 at the modification points
         against the expected original values (ori1_values) from the differences.
+        All points are checked with one vectorized gather; only the details of
+        the first ``max_incompatible_points`` mismatches are built as dicts.
         
         Args:
             ori2_data: Data from ORI2 file
-            differences_data: List of differences with memory_address, ori1_value, mod1_value
+            differences_data: PatchSet, DiffResult or list of differences with
+                memory_address, ori1_value, mod1_value
+            max_incompatible_points: Cap on the incompatible point details
+                returned (None returns all of them)
             
         Returns:
             Dict: Compatibility analysis containing:
                 - compatibility_percentage (float): Percentage of matching values at difference points
                 - matching_points (int): Number of positions where ORI2 matches expected ori1_value
                 - total_points (int): Total number of difference points checked
-                - incompatible_points (List): Details of incompatible positions
+                - incompatible_count (int): Number of positions that do not match
+                - incompatible_points (List): Details of incompatible positions, up to the cap
                 - analysis_type (str): Type of analysis performed
         """
         try:
-            if not differences_data:
+            if differences_data is None or not len(differences_data):
                 logger.warning("No differences data provided for compatibility check")
                 return {
                     'compatibility_percentage': 0,
                     'matching_points': 0,
                     'total_points': 0,
+                    'incompatible_count': 0,
                     'incompatible_points': [],
                     'analysis_type': 'differences_based',
                     'error': 'No differences data available'
                 }
             
-            matching_points = 0
-            total_points = len(differences_data)
-            incompatible_points = []
+            ori2_data = np.asarray(ori2_data)
+            offsets, expected_values, mod1_values = as_arrays(differences_data)
+            total_points = len(offsets)
             bytes_per_value = self.read_size // 8
             
             logger.debug(f"Analyzing {total_points} difference points for compatibility")
             
-            for i, diff in enumerate(differences_data):
-                memory_address = diff['memory_address']
-                expected_ori1_value = diff['ori1_value']
-                mod1_value = diff['mod1_value']
-                
-                # Convert memory address to data index
-                data_index = memory_address // bytes_per_value
-                
-                # Check if the index is within bounds
-                if data_index >= len(ori2_data):
+            # Convert memory addresses to data indices and gather the ORI2 values in one pass
+            indices = offsets // bytes_per_value
+            in_bounds = indices < len(ori2_data)
+            actual_values = np.zeros(total_points, dtype=np.int64)
+            actual_values[in_bounds] = ori2_data[indices[in_bounds]]
+            
+            # Check if the current ORI2 values match the expected original values
+            matches = in_bounds & (actual_values == expected_values)
+            matching_points = int(np.count_nonzero(matches))
+            
+            incompatible = np.flatnonzero(~matches)
+            incompatible_count = len(incompatible)
+            if max_incompatible_points is not None:
+                incompatible = incompatible[:max_incompatible_points]
+            
+            incompatible_points = []
+            for address, index, expected, actual, modification, valid in zip(
+                    offsets[incompatible].tolist(), indices[incompatible].tolist(),
+                    expected_values[incompatible].tolist(), actual_values[incompatible].tolist(),
+                    mod1_values[incompatible].tolist(), in_bounds[incompatible].tolist()):
+                if not valid:
                     incompatible_points.append({
-                        'address': memory_address,
-                        'index': data_index,
-                        'expected_value': expected_ori1_value,
+                        'address': address,
+                        'index': index,
+                        'expected_value': expected,
                         'actual_value': None,
                         'reason': 'Address out of bounds',
-                        'modification_value': mod1_value
+                        'modification_value': modification
                     })
-                    continue
-                
-                actual_ori2_value = ori2_data[data_index]
-                
-                # Check if the current ORI2 value matches the expected original value
-                if actual_ori2_value == expected_ori1_value:
-                    matching_points += 1
-                    logger.debug(f"✅ Point {i+1}: Address {memory_address:08X} - Expected: {expected_ori1_value}, Found: {actual_ori2_value} (MATCH)")
                 else:
                     incompatible_points.append({
-                        'address': memory_address,
-                        'index': data_index,
-                        'expected_value': expected_ori1_value,
-                        'actual_value': actual_ori2_value,
+                        'address': address,
+                        'index': index,
+                        'expected_value': expected,
+                        'actual_value': actual,
                         'reason': 'Value mismatch',
-                        'modification_value': mod1_value,
-                        'difference': abs(actual_ori2_value - expected_ori1_value)
+                        'modification_value': modification,
+                        'difference': abs(actual - expected)
                     })
-                    logger.debug(f"❌ Point {i+1}: Address {memory_address:08X} - Expected: {expected_ori1_value}, Found: {actual_ori2_value} (MISMATCH)")
             
             # Calculate compatibility percentage
             compatibility_percentage = (matching_points / total_points) * 100 if total_points > 0 else 0
@@ -436,12 +796,13 @@ class BinaryHandler:
             logger.info(f"Compatibility analysis complete:")
             logger.info(f"- Matching points: {matching_points}/{total_points}")
             logger.info(f"- Compatibility: {compatibility_percentage:.2f}%")
-            logger.info(f"- Incompatible points: {len(incompatible_points)}")
+            logger.info(f"- Incompatible points: {incompatible_count}")
             
             return {
                 'compatibility_percentage': round(compatibility_percentage, 2),
                 'matching_points': matching_points,
                 'total_points': total_points,
+                'incompatible_count': incompatible_count,
                 'incompatible_points': incompatible_points,
                 'analysis_type': 'differences_based',
                 'ori2_file_size': len(ori2_data)
@@ -453,6 +814,7 @@ class BinaryHandler:
                 'compatibility_percentage': 0,
                 'matching_points': 0,
                 'total_points': 0,
+                'incompatible_count': 0,
                 'incompatible_points': [],
                 'analysis_type': 'differences_based',
                 'error': str(e)
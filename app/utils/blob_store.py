@@ -0,0 +1,210 @@
+"""
+Blob Store Module
+
+Content-addressed layer shared by the storage backends:
+- Permanent solution files are stored once per content, under
+  ``blobs/{sha[:2]}/{sha256}``, whatever solution or file name they belong to
+- ``file_metadata`` rows point at the blob (``s3_key``) and record its hash
+- ``file_blobs`` keeps one row per blob with the number of file_metadata rows
+  referencing it; a blob is deleted when the last reference goes away
+
+Only the bookkeeping lives here; reading and writing the objects themselves
+is left to each backend. Files stored before this layer keep their
+per-solution keys and a NULL hash, and are deleted with the solution prefix.
+
+Deduplication takes its reference up front: acquire_blob increments the
+count of a live blob in one statement, so a concurrent release can no longer
+delete the object between the lookup and link_files. Temp uploads never
+point at blobs, as nothing would hold a reference for them.
+"""
+
+import hashlib
+import logging
+from typing import Optional, Dict, List, Tuple, Any, Iterable
+
+from psycopg2.extras import execute_values
+from app.database.db_pool import pooled_connection
+from app.utils.streams import STREAM_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs'
+
+
+def blob_key(sha256: str) -> str:
+    """Storage key of the blob holding the content with this SHA-256."""
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}"
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a local file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def acquire_blob(sha256: str) -> Optional[Dict[str, Any]]:
+    """
+    Take a reference on a stored blob, if it exists.
+
+    The caller owns the reference: it passes the hash to link_files in
+    ``held``, or gives it back with release_blobs if linking fails.
+
+    Returns:
+        Optional[Dict]: {'key', 'size'} of the blob, or None if it does not exist
+    """
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE file_blobs SET ref_count = ref_count + 1
+                WHERE sha256 = %s AND ref_count > 0
+                RETURNING s3_key, file_size
+            """, (sha256,))
+            result = cur.fetchone()
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error acquiring blob {sha256}: {e}")
+        return None
+
+    if not result:
+        return None
+    return {'key': result[0], 'size': result[1]}
+
+
+def link_files(solution_id: int, rows: List[Tuple[str, str, int, str, str]],
+               held: Iterable[str] = ()) -> List[str]:
+    """
+    Point a solution's files at their blobs in one transaction.
+
+    Args:
+        solution_id: Solution ID
+        rows: (file_type, file_name, file_size, blob_key, sha256) tuples
+        held: Hashes whose reference the caller already took with acquire_blob
+            (one entry per reference); these rows do not add another one
+
+    Returns:
+        List[str]: Keys of blobs no longer referenced by anything (the files
+        these rows replaced); the caller deletes the objects
+
+    Raises:
+        Exception: If the solution does not exist or the write fails
+    """
+    file_types = [row[0] for row in rows]
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM solutions WHERE id = %s", (solution_id,))
+        if not cur.fetchone():
+            cur.close()
+            raise ValueError(f"Solution {solution_id} not found — file metadata not saved")
+
+        cur.execute("""
+            SELECT sha256 FROM file_metadata
+            WHERE solution_id = %s AND file_type = ANY(%s) AND sha256 IS NOT NULL
+            FOR UPDATE
+        """, (solution_id, file_types))
+        replaced = [result[0] for result in cur.fetchall()]
+
+        execute_values(cur, """
+            INSERT INTO file_metadata (solution_id, file_type, file_name, file_size, s3_key, sha256)
+            VALUES %s
+            ON CONFLICT (solution_id, file_type) DO UPDATE SET
+                file_name = EXCLUDED.file_name,
+                file_size = EXCLUDED.file_size,
+                s3_key = EXCLUDED.s3_key,
+                sha256 = EXCLUDED.sha256,
+                uploaded_at = CURRENT_TIMESTAMP
+        """, [(solution_id,) + tuple(row) for row in rows])
+
+        held = list(held)
+        for _, _, file_size, key, sha256 in rows:
+            if sha256 in held:
+                held.remove(sha256)
+                continue
+            cur.execute("""
+                INSERT INTO file_blobs (sha256, s3_key, file_size, ref_count)
+                VALUES (%s, %s, %s, 1)
+                ON CONFLICT (sha256) DO UPDATE SET ref_count = file_blobs.ref_count + 1
+            """, (sha256, key, file_size))
+
+        released = _release(cur, replaced)
+        cur.close()
+    return released
+
+
+def release_solution_files(solution_id: int) -> List[str]:
+    """
+    Drop a solution's file and differences metadata and its blob references.
+
+    Returns:
+        List[str]: Keys of blobs no longer referenced by any solution
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT sha256 FROM file_metadata
+            WHERE solution_id = %s AND sha256 IS NOT NULL
+            FOR UPDATE
+        """, (solution_id,))
+        referenced = [result[0] for result in cur.fetchall()]
+
+        cur.execute("DELETE FROM file_metadata WHERE solution_id = %s", (solution_id,))
+        cur.execute("DELETE FROM differences_metadata WHERE solution_id = %s", (solution_id,))
+
+        released = _release(cur, referenced)
+        cur.close()
+    return released
+
+
+def release_blobs(hashes: List[str]) -> List[str]:
+    """
+    Give back references taken with acquire_blob that were never linked.
+
+    Returns:
+        List[str]: Keys of blobs no longer referenced by anything
+    """
+    with pooled_connection() as conn:
+        cur = conn.cursor()
+        released = _release(cur, hashes)
+        cur.close()
+    return released
+
+
+def _release(cur, hashes: List[str]) -> List[str]:
+    """Drop one reference per entry in ``hashes``; return keys of blobs left unreferenced."""
+    if not hashes:
+        return []
+
+    counts: Dict[str, int] = {}
+    for sha256 in hashes:
+        counts[sha256] = counts.get(sha256, 0) + 1
+
+    execute_values(cur, """
+        UPDATE file_blobs SET ref_count = file_blobs.ref_count - released.n
+        FROM (VALUES %s) AS released (sha256, n)
+        WHERE file_blobs.sha256 = released.sha256
+    """, list(counts.items()))
+    cur.execute(
+        "DELETE FROM file_blobs WHERE sha256 = ANY(%s) AND ref_count <= 0 RETURNING s3_key",
+        (list(counts),)
+    )
+    return [result[0] for result in cur.fetchall()]
+
+
+def get_file_sha256(solution_id: int, file_type: str) -> Optional[str]:
+    """Content hash of a stored solution file, or None for files stored before blobs."""
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT sha256 FROM file_metadata WHERE solution_id = %s AND file_type = %s",
+                (solution_id, file_type)
+            )
+            result = cur.fetchone()
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error getting hash of {solution_id}/{file_type}: {e}")
+        return None
+    return result[0] if result else None
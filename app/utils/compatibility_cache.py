@@ -0,0 +1,105 @@
+"""
+Compatibility Cache Module
+
+Memoizes ORI2 vs ORI1 compatibility results so that checking the same ORI2
+against the same solution again needs neither file:
+- Results are keyed by the SHA-256 of the ORI2, the SHA-256 of the
+  solution's ORI1 and the bit size, so they stay valid for any solution
+  sharing that ORI1 and are never stale (different content, different key)
+- The similarity threshold and early-exit mode are part of the key too,
+  since a comparison that stopped early only carries bounds for them
+- A bounded in-process LRU sits in front of the ``compatibility_results``
+  PostgreSQL table, which is shared by every worker process
+"""
+
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+CacheKey = Tuple[str, str, int, float, str]
+
+from psycopg2.extras import Json
+from app.database.db_pool import pooled_connection
+
+logger = logging.getLogger(__name__)
+
+
+class CompatibilityCache:
+    """LRU of compatibility results backed by PostgreSQL."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_size: int) -> None:
+        with self._lock:
+            self.max_size = max_size
+            self._entries.clear()
+
+    def get(self, ori2_sha256: str, ori1_sha256: str, bit_size: int,
+            threshold: float, early_exit: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result, or None if this pair was never checked this way."""
+        key = (ori2_sha256, ori1_sha256, bit_size, float(threshold), early_exit)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(result)
+
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT result FROM compatibility_results
+                    WHERE ori2_sha256 = %s AND ori1_sha256 = %s AND bit_size = %s
+                      AND threshold = %s AND early_exit = %s
+                """, key)
+                row = cur.fetchone()
+                cur.close()
+        except Exception as e:
+            logger.error(f"Error reading cached compatibility result: {e}")
+            return None
+
+        if not row:
+            return None
+        self._remember(key, row[0])
+        return copy.deepcopy(row[0])
+
+    def set(self, ori2_sha256: str, ori1_sha256: str, bit_size: int,
+            threshold: float, early_exit: str, result: Dict[str, Any]) -> None:
+        key = (ori2_sha256, ori1_sha256, bit_size, float(threshold), early_exit)
+        self._remember(key, copy.deepcopy(result))
+
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO compatibility_results (ori2_sha256, ori1_sha256, bit_size, threshold, early_exit, result)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (ori2_sha256, ori1_sha256, bit_size, threshold, early_exit) DO UPDATE SET
+                        result = EXCLUDED.result,
+                        created_at = CURRENT_TIMESTAMP
+                """, key + (Json(result),))
+                cur.close()
+        except Exception as e:
+            logger.error(f"Error saving compatibility result: {e}")
+
+    def _remember(self, key: CacheKey, result: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Process-wide instance
+compatibility_cache = CompatibilityCache()
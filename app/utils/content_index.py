@@ -0,0 +1,160 @@
+"""
+Content Index Module
+
+Finds the stored ORI1 files matching an uploaded ORI2 by content alone, so
+candidate solutions can be proposed before any vehicle data is entered:
+- Exact matches come from the whole-file SHA-256 already kept in
+  ``file_metadata``
+- Near-identical files are found through block hashes: every indexed blob is
+  cut into INDEX_BLOCK_SIZE aligned blocks whose 64-bit hashes are stored in
+  ``blob_block_hashes``; a lookup hashes the ORI2 the same way and ranks the
+  ORI1s by the Jaccard similarity of both block sets
+
+ECU images keep their layout between software versions (changes overwrite
+bytes, they do not shift them), so aligned blocks are enough and no rolling
+hash is needed. Blocks made of a single repeated byte (erased flash,
+padding) are left out: they would match nearly every file.
+
+Index rows belong to the blob and are deleted with it. Files stored before
+content hashing have no blob and are never indexed.
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+from typing import Optional, Dict, List, Any, Union
+
+import numpy as np
+from psycopg2.extras import execute_values
+from app.database.db_pool import pooled_connection
+
+logger = logging.getLogger(__name__)
+
+INDEX_BLOCK_SIZE = 4096
+
+# Minimum Jaccard similarity of the block sets for a near-identical match
+MIN_CANDIDATE_SCORE = 0.5
+
+
+def block_hashes(data: Union[bytes, bytearray, memoryview, mmap.mmap],
+                 block_size: int = INDEX_BLOCK_SIZE) -> np.ndarray:
+    """Sorted, distinct signed 64-bit hashes of the non-uniform aligned blocks of ``data``."""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.empty(0, dtype=np.int64)
+
+    starts = np.arange(0, len(raw), block_size)
+    full = len(raw) // block_size
+    blocks = raw[:full * block_size].reshape(full, block_size)
+    informative = np.ones(len(starts), dtype=bool)
+    informative[:full] = (blocks != blocks[:, :1]).any(axis=1)
+    if len(starts) > full:
+        tail = raw[full * block_size:]
+        informative[full] = bool((tail != tail[0]).any())
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(raw[start:start + block_size], digest_size=8).digest(), 'little', signed=True)
+        for start in starts[informative].tolist()
+    ]
+    return np.unique(np.array(hashes, dtype=np.int64))
+
+
+def is_indexed(sha256: str) -> bool:
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM blob_signatures WHERE sha256 = %s", (sha256,))
+            result = cur.fetchone()
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error checking content index for {sha256}: {e}")
+        return False
+    return result is not None
+
+
+def index_blob(sha256: str, data: Union[bytes, bytearray, memoryview, mmap.mmap]) -> bool:
+    """
+    Add the block hashes of a stored blob to the index (no-op if already indexed).
+
+    Args:
+        sha256: Content hash of the blob (must exist in file_blobs)
+        data: Blob contents
+
+    Returns:
+        bool: True if the blob is indexed
+    """
+    hashes = block_hashes(data)
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO blob_signatures (sha256, block_size, block_count)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (sha256) DO NOTHING
+            """, (sha256, INDEX_BLOCK_SIZE, len(hashes)))
+            if cur.rowcount and len(hashes):
+                execute_values(cur, """
+                    INSERT INTO blob_block_hashes (block_hash, sha256) VALUES %s
+                    ON CONFLICT DO NOTHING
+                """, [(block_hash, sha256) for block_hash in hashes.tolist()], page_size=1000)
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error indexing blob {sha256}: {e}")
+        return False
+
+    logger.info(f"Indexed blob {sha256[:12]}: {len(hashes)} blocks")
+    return True
+
+
+def find_candidates(data: Union[bytes, bytearray, memoryview, mmap.mmap], sha256: Optional[str] = None,
+                    limit: int = 10, min_score: float = MIN_CANDIDATE_SCORE) -> List[Dict[str, Any]]:
+    """
+    Find the solutions whose ORI1 matches ``data`` exactly or nearly.
+
+    Args:
+        data: Contents of the uploaded file
+        sha256: Its SHA-256, for exact matches
+        limit: Maximum number of candidates returned
+        min_score: Minimum block similarity (0-1) of near-identical matches
+
+    Returns:
+        List[Dict]: {'solution_id', 'score', 'exact'} sorted by score, best first
+    """
+    hashes = block_hashes(data)
+    candidates: Dict[int, Dict[str, Any]] = {}
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            if sha256:
+                cur.execute(
+                    "SELECT solution_id FROM file_metadata WHERE file_type = 'ori1' AND sha256 = %s",
+                    (sha256,)
+                )
+                for (solution_id,) in cur.fetchall():
+                    candidates[solution_id] = {'solution_id': solution_id, 'score': 1.0, 'exact': True}
+
+            if len(hashes):
+                # Jaccard >= min_score requires sharing at least min_score of the ORI2 blocks
+                cur.execute("""
+                    SELECT fm.solution_id, matched.shared, bs.block_count
+                    FROM (
+                        SELECT sha256, COUNT(*) AS shared
+                        FROM blob_block_hashes
+                        WHERE block_hash = ANY(%s)
+                        GROUP BY sha256
+                        HAVING COUNT(*) >= %s
+                    ) matched
+                    JOIN blob_signatures bs ON bs.sha256 = matched.sha256
+                    JOIN file_metadata fm ON fm.sha256 = matched.sha256 AND fm.file_type = 'ori1'
+                """, (hashes.tolist(), max(1, math.ceil(min_score * len(hashes)))))
+                for solution_id, shared, block_count in cur.fetchall():
+                    score = shared / (len(hashes) + block_count - shared)
+                    if score >= min_score and solution_id not in candidates:
+                        candidates[solution_id] = {'solution_id': solution_id, 'score': round(score, 4), 'exact': False}
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error looking up content index: {e}")
+        return []
+
+    return sorted(candidates.values(), key=lambda candidate: candidate['score'], reverse=True)[:limit]
@@ -0,0 +1,693 @@
+"""
+Diff Engine Module
+
+This module provides the array-based difference engine used by BinaryHandler:
+- Vectorized mismatch detection between two decoded binary files
+- Parallel offset/old/new arrays instead of per-difference tuples
+- A lazy (offset, old_value, new_value) view for existing callers
+- Run-length patch regions for storing and applying ORI1 -> MOD1 changes
+- A versioned, compressed binary on-disk format for patch regions
+- Chunked, thread-parallel comparison of large (memory-mapped) files
+- Streaming diff, serialization and deserialization of patch regions, so
+  compare -> persist -> apply never holds all differences at once
+
+Differences are kept as NumPy arrays end to end; Python objects are only
+created when a caller indexes or iterates the result.
+"""
+
+import io
+import os
+import json
+import logging
+import struct
+import zlib
+from collections.abc import Sequence, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Union, Any, NamedTuple, Optional, BinaryIO
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Little-endian NumPy dtypes for each supported read size
+DTYPE_MAP = {8: np.dtype('u1'), 16: np.dtype('<u2'), 32: np.dtype('<u4')}
+
+# Binary differences format: magic, version, bit size, compression, region count.
+# Version 1 stores all offsets, lengths, original and modified bytes as columns;
+# version 2 streams one record per region (REGION_HEADER, original bytes,
+# modified bytes) up to an empty record, and leaves the region count at 0.
+FORMAT_MAGIC = b'SMDF'
+FORMAT_VERSION = 2
+FORMAT_HEADER = struct.Struct('<4sBBBxI')
+REGION_HEADER = struct.Struct('<QI')
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+
+# Bytes read from the source per step when decoding a stream
+STREAM_READ_SIZE = 64 * 1024
+
+# Chunked comparisons: bytes per task and worker threads. NumPy releases the
+# GIL while comparing, so the chunks of one file really run in parallel and
+# only one chunk's temporaries per thread are alive at a time.
+CHUNK_BYTES = 2 * 1024 * 1024
+CHUNK_WORKERS = min(4, os.cpu_count() or 1)
+
+# Object names inside solutions/{id}/differences/
+DIFFERENCES_FILE = 'differences.bin'
+LEGACY_DIFFERENCES_FILE = 'differences.json'
+
+
+class DiffResult(Sequence):
+    """
+    Differences between two files stored as three parallel arrays.
+
+    Indexing or iterating yields (offset, old_value, new_value) tuples of
+    plain ints, so code written against the old list-of-tuples API keeps
+    working without materializing the whole list.
+
+    Attributes:
+        offsets (np.ndarray): Byte offsets of each differing word
+        old_values (np.ndarray): Values in the original file
+        new_values (np.ndarray): Values in the modified file
+        bit_size (int): Word size in bits (8, 16 or 32)
+    """
+
+    def __init__(self, offsets: np.ndarray, old_values: np.ndarray,
+                 new_values: np.ndarray, bit_size: int):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.old_values = np.asarray(old_values)
+        self.new_values = np.asarray(new_values)
+        self.bit_size = bit_size
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(zip(self.offsets[index].tolist(),
+                            self.old_values[index].tolist(),
+                            self.new_values[index].tolist()))
+        return (int(self.offsets[index]), int(self.old_values[index]), int(self.new_values[index]))
+
+    def __iter__(self):
+        return zip(self.offsets.tolist(), self.old_values.tolist(), self.new_values.tolist())
+
+    def __repr__(self):
+        return f'<DiffResult {len(self)} differences, {self.bit_size}-bit>'
+
+    def to_list(self) -> List[List[int]]:
+        """
+        Convert to a JSON-friendly list of [offset, old_value, new_value].
+
+        Returns:
+            List[List[int]]: Differences as nested lists
+        """
+        return np.column_stack(
+            (self.offsets, self.old_values.astype(np.int64), self.new_values.astype(np.int64))
+        ).tolist()
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        Convert to the dict format used by the storage backends.
+
+        Returns:
+            List[Dict]: Dicts with memory_address, ori1_value, mod1_value, bit_size
+        """
+        return [
+            {'memory_address': offset, 'ori1_value': old, 'mod1_value': new, 'bit_size': self.bit_size}
+            for offset, old, new in self
+        ]
+
+
+def diff_arrays(data1: np.ndarray, data2: np.ndarray, bit_size: int) -> DiffResult:
+    """
+    Compute differences between two decoded files with one vectorized comparison.
+
+    Only the overlapping prefix of both arrays is compared.
+
+    Args:
+        data1: Words from the original file
+        data2: Words from the modified file
+        bit_size: Word size in bits
+
+    Returns:
+        DiffResult: Offsets and values of every differing word
+    """
+    data1 = np.asarray(data1)
+    data2 = np.asarray(data2)
+    min_len = min(len(data1), len(data2))
+
+    indices = np.nonzero(data1[:min_len] != data2[:min_len])[0]
+    offsets = indices.astype(np.int64) * (bit_size // 8)
+
+    return DiffResult(offsets, data1[indices], data2[indices], bit_size)
+
+
+def diff_arrays_chunked(data1: np.ndarray, data2: np.ndarray, bit_size: int,
+                        chunk_bytes: int = CHUNK_BYTES, max_workers: int = CHUNK_WORKERS) -> DiffResult:
+    """
+    Same result as diff_arrays, computed over word-aligned chunks on a thread pool.
+
+    Each chunk is diffed separately and the parts are concatenated in offset
+    order, so the full-size mismatch mask of diff_arrays is never built.
+    Inputs may be views on memory-mapped files.
+
+    Args:
+        data1: Words from the original file
+        data2: Words from the modified file
+        bit_size: Word size in bits
+        chunk_bytes: Bytes of each file compared per task
+        max_workers: Threads comparing chunks concurrently
+
+    Returns:
+        DiffResult: Offsets and values of every differing word
+    """
+    data1 = np.asarray(data1)
+    data2 = np.asarray(data2)
+    width = bit_size // 8
+    min_len = min(len(data1), len(data2))
+    chunk_words = max(1, chunk_bytes // width)
+    if min_len <= chunk_words:
+        return diff_arrays(data1, data2, bit_size)
+
+    def diff_chunk(start: int) -> DiffResult:
+        return _diff_chunk(data1, data2, bit_size, start, min(start + chunk_words, min_len))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        parts = list(executor.map(diff_chunk, range(0, min_len, chunk_words)))
+
+    return DiffResult(
+        np.concatenate([part.offsets for part in parts]),
+        np.concatenate([part.old_values for part in parts]),
+        np.concatenate([part.new_values for part in parts]),
+        bit_size
+    )
+
+
+def _diff_chunk(data1: np.ndarray, data2: np.ndarray, bit_size: int, start: int, end: int) -> DiffResult:
+    """diff_arrays of words [start, end) with offsets relative to the whole file."""
+    part = diff_arrays(data1[start:end], data2[start:end], bit_size)
+    part.offsets += start * (bit_size // 8)
+    return part
+
+
+def iter_differences(data1: np.ndarray, data2: np.ndarray, bit_size: int,
+                     chunk_bytes: int = CHUNK_BYTES) -> Iterator[DiffResult]:
+    """
+    Yield the differences of two decoded files one chunk at a time, in offset order.
+
+    Only one chunk's comparison is alive at a time, whatever the file size
+    or number of differences.
+
+    Args:
+        data1: Words from the original file
+        data2: Words from the modified file
+        bit_size: Word size in bits
+        chunk_bytes: Bytes of each file compared per step
+
+    Yields:
+        DiffResult: Differences of each chunk (offsets relative to the file)
+    """
+    data1 = np.asarray(data1)
+    data2 = np.asarray(data2)
+    min_len = min(len(data1), len(data2))
+    chunk_words = max(1, chunk_bytes // (bit_size // 8))
+    for start in range(0, min_len, chunk_words):
+        yield _diff_chunk(data1, data2, bit_size, start, min(start + chunk_words, min_len))
+
+
+def count_equal_chunked(data1: np.ndarray, data2: np.ndarray, chunk_bytes: int = CHUNK_BYTES,
+                        max_workers: int = CHUNK_WORKERS) -> int:
+    """
+    Count the positions where two equal-length word arrays hold the same value.
+
+    Like diff_arrays_chunked, works chunk by chunk on a thread pool so
+    memory use does not grow with the file size.
+    """
+    data1 = np.asarray(data1)
+    data2 = np.asarray(data2)
+    length = len(data1)
+    chunk_words = max(1, chunk_bytes // max(1, data1.itemsize))
+    if length <= chunk_words:
+        return int(np.count_nonzero(data1 == data2))
+
+    def count_chunk(start: int) -> int:
+        end = min(start + chunk_words, length)
+        return int(np.count_nonzero(data1[start:end] == data2[start:end]))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return sum(executor.map(count_chunk, range(0, length, chunk_words)))
+
+
+def as_arrays(differences: Union['PatchSet', DiffResult, List[Dict[str, Any]], List[Tuple[int, int, int]]]
+              ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Return (offsets, old_values, new_values) arrays for any differences container.
+
+    Args:
+        differences: PatchSet, DiffResult, legacy difference dicts (memory_address,
+            ori1_value, mod1_value) or sequence of (offset, old_value, new_value)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Parallel int64 arrays
+    """
+    if isinstance(differences, PatchSet):
+        differences = differences.to_diff()
+
+    if isinstance(differences, DiffResult):
+        return (differences.offsets,
+                differences.old_values.astype(np.int64),
+                differences.new_values.astype(np.int64))
+
+    if not len(differences):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty.copy(), empty.copy()
+
+    if isinstance(differences[0], dict):
+        count = len(differences)
+        return (np.fromiter((r['memory_address'] for r in differences), dtype=np.int64, count=count),
+                np.fromiter((r['ori1_value'] for r in differences), dtype=np.int64, count=count),
+                np.fromiter((r['mod1_value'] for r in differences), dtype=np.int64, count=count))
+
+    table = np.asarray(differences, dtype=np.int64).reshape(-1, 3)
+    return table[:, 0], table[:, 1], table[:, 2]
+
+
+class PatchRegion(NamedTuple):
+    """A contiguous run of modified bytes."""
+    offset: int
+    original: bytes
+    modified: bytes
+
+    @property
+    def length(self) -> int:
+        return len(self.original)
+
+
+def iter_regions(differences: Iterable[DiffResult]) -> Iterator[PatchRegion]:
+    """
+    Group a stream of per-chunk differences into patch regions.
+
+    Regions are not merged across chunks, so none is longer than a chunk; a
+    run crossing a chunk boundary becomes two adjacent regions with the same
+    effect.
+    """
+    for part in differences:
+        yield from PatchSet.from_diff(part).regions
+
+
+def apply_regions(data: np.ndarray, regions: Iterable[PatchRegion]) -> np.ndarray:
+    """
+    Write the modified bytes of every region into a writable word array.
+
+    Regions (or their tails) beyond the end of the data are skipped.
+
+    Args:
+        data: Writable array of words
+        regions: Patch regions, e.g. streamed by read_regions
+
+    Returns:
+        np.ndarray: The same array, modified in place
+    """
+    buffer = data.view(np.uint8)
+    size = len(buffer)
+    for region in regions:
+        if region.offset >= size:
+            continue
+        end = min(region.offset + region.length, size)
+        buffer[region.offset:end] = np.frombuffer(region.modified, dtype=np.uint8)[:end - region.offset]
+    return data
+
+
+def write_regions(fileobj: BinaryIO, regions: Iterable[PatchRegion], bit_size: int,
+                  compress: bool = True) -> Tuple[int, int]:
+    """
+    Stream regions into ``fileobj`` in the version 2 binary format.
+
+    Args:
+        fileobj: Writable binary file object
+        regions: Patch regions in offset order
+        bit_size: Word size the differences were computed with
+        compress: Compress the payload with zlib
+
+    Returns:
+        Tuple[int, int]: (regions written, total differences)
+    """
+    compressor = zlib.compressobj(6) if compress else None
+    compression = COMPRESSION_ZLIB if compress else COMPRESSION_NONE
+    fileobj.write(FORMAT_HEADER.pack(FORMAT_MAGIC, FORMAT_VERSION, bit_size, compression, 0))
+
+    def emit(data: bytes) -> None:
+        fileobj.write(compressor.compress(data) if compressor else data)
+
+    count = changed_bytes = 0
+    for region in regions:
+        emit(REGION_HEADER.pack(region.offset, region.length))
+        emit(region.original)
+        emit(region.modified)
+        count += 1
+        changed_bytes += region.length
+    emit(REGION_HEADER.pack(0, 0))
+    if compressor:
+        fileobj.write(compressor.flush())
+
+    return count, changed_bytes // (bit_size // 8)
+
+
+class _PayloadReader:
+    """Exact-size reads from a (possibly zlib-compressed) forward-only stream."""
+
+    def __init__(self, fileobj: BinaryIO, compression: int, prefix: bytes = b''):
+        self._fileobj = fileobj
+        self._decompressor = zlib.decompressobj() if compression == COMPRESSION_ZLIB else None
+        self._pending = prefix
+        self._buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            data = self._pending or (self._decompressor.unconsumed_tail if self._decompressor else b'')
+            self._pending = b''
+            if not data:
+                data = self._fileobj.read(STREAM_READ_SIZE)
+            if not data:
+                if self._decompressor:
+                    self._buffer += self._decompressor.flush()
+                break
+            if self._decompressor:
+                # Bound the output of each step: tuning data compresses very well
+                self._buffer += self._decompressor.decompress(data, STREAM_READ_SIZE)
+            else:
+                self._buffer += data
+
+        if len(self._buffer) < size:
+            raise ValueError("Corrupt differences data: truncated stream")
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+def _iter_records(reader: _PayloadReader, fileobj: BinaryIO, close: bool) -> Iterator[PatchRegion]:
+    try:
+        while True:
+            try:
+                offset, length = REGION_HEADER.unpack(reader.read(REGION_HEADER.size))
+                if not length:
+                    return
+                original = reader.read(length)
+                modified = reader.read(length)
+            except (struct.error, zlib.error) as e:
+                raise ValueError(f"Corrupt differences data: {e}") from e
+            yield PatchRegion(offset, original, modified)
+    finally:
+        if close:
+            fileobj.close()
+
+
+def read_regions(fileobj: BinaryIO, close: bool = False) -> Tuple[int, Iterator[PatchRegion]]:
+    """
+    Open a stored differences stream and iterate its regions lazily.
+
+    Version 2 objects are decoded record by record as the iterator advances.
+    Version 1 and legacy JSON objects have no record framing and are loaded
+    whole before iterating.
+
+    Args:
+        fileobj: Readable binary file object (only read() is used)
+        close: Close ``fileobj`` once the regions are exhausted
+
+    Returns:
+        Tuple[int, Iterator[PatchRegion]]: Bit size and region iterator
+
+    Raises:
+        ValueError: If the header is invalid or the version is unsupported;
+            the iterator raises it too for truncated or corrupt records
+    """
+    header = fileobj.read(FORMAT_HEADER.size)
+    if header[:len(FORMAT_MAGIC)] == FORMAT_MAGIC and len(header) < FORMAT_HEADER.size:
+        if close:
+            fileobj.close()
+        raise ValueError("Corrupt differences data: truncated header")
+    if header[:len(FORMAT_MAGIC)] != FORMAT_MAGIC or FORMAT_HEADER.unpack(header)[1] != FORMAT_VERSION:
+        try:
+            differences = load_differences(header + fileobj.read())
+        finally:
+            if close:
+                fileobj.close()
+        return differences.bit_size, iter(differences.regions)
+
+    _, _, bit_size, compression, _ = FORMAT_HEADER.unpack(header)
+    if compression not in (COMPRESSION_NONE, COMPRESSION_ZLIB):
+        if close:
+            fileobj.close()
+        raise ValueError(f"Unsupported differences compression: {compression}")
+    return bit_size, _iter_records(_PayloadReader(fileobj, compression), fileobj, close)
+
+
+class PatchSet(Sequence):
+    """
+    ORI1 -> MOD1 differences grouped into contiguous patch regions.
+
+    Tuning changes cluster into maps, so a few hundred regions typically
+    replace tens of thousands of per-word difference records.
+
+    Attributes:
+        regions (List[PatchRegion]): Regions sorted by offset
+        bit_size (int): Word size the differences were computed with
+    """
+
+    def __init__(self, regions: List[PatchRegion], bit_size: int = 8):
+        self.regions = regions
+        self.bit_size = bit_size
+
+    def __len__(self) -> int:
+        return len(self.regions)
+
+    def __getitem__(self, index):
+        return self.regions[index]
+
+    def __repr__(self):
+        return f'<PatchSet {len(self)} regions, {self.total_differences} differences, {self.bit_size}-bit>'
+
+    @property
+    def total_differences(self) -> int:
+        """Number of differing words covered by all regions."""
+        return self.changed_bytes // (self.bit_size // 8)
+
+    @property
+    def changed_bytes(self) -> int:
+        """Number of bytes covered by all regions."""
+        return sum(region.length for region in self.regions)
+
+    @classmethod
+    def from_diff(cls, differences: DiffResult) -> 'PatchSet':
+        """
+        Group per-word differences into contiguous regions.
+
+        Args:
+            differences: Result of diff_arrays
+
+        Returns:
+            PatchSet: Regions covering every differing word
+        """
+        bit_size = differences.bit_size
+        width = bit_size // 8
+        count = len(differences)
+        if not count:
+            return cls([], bit_size)
+
+        offsets = differences.offsets
+        breaks = np.nonzero(np.diff(offsets) != width)[0] + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [count]))
+
+        dtype = DTYPE_MAP[bit_size]
+        original = differences.old_values.astype(dtype).tobytes()
+        modified = differences.new_values.astype(dtype).tobytes()
+
+        regions = [
+            PatchRegion(int(offsets[start]), original[start * width:end * width], modified[start * width:end * width])
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ]
+        return cls(regions, bit_size)
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]], bit_size: Optional[int] = None) -> 'PatchSet':
+        """
+        Build regions from legacy per-word difference dicts.
+
+        Args:
+            records: Dicts with memory_address, ori1_value, mod1_value, bit_size
+            bit_size: Word size to use when records is empty
+
+        Returns:
+            PatchSet: Equivalent region representation
+        """
+        if records:
+            bit_size = records[0].get('bit_size', bit_size or 8)
+        bit_size = bit_size or 8
+        records = sorted(records, key=lambda record: record['memory_address'])
+        differences = DiffResult(
+            np.fromiter((r['memory_address'] for r in records), dtype=np.int64, count=len(records)),
+            np.fromiter((r['ori1_value'] for r in records), dtype=np.int64, count=len(records)),
+            np.fromiter((r['mod1_value'] for r in records), dtype=np.int64, count=len(records)),
+            bit_size
+        )
+        return cls.from_diff(differences)
+
+    def to_diff(self) -> DiffResult:
+        """
+        Expand regions back into per-word differences.
+
+        Returns:
+            DiffResult: One entry per differing word
+        """
+        width = self.bit_size // 8
+        dtype = DTYPE_MAP[self.bit_size]
+        if not self.regions:
+            empty = np.empty(0, dtype=np.int64)
+            return DiffResult(empty, np.empty(0, dtype=dtype), np.empty(0, dtype=dtype), self.bit_size)
+
+        offsets = np.concatenate([
+            np.arange(region.offset, region.offset + region.length, width, dtype=np.int64)
+            for region in self.regions
+        ])
+        original = np.frombuffer(b''.join(region.original for region in self.regions), dtype=dtype)
+        modified = np.frombuffer(b''.join(region.modified for region in self.regions), dtype=dtype)
+        return DiffResult(offsets, original, modified, self.bit_size)
+
+    def apply(self, data: np.ndarray) -> np.ndarray:
+        """
+        Write the modified bytes of every region into a writable word array.
+
+        Regions (or their tails) beyond the end of the data are skipped.
+
+        Args:
+            data: Writable array of words in this patch's bit size
+
+        Returns:
+            np.ndarray: The same array, modified in place
+        """
+        return apply_regions(data, self.regions)
+
+    def to_document(self) -> Dict[str, Any]:
+        """
+        Serialize regions into a JSON-friendly dict.
+
+        Returns:
+            Dict: Document with format, bit_size, total_differences and hex-encoded regions
+        """
+        return {
+            'format': 'regions',
+            'bit_size': self.bit_size,
+            'total_differences': self.total_differences,
+            'regions': [
+                {
+                    'offset': region.offset,
+                    'length': region.length,
+                    'ori1': region.original.hex(),
+                    'mod1': region.modified.hex()
+                }
+                for region in self.regions
+            ]
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> 'PatchSet':
+        """
+        Load regions from a stored document, including legacy per-word documents.
+
+        Args:
+            document: Parsed differences document
+
+        Returns:
+            PatchSet: Loaded regions
+        """
+        if 'regions' not in document:
+            return cls.from_records(document.get('differences') or [])
+
+        regions = [
+            PatchRegion(region['offset'], bytes.fromhex(region['ori1']), bytes.fromhex(region['mod1']))
+            for region in document['regions']
+        ]
+        return cls(regions, document.get('bit_size', 8))
+
+    def to_bytes(self, compress: bool = True) -> bytes:
+        """
+        Serialize regions into the versioned binary differences format.
+
+        Args:
+            compress: Compress the payload with zlib
+
+        Returns:
+            bytes: Encoded differences (see write_regions)
+        """
+        buffer = io.BytesIO()
+        write_regions(buffer, self.regions, self.bit_size, compress)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PatchSet':
+        """
+        Load regions from the binary differences format (version 1 or 2).
+
+        Args:
+            data: Encoded differences
+
+        Returns:
+            PatchSet: Decoded regions
+
+        Raises:
+            ValueError: If the header is invalid or the version is unsupported
+        """
+        magic, version, bit_size, compression, count = FORMAT_HEADER.unpack_from(data)
+        if magic != FORMAT_MAGIC:
+            raise ValueError("Not a binary differences file")
+        if version == FORMAT_VERSION:
+            bit_size, regions = read_regions(io.BytesIO(data))
+            return cls(list(regions), bit_size)
+        if version != 1:
+            raise ValueError(f"Unsupported differences format version: {version}")
+
+        payload = data[FORMAT_HEADER.size:]
+        if compression == COMPRESSION_ZLIB:
+            payload = zlib.decompress(payload)
+        elif compression != COMPRESSION_NONE:
+            raise ValueError(f"Unsupported differences compression: {compression}")
+
+        offsets = np.frombuffer(payload, dtype='<u8', count=count).tolist()
+        lengths = np.frombuffer(payload, dtype='<u4', count=count, offset=count * 8).tolist()
+
+        payload = memoryview(payload)
+        original_start = count * 12
+        modified_start = original_start + sum(lengths)
+
+        regions = []
+        position = 0
+        for offset, length in zip(offsets, lengths):
+            regions.append(PatchRegion(
+                offset,
+                bytes(payload[original_start + position:original_start + position + length]),
+                bytes(payload[modified_start + position:modified_start + position + length])
+            ))
+            position += length
+        return cls(regions, bit_size)
+
+
+def load_differences(raw: bytes) -> PatchSet:
+    """
+    Decode a stored differences object in either the binary or legacy JSON format.
+
+    Args:
+        raw: Stored object contents
+
+    Returns:
+        PatchSet: Decoded regions
+
+    Raises:
+        ValueError: If the object is truncated, corrupt or of an unsupported version
+    """
+    try:
+        if raw[:len(FORMAT_MAGIC)] == FORMAT_MAGIC:
+            return PatchSet.from_bytes(raw)
+        return PatchSet.from_document(json.loads(raw.decode('utf-8')))
+    except (struct.error, zlib.error, KeyError, TypeError) as e:
+        raise ValueError(f"Corrupt differences data: {e}") from e
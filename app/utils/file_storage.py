@@ -1,10 +1,16 @@
-import json
 import os
+import mmap
 import shutil
+import hashlib
+import tempfile
 from flask import current_app
 import logging
-from datetime import datetime
 from app.database.db_pool import pooled_connection
+from app.utils.diff_engine import (PatchSet, load_differences, write_regions, read_regions,
+                                   DIFFERENCES_FILE, LEGACY_DIFFERENCES_FILE)
+from app.utils.streams import HashingReader, copy_stream, resolve_byte_range
+from app.utils.blob_store import (blob_key, hash_file, acquire_blob, link_files, release_blobs,
+                                  release_solution_files)
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +24,46 @@ class PostgreSQLFileStorage:
     def _get_file_key(self, solution_id, file_type, file_name):
         return f"solutions/{solution_id}/{file_type}/{file_name}"
 
+    def _key_path(self, file_key):
+        return os.path.join(self.upload_folder, *file_key.split('/'))
+
+    def _write_blob(self, sha256, write):
+        # Write into a temp file next to the blob and rename, so a blob path
+        # never exposes partial content. Called only when acquire_blob found no
+        # row: a file already on disk is an orphan and gets replaced, never reused
+        file_key = blob_key(sha256)
+        file_path = self._key_path(file_key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, file_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return file_key
+
+    def _link_files(self, solution_id, rows, created=(), held=()):
+        # created: blobs just written; held: hashes already referenced via acquire_blob
+        try:
+            released = link_files(solution_id, rows, held)
+        except Exception:
+            for file_key in created:
+                self._remove_key(file_key)
+            if held:
+                for file_key in release_blobs(list(held)):
+                    self._remove_key(file_key)
+            raise
+        for file_key in released:
+            self._remove_key(file_key)
+
+    def _remove_key(self, file_key):
+        try:
+            os.remove(self._key_path(file_key))
+        except FileNotFoundError:
+            pass
+
     def store_file(self, solution_id, file_type, file_name, file_data):
         try:
             temp_solution_id = str(solution_id)
@@ -31,23 +77,89 @@ class PostgreSQLFileStorage:
             except (ValueError, TypeError):
                 pass
 
+            if is_permanent_solution:
+                sha256 = hashlib.sha256(file_data).hexdigest()
+                existing = acquire_blob(sha256)
+                if existing:
+                    file_key = existing['key']
+                else:
+                    file_key = self._write_blob(sha256, lambda f: f.write(file_data))
+                self._link_files(solution_id, [(file_type, file_name, len(file_data), file_key, sha256)],
+                                 [] if existing else [file_key], [sha256] if existing else [])
+                logger.info(f"File {file_name} ({file_type}) stored locally: {file_key}")
+                return True
+
             file_path = self._get_file_path(temp_solution_id, file_type, file_name)
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
             with open(file_path, 'wb') as f:
                 f.write(file_data)
 
-            file_key = self._get_file_key(temp_solution_id, file_type, file_name)
-
-            if is_permanent_solution:
-                self._save_file_metadata(solution_id, file_type, file_name, len(file_data), file_key)
-
             logger.info(f"File {file_name} ({file_type}) stored locally: {file_path}")
             return True
         except Exception as e:
             logger.error(f"Error storing file locally: {e}")
             return False
 
+    def store_stream(self, solution_id, file_type, file_name, fileobj, sha256=None):
+        # sha256: hash of the content when the caller already knows it; if a
+        # permanent solution's blob is already stored, nothing is written and
+        # its key is returned instead
+        try:
+            temp_solution_id = str(solution_id)
+            is_permanent_solution = False
+
+            try:
+                int_solution_id = int(solution_id)
+                if 0 < int_solution_id < 1000000000:
+                    is_permanent_solution = True
+                    solution_id = int_solution_id
+            except (ValueError, TypeError):
+                pass
+
+            existing = acquire_blob(sha256) if sha256 and is_permanent_solution else None
+            if existing:
+                self._link_files(solution_id, [(file_type, file_name, existing['size'], existing['key'], sha256)],
+                                 held=[sha256])
+                logger.info(f"File {file_name} ({file_type}) already stored as {existing['key']}, upload skipped")
+                return {'key': existing['key'], 'size': existing['size'], 'sha256': sha256, 'deduplicated': True}
+
+            reader = HashingReader(fileobj)
+
+            if is_permanent_solution:
+                # Hash known only after reading: stream into a temp file, then move it into place
+                fd, temp_path = tempfile.mkstemp(dir=self.upload_folder)
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        copy_stream(reader, f)
+                    existing = acquire_blob(reader.sha256)
+                    file_key = existing['key'] if existing else blob_key(reader.sha256)
+                    if not existing:
+                        file_path = self._key_path(file_key)
+                        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                        os.replace(temp_path, file_path)
+                finally:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                self._link_files(solution_id, [(file_type, file_name, reader.size, file_key, reader.sha256)],
+                                 [] if existing else [file_key], [reader.sha256] if existing else [])
+                logger.info(f"File {file_name} ({file_type}) streamed locally: {file_key} ({reader.size} bytes)")
+                return {'key': file_key, 'size': reader.size, 'sha256': reader.sha256}
+
+            file_path = self._get_file_path(temp_solution_id, file_type, file_name)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+            with open(file_path, 'wb') as f:
+                copy_stream(reader, f)
+
+            file_key = self._get_file_key(temp_solution_id, file_type, file_name)
+
+            logger.info(f"File {file_name} ({file_type}) streamed locally: {file_path} ({reader.size} bytes)")
+            return {'key': file_key, 'size': reader.size, 'sha256': reader.sha256}
+        except Exception as e:
+            logger.error(f"Error streaming file locally: {e}")
+            return None
+
     def upload_temp_file(self, file_data, file_name, file_type, temp_solution_id):
         try:
             success = self.store_file(temp_solution_id, file_type, file_name, file_data)
@@ -58,42 +170,68 @@ class PostgreSQLFileStorage:
             logger.error(f"Error uploading temp file: {e}")
             return None
 
-    def _save_file_metadata(self, solution_id, file_type, file_name, file_size, file_key):
+    def _resolve_file_key(self, solution_id, file_type):
+        # Permanent files live in blobs/ under their hash; only file_metadata knows which one
+        try:
+            solution_id = int(solution_id)
+        except (ValueError, TypeError):
+            return None, None
+        if not 0 < solution_id < 1000000000:
+            return None, None
+
         try:
             with pooled_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("SELECT id FROM solutions WHERE id = %s", (solution_id,))
-                if not cur.fetchone():
-                    logger.error(f"Solution {solution_id} not found — file metadata not saved")
-                    cur.close()
-                    return
-                cur.execute(
-                    "DELETE FROM file_metadata WHERE solution_id = %s AND file_type = %s",
-                    (solution_id, file_type)
-                )
                 cur.execute("""
-                    INSERT INTO file_metadata (solution_id, file_type, file_name, file_size, s3_key)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (solution_id, file_type, file_name, file_size, file_key))
+                    SELECT file_name, s3_key FROM file_metadata
+                    WHERE solution_id = %s AND file_type = %s
+                """, (solution_id, file_type))
+                result = cur.fetchone()
                 cur.close()
         except Exception as e:
-            logger.error(f"Error saving file metadata: {e}")
+            logger.error(f"Error resolving file key for {solution_id}/{file_type}: {e}")
+            return None, None
 
-    def get_file(self, solution_id, file_type):
-        try:
-            prefix_path = os.path.join(self.upload_folder, 'solutions', str(solution_id), file_type)
+        if not result or not result[1]:
+            return None, None
+        return result[0], result[1]
 
-            if not os.path.exists(prefix_path):
-                logger.error(f"No directory found for {solution_id}/{file_type}")
+    def _find_file(self, solution_id, file_type, file_key=None):
+        if file_key:
+            file_path = self._key_path(file_key)
+            if not os.path.exists(file_path):
+                logger.error(f"File not found locally: {file_key}")
                 return None, None
+            return os.path.basename(file_path), file_path
+
+        file_name, file_key = self._resolve_file_key(solution_id, file_type)
+        if file_key:
+            file_path = self._key_path(file_key)
+            if os.path.exists(file_path):
+                return file_name, file_path
+            logger.warning(f"File {file_key} registered for {solution_id}/{file_type} not found locally")
+
+        # Temp and legacy files without a registered key: look in their directory
+        prefix_path = os.path.join(self.upload_folder, 'solutions', str(solution_id), file_type)
+
+        if not os.path.exists(prefix_path):
+            logger.error(f"No directory found for {solution_id}/{file_type}")
+            return None, None
+
+        files = os.listdir(prefix_path)
+        if not files:
+            logger.error(f"No files found for {solution_id}/{file_type}")
+            return None, None
 
-            files = os.listdir(prefix_path)
-            if not files:
-                logger.error(f"No files found for {solution_id}/{file_type}")
+        return files[0], os.path.join(prefix_path, files[0])
+
+    def get_file(self, solution_id, file_type, file_key=None):
+        try:
+            file_name, file_path = self._find_file(solution_id, file_type, file_key)
+            if not file_path:
                 return None, None
 
-            file_name = files[0]
-            with open(os.path.join(prefix_path, file_name), 'rb') as f:
+            with open(file_path, 'rb') as f:
                 file_data = f.read()
 
             return file_name, file_data
@@ -101,6 +239,48 @@ class PostgreSQLFileStorage:
             logger.error(f"Error getting file locally: {e}")
             return None, None
 
+    def get_file_view(self, solution_id, file_type, file_key=None):
+        # Read-only memory map of the stored file: no copy into the worker's heap.
+        # The mapping is released when the last reference to it is dropped.
+        try:
+            file_name, file_path = self._find_file(solution_id, file_type, file_key)
+            if not file_path:
+                return None, None
+
+            if os.path.getsize(file_path) == 0:
+                return file_name, b''
+
+            with open(file_path, 'rb') as f:
+                file_view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            return file_name, file_view
+        except Exception as e:
+            logger.error(f"Error mapping file locally: {e}")
+            return None, None
+
+    def open_stream(self, solution_id, file_type, file_key=None, range_header=None):
+        try:
+            file_name, file_path = self._find_file(solution_id, file_type, file_key)
+            if not file_path:
+                return None
+
+            total_size = os.path.getsize(file_path)
+            byte_range = resolve_byte_range(range_header, total_size)
+            start, stop = byte_range or (0, total_size)
+
+            body = open(file_path, 'rb')
+            body.seek(start)
+
+            return {
+                'file_name': file_name,
+                'body': body,
+                'content_length': stop - start,
+                'content_range': f"bytes {start}-{stop - 1}/{total_size}" if byte_range else None
+            }
+        except Exception as e:
+            logger.error(f"Error opening file stream locally: {e}")
+            return None
+
     def get_file_info(self, solution_id, file_type):
         try:
             solution_id = int(solution_id)
@@ -119,31 +299,46 @@ class PostgreSQLFileStorage:
             logger.error(f"Error getting file info: {e}")
             return None
 
-    def store_differences(self, solution_id, differences_list):
+    def store_differences(self, solution_id, differences):
+        try:
+            if not isinstance(differences, PatchSet):
+                differences = PatchSet.from_records(differences)
+        except Exception as e:
+            logger.error(f"Error storing differences: {e}")
+            return False
+        return self.store_differences_stream(solution_id, differences.regions, differences.bit_size) is not None
+
+    def store_differences_stream(self, solution_id, regions, bit_size):
+        """Write an iterable of PatchRegion without holding them in memory; returns total differences or None"""
+        tmp_path = None
         try:
             solution_id = int(solution_id)
 
-            file_key = f"solutions/{solution_id}/differences/differences.json"
+            file_key = f"solutions/{solution_id}/differences/{DIFFERENCES_FILE}"
             file_path = os.path.join(self.upload_folder, file_key)
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-            differences_data = {
-                'solution_id': solution_id,
-                'total_differences': len(differences_list),
-                'differences': differences_list,
-                'created_at': str(datetime.utcnow())
-            }
+            # Write next to the target and rename, so readers never see a partial file
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(file_path), delete=False) as tmp:
+                tmp_path = tmp.name
+                _, total_differences = write_regions(tmp, regions, bit_size)
+            os.replace(tmp_path, file_path)
+            tmp_path = None
 
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(differences_data, f, indent=2)
+            legacy_path = os.path.join(os.path.dirname(file_path), LEGACY_DIFFERENCES_FILE)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
 
-            self._save_differences_metadata(solution_id, len(differences_list), file_key)
+            self._save_differences_metadata(solution_id, total_differences, file_key)
 
             logger.info(f"Differences stored locally for solution {solution_id}")
-            return True
+            return total_differences
         except Exception as e:
             logger.error(f"Error storing differences: {e}")
-            return False
+            return None
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     def _save_differences_metadata(self, solution_id, total_differences, file_key):
         try:
@@ -168,61 +363,146 @@ class PostgreSQLFileStorage:
         try:
             solution_id = int(solution_id)
 
-            file_path = os.path.join(
-                self.upload_folder, 'solutions', str(solution_id), 'differences', 'differences.json'
-            )
+            differences_dir = os.path.join(self.upload_folder, 'solutions', str(solution_id), 'differences')
 
-            if not os.path.exists(file_path):
+            for file_name in (DIFFERENCES_FILE, LEGACY_DIFFERENCES_FILE):
+                file_path = os.path.join(differences_dir, file_name)
+                if os.path.exists(file_path):
+                    break
+            else:
                 logger.warning(f"Differences file not found for solution {solution_id}")
                 return None, 0
 
-            with open(file_path, 'r', encoding='utf-8') as f:
-                differences_data = json.load(f)
+            with open(file_path, 'rb') as f:
+                differences = load_differences(f.read())
 
-            return differences_data['differences'], differences_data['total_differences']
+            return differences, differences.total_differences
         except Exception as e:
             logger.error(f"Error getting differences: {e}")
             return None, 0
 
-    def transfer_temp_files(self, temp_solution_id, real_solution_id):
+    def open_differences(self, solution_id):
+        """Return (bit_size, iterator of PatchRegion) read lazily from disk, or None"""
         try:
-            real_solution_id = int(real_solution_id)
-            temp_solution_id = str(temp_solution_id)
+            solution_id = int(solution_id)
 
-            temp_prefix = os.path.join(self.upload_folder, 'solutions', temp_solution_id)
+            differences_dir = os.path.join(self.upload_folder, 'solutions', str(solution_id), 'differences')
 
-            if not os.path.exists(temp_prefix):
-                logger.warning(f"No temp files found for {temp_solution_id}")
-                return False
+            for file_name in (DIFFERENCES_FILE, LEGACY_DIFFERENCES_FILE):
+                file_path = os.path.join(differences_dir, file_name)
+                if os.path.exists(file_path):
+                    break
+            else:
+                logger.warning(f"Differences file not found for solution {solution_id}")
+                return None
 
-            files_transferred = 0
+            f = open(file_path, 'rb')
+            try:
+                return read_regions(f, close=True)
+            except Exception:
+                f.close()
+                raise
+        except Exception as e:
+            logger.error(f"Error opening differences: {e}")
+            return None
+
+    def get_differences_info(self, solution_id):
+        """Return (bit_size, total_differences) without loading the regions, or (None, 0)"""
+        opened = self.open_differences(solution_id)
+        if not opened:
+            return None, 0
+        bit_size, regions = opened
+        try:
+            total_differences = self._get_total_differences(solution_id)
+            if total_differences is None:
+                # No metadata row: count the differences from the stream instead
+                total_differences = sum(region.length for region in regions) // (bit_size // 8)
+            return bit_size, total_differences
+        except ValueError as e:
+            logger.error(f"Error reading differences: {e}")
+            return None, 0
+        finally:
+            close = getattr(regions, 'close', None)
+            if close:
+                close()
+
+    def _get_total_differences(self, solution_id):
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT total_differences FROM differences_metadata WHERE solution_id = %s",
+                    (int(solution_id),)
+                )
+                result = cur.fetchone()
+                cur.close()
+        except Exception as e:
+            logger.error(f"Error getting differences metadata: {e}")
+            return None
+        return result[0] if result else None
 
-            for file_type in ['ori1', 'mod1']:
-                src_dir = os.path.join(temp_prefix, file_type)
-                if not os.path.exists(src_dir):
-                    continue
+    def transfer_temp_files(self, temp_solution_id, real_solution_id, files=None):
+        # files: {file_type: {'filename', 'file_key', 'sha256', ...}} as returned by
+        # store_stream; without it the temp directory is listed and hashed
+        try:
+            real_solution_id = int(real_solution_id)
+            temp_solution_id = str(temp_solution_id)
 
-                for file_name in os.listdir(src_dir):
-                    src_path = os.path.join(src_dir, file_name)
-                    dst_path = self._get_file_path(real_solution_id, file_type, file_name)
-                    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                    shutil.copy2(src_path, dst_path)
+            transfers = []
+            if files:
+                for file_type in ['ori1', 'mod1']:
+                    file_info = files.get(file_type)
+                    if not file_info or not file_info.get('file_key'):
+                        continue
+                    src_path = self._key_path(file_info['file_key'])
+                    transfers.append((file_type, file_info['filename'], src_path,
+                                      file_info.get('sha256') or hash_file(src_path)))
+            else:
+                temp_prefix = os.path.join(self.upload_folder, 'solutions', temp_solution_id)
+                for file_type in ['ori1', 'mod1']:
+                    src_dir = os.path.join(temp_prefix, file_type)
+                    if not os.path.exists(src_dir):
+                        continue
+                    for file_name in os.listdir(src_dir):
+                        src_path = os.path.join(src_dir, file_name)
+                        transfers.append((file_type, file_name, src_path, hash_file(src_path)))
+
+            if not transfers:
+                self.delete_temp_files(temp_solution_id)
+                logger.warning(f"No ORI1/MOD1 files found for {temp_solution_id}")
+                return False
 
-                    file_key = self._get_file_key(real_solution_id, file_type, file_name)
-                    self._save_file_metadata(
-                        real_solution_id, file_type, file_name, os.path.getsize(dst_path), file_key
-                    )
-                    files_transferred += 1
-                    logger.info(f"Transferred {file_type}: {src_path} -> {dst_path}")
+            rows = []
+            created = []
+            held = []
+            try:
+                for file_type, file_name, src_path, sha256 in transfers:
+                    def copy_file(f, src_path=src_path):
+                        with open(src_path, 'rb') as src:
+                            copy_stream(src, f)
+                    existing = acquire_blob(sha256)
+                    if existing:
+                        held.append(sha256)
+                        file_key = existing['key']
+                    else:
+                        file_key = self._write_blob(sha256, copy_file)
+                        created.append(file_key)
+                    rows.append((file_type, file_name, os.path.getsize(src_path), file_key, sha256))
+                    logger.info(f"Transferred {file_type}: {src_path} -> {file_key}{' (already stored)' if existing else ''}")
+            except Exception:
+                for file_key in created:
+                    self._remove_key(file_key)
+                if held:
+                    for file_key in release_blobs(held):
+                        self._remove_key(file_key)
+                raise
+
+            self._link_files(real_solution_id, rows, created, held)
 
             self.delete_temp_files(temp_solution_id)
 
-            if files_transferred > 0:
-                logger.info(f"Transferred {files_transferred} files from {temp_solution_id} to {real_solution_id}")
-                return True
-
-            logger.warning(f"No ORI1/MOD1 files found for {temp_solution_id}")
-            return False
+            logger.info(f"Transferred {len(rows)} files from {temp_solution_id} to {real_solution_id}")
+            return True
         except Exception as e:
             logger.error(f"Error transferring temp files: {e}")
             return False
@@ -242,15 +522,15 @@ class PostgreSQLFileStorage:
         try:
             solution_id = int(solution_id)
 
+            released = release_solution_files(solution_id)
+
             solution_path = os.path.join(self.upload_folder, 'solutions', str(solution_id))
             if os.path.exists(solution_path):
                 shutil.rmtree(solution_path)
 
-            with pooled_connection() as conn:
-                cur = conn.cursor()
-                cur.execute("DELETE FROM file_metadata WHERE solution_id = %s", (solution_id,))
-                cur.execute("DELETE FROM differences_metadata WHERE solution_id = %s", (solution_id,))
-                cur.close()
+            # Blobs are shared: only those no other solution references are removed
+            for file_key in released:
+                self._remove_key(file_key)
 
             logger.info(f"Solution {solution_id} files deleted")
             return True
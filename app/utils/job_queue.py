@@ -0,0 +1,183 @@
+"""
+Job Queue Module
+
+Runs slow work (binary compares, storage transfers, compatibility checks,
+MOD2 generation) outside the request that asked for it:
+- A small local thread pool executes jobs inside an app context
+- Every job is a row in the PostgreSQL ``jobs`` table, so any worker
+  process can report its status while another one runs it
+- Handlers are plain functions registered per job type with @job_handler;
+  they receive JSON parameters and return a JSON-serializable result
+- Jobs lost with a recycled or restarted worker are failed at startup once
+  they have been queued or running for longer than JOB_STALE_AFTER
+
+A handler raises JobError for failures that should be shown to the user as
+is; any other exception is logged and reported as a generic failure.
+"""
+
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable
+
+from psycopg2.extras import Json
+from app.database.db_pool import pooled_connection
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+STALE_JOB_ERROR = 'The job was interrupted by a server restart. Please try again.'
+
+_handlers: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+_queue = None
+
+
+class JobError(Exception):
+    """Job failure whose message is meant for the user."""
+
+
+def job_handler(job_type: str):
+    """Register ``func(params) -> result`` as the handler for ``job_type``."""
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    def __init__(self, app, max_workers: int = 2):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def submit(self, job_type: str, params: Dict[str, Any], created_by: Optional[str] = None) -> Optional[str]:
+        if job_type not in _handlers:
+            logger.error(f"No handler registered for job type '{job_type}'")
+            return None
+
+        job_id = str(uuid.uuid4())
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    INSERT INTO jobs (id, job_type, status, params, created_by)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (job_id, job_type, JOB_QUEUED, Json(params), created_by))
+                cur.close()
+        except Exception as e:
+            logger.error(f"Error enqueuing {job_type} job: {e}")
+            return None
+
+        self._executor.submit(self._run, job_id, job_type, params)
+        logger.info(f"Job {job_id} ({job_type}) queued")
+        return job_id
+
+    def _run(self, job_id: str, job_type: str, params: Dict[str, Any]) -> None:
+        with self.app.app_context():
+            self._update(job_id, JOB_RUNNING)
+            try:
+                result = _handlers[job_type](params)
+            except JobError as e:
+                logger.warning(f"Job {job_id} ({job_type}) failed: {e}")
+                self._update(job_id, JOB_FAILED, error=str(e))
+            except Exception as e:
+                logger.exception(f"Job {job_id} ({job_type}) crashed: {e}")
+                self._update(job_id, JOB_FAILED, error=f'Unexpected error: {e}')
+            else:
+                self._update(job_id, JOB_SUCCEEDED, result=result)
+                logger.info(f"Job {job_id} ({job_type}) finished")
+
+    def _update(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                if status == JOB_RUNNING:
+                    cur.execute(
+                        "UPDATE jobs SET status = %s, started_at = CURRENT_TIMESTAMP WHERE id = %s",
+                        (status, job_id)
+                    )
+                else:
+                    cur.execute("""
+                        UPDATE jobs SET status = %s, result = %s, error = %s, finished_at = CURRENT_TIMESTAMP
+                        WHERE id = %s
+                    """, (status, Json(result) if result is not None else None, error, job_id))
+                cur.close()
+        except Exception as e:
+            logger.error(f"Error updating job {job_id}: {e}")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return get_job(job_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT id, job_type, status, params, result, error, created_by,
+                       created_at, started_at, finished_at
+                FROM jobs WHERE id = %s
+            """, (job_id,))
+            row = cur.fetchone()
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        return None
+
+    if not row:
+        return None
+
+    keys = ('id', 'job_type', 'status', 'params', 'result', 'error', 'created_by',
+            'created_at', 'started_at', 'finished_at')
+    return dict(zip(keys, row))
+
+
+def fail_stale_jobs(max_age: int) -> int:
+    """
+    Mark jobs queued or running for more than ``max_age`` seconds as failed.
+
+    The executor lives in the worker process, so a job whose worker was
+    recycled or restarted would otherwise stay queued or running forever.
+    Jobs of other live workers are younger than ``max_age`` and left alone.
+
+    Returns:
+        int: Number of jobs failed
+    """
+    try:
+        with pooled_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE jobs SET status = %s, error = %s, finished_at = CURRENT_TIMESTAMP
+                WHERE status IN (%s, %s)
+                  AND COALESCE(started_at, created_at) < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+                RETURNING id
+            """, (JOB_FAILED, STALE_JOB_ERROR, JOB_QUEUED, JOB_RUNNING, max_age))
+            failed = [row[0] for row in cur.fetchall()]
+            cur.close()
+    except Exception as e:
+        logger.error(f"Error failing stale jobs: {e}")
+        return 0
+
+    if failed:
+        logger.warning(f"Failed {len(failed)} stale jobs: {', '.join(failed)}")
+    return len(failed)
+
+
+def init_job_queue(app) -> JobQueue:
+    global _queue
+    fail_stale_jobs(app.config.get('JOB_STALE_AFTER', 3600))
+    _queue = JobQueue(app, max_workers=app.config.get('JOB_WORKERS', 2))
+    logger.info(f"Job queue initialized ({app.config.get('JOB_WORKERS', 2)} workers)")
+    return _queue
+
+
+def get_job_queue() -> JobQueue:
+    if _queue is None:
+        raise RuntimeError("Job queue not initialized — call init_job_queue(app) at startup")
+    return _queue
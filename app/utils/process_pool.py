@@ -0,0 +1,209 @@
+"""
+Process Pool Module
+
+Runs the CPU-bound BinaryHandler operations (diff, similarity, structure
+check) in a pool of worker processes, so a large comparison does not hold
+the GIL of the web process while other requests wait:
+- Input arrays are copied once into shared memory blocks that the worker
+  maps without unpickling
+- Difference arrays come back the same way; only small result dicts are
+  pickled
+- Tasks below POOL_MIN_BYTES (not worth the round-trip) or above the
+  configured maximum run inline in the calling thread
+
+Workers are started with the 'spawn' method: forking a multi-threaded web
+server (waitress threads, the job queue, the DB pool) is not safe. A spawned
+worker re-imports the main module (run.py builds the app at import time), so
+init_process_pool and run_pooled are no-ops inside workers: operations there
+always run inline and never start a nested pool.
+"""
+
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Optional, Any, Dict, List, Tuple
+
+import numpy as np
+from app.utils.diff_engine import DiffResult
+
+logger = logging.getLogger(__name__)
+
+# Below this combined input size the task runs inline
+POOL_MIN_BYTES = 256 * 1024
+
+# BinaryHandler methods that may run in a worker process
+POOLED_OPERATIONS = ('diff_data', 'calculate_similarity', '_structure_similarity')
+
+_pool = None
+
+# Set by the pool initializer in worker processes
+_is_worker = False
+
+
+def _mark_worker() -> None:
+    global _is_worker
+    _is_worker = True
+
+
+def in_worker_process() -> bool:
+    """True inside a pool worker, including while it imports the main module."""
+    # The initializer only runs after the main module import, where create_app
+    # may already be calling init_process_pool; the process name covers that
+    return _is_worker or multiprocessing.current_process().name != 'MainProcess'
+
+
+class BinaryProcessPool:
+    def __init__(self, max_workers: int, max_task_bytes: int):
+        self.max_workers = max_workers
+        self.max_task_bytes = max_task_bytes
+        self._executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_mark_worker
+        )
+
+    def accepts(self, arrays: Tuple[Any, ...]) -> bool:
+        if not all(isinstance(array, np.ndarray) for array in arrays):
+            return False
+        task_bytes = sum(array.nbytes for array in arrays)
+        return POOL_MIN_BYTES <= task_bytes <= self.max_task_bytes
+
+    def run(self, operation: str, read_size: int, *arrays: np.ndarray, **options: Any) -> Any:
+        blocks = []
+        try:
+            specs = []
+            for array in arrays:
+                block = _share(array)
+                blocks.append(block)
+                specs.append((block.name, array.dtype.str, len(array)))
+
+            result = self._executor.submit(_run_operation, operation, read_size, specs, options).result()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        if isinstance(result, tuple) and result and result[0] == 'diff':
+            return _unpack_diff(*result[1:])
+        return result
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def _share(array: np.ndarray) -> shared_memory.SharedMemory:
+    """Copy ``array`` into a new shared memory block."""
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    return block
+
+
+def _pack_diff(differences: DiffResult) -> tuple:
+    """Move a DiffResult into one shared memory block (offsets, old, new)."""
+    count = len(differences)
+    dtype = differences.old_values.dtype
+    offsets_size = count * 8
+    values_size = count * dtype.itemsize
+
+    block = shared_memory.SharedMemory(create=True, size=max(offsets_size + 2 * values_size, 1))
+    try:
+        np.ndarray(count, dtype=np.int64, buffer=block.buf)[:] = differences.offsets
+        np.ndarray(count, dtype=dtype, buffer=block.buf, offset=offsets_size)[:] = differences.old_values
+        np.ndarray(count, dtype=dtype, buffer=block.buf, offset=offsets_size + values_size)[:] = differences.new_values
+    finally:
+        block.close()
+    return ('diff', block.name, count, dtype.str, differences.bit_size)
+
+
+def _unpack_diff(name: str, count: int, dtype: str, bit_size: int) -> DiffResult:
+    """Copy a packed DiffResult out of shared memory and release the block."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        dtype = np.dtype(dtype)
+        offsets_size = count * 8
+        values_size = count * dtype.itemsize
+        offsets = np.ndarray(count, dtype=np.int64, buffer=block.buf).copy()
+        old_values = np.ndarray(count, dtype=dtype, buffer=block.buf, offset=offsets_size).copy()
+        new_values = np.ndarray(count, dtype=dtype, buffer=block.buf, offset=offsets_size + values_size).copy()
+    finally:
+        block.close()
+        block.unlink()
+    return DiffResult(offsets, old_values, new_values, bit_size)
+
+
+def _run_operation(operation: str, read_size: int, specs: List[Tuple[str, str, int]],
+                   options: Dict[str, Any]) -> Any:
+    """Worker entry point: map the inputs and run ``operation`` inline."""
+    from app.utils.binary_handler import BinaryHandler
+
+    if operation not in POOLED_OPERATIONS:
+        raise ValueError(f"Operation not allowed in the process pool: {operation}")
+
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    arrays = []
+    try:
+        arrays = [
+            np.ndarray(length, dtype=np.dtype(dtype), buffer=block.buf)
+            for block, (_, dtype, length) in zip(blocks, specs)
+        ]
+        handler = BinaryHandler()
+        handler.set_read_size(read_size)
+        result = getattr(handler, operation)(*arrays, **options)
+    except BaseException as e:
+        # The traceback keeps the operation's frames, and their views on the
+        # shared buffers, alive
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        # Drop every view on the shared buffers before closing them: a view
+        # that outlives close() points into unmapped memory
+        del arrays
+        for block in blocks:
+            block.close()
+
+    if isinstance(result, DiffResult):
+        return _pack_diff(result)
+    return result
+
+
+def run_pooled(operation: str, read_size: int, *arrays: Any, **options: Any) -> Optional[Any]:
+    """
+    Run a BinaryHandler ``operation`` in the process pool.
+
+    ``options`` are passed to the operation as keyword arguments and must be
+    picklable.
+
+    Returns None when the task should run inline instead: no pool in this
+    process (including inside the workers themselves), inputs that are not
+    arrays, a task outside the size limits, or a broken pool.
+    """
+    pool = _pool
+    if pool is None or _is_worker or not pool.accepts(arrays):
+        return None
+    try:
+        return pool.run(operation, read_size, *arrays, **options)
+    except BrokenProcessPool as e:
+        logger.error(f"Binary process pool is broken, running {operation} inline: {e}")
+        return None
+
+
+def init_process_pool(app) -> Optional[BinaryProcessPool]:
+    global _pool
+    if in_worker_process():
+        return None
+
+    max_workers = app.config.get('BINARY_POOL_WORKERS', 0)
+    if max_workers <= 0:
+        logger.info("Binary process pool disabled")
+        return None
+
+    _pool = BinaryProcessPool(max_workers, app.config.get('BINARY_POOL_MAX_TASK_BYTES', 64 * 1024 * 1024))
+    logger.info(f"Binary process pool initialized ({max_workers} workers)")
+    return _pool
+
+
+def get_process_pool() -> Optional[BinaryProcessPool]:
+    return _pool
@@ -1,14 +1,95 @@
 import boto3
-import json
 from flask import current_app
+import hashlib
 import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config as BotocoreConfig
 from botocore.exceptions import ClientError, NoCredentialsError
-from datetime import datetime
 from app.database.db_pool import pooled_connection
+from app.utils.diff_engine import (PatchSet, load_differences, write_regions, read_regions,
+                                   DIFFERENCES_FILE, LEGACY_DIFFERENCES_FILE)
+from app.utils.streams import HashingReader, copy_stream, STREAM_CHUNK_SIZE
+from app.utils.blob_store import blob_key, acquire_blob, link_files, release_blobs, release_solution_files
+from werkzeug.http import parse_range_header
 
 logger = logging.getLogger(__name__)
 
+# Subidas en streaming: multipart a partir de 8 MB, como mucho 2 partes en memoria
+STREAM_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=2
+)
+
+# Copias server-side en transfer_temp_files: hilos en paralelo y umbral de copia multipart
+TRANSFER_MAX_WORKERS = 4
+MULTIPART_COPY_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=4
+)
+
+# Caché en proceso de (solution_id, file_type) -> (file_name, s3_key) resuelto desde file_metadata
+FILE_KEY_CACHE_SIZE = 4096
+_file_key_cache = OrderedDict()
+_file_key_lock = threading.Lock()
+
+
+def _cached_file_key(solution_id, file_type):
+    with _file_key_lock:
+        entry = _file_key_cache.get((solution_id, file_type))
+        if entry is not None:
+            _file_key_cache.move_to_end((solution_id, file_type))
+        return entry
+
+
+def _cache_file_key(solution_id, file_type, file_name, s3_key):
+    with _file_key_lock:
+        _file_key_cache[(solution_id, file_type)] = (file_name, s3_key)
+        _file_key_cache.move_to_end((solution_id, file_type))
+        while len(_file_key_cache) > FILE_KEY_CACHE_SIZE:
+            _file_key_cache.popitem(last=False)
+
+
+def _forget_file_keys(solution_id, file_type=None):
+    with _file_key_lock:
+        for key in [k for k in _file_key_cache if k[0] == solution_id and file_type in (None, k[1])]:
+            del _file_key_cache[key]
+
+
+# Caché en proceso de diferencias ya parseadas: solution_id -> (s3_key, ETag, PatchSet)
+DIFFERENCES_CACHE_SIZE = 64
+_differences_cache = OrderedDict()
+_differences_lock = threading.Lock()
+
+
+def _cached_differences(solution_id):
+    with _differences_lock:
+        entry = _differences_cache.get(solution_id)
+        if entry is not None:
+            _differences_cache.move_to_end(solution_id)
+        return entry
+
+
+def _cache_differences(solution_id, s3_key, etag, differences):
+    if not etag:
+        return
+    with _differences_lock:
+        _differences_cache[solution_id] = (s3_key, etag, differences)
+        _differences_cache.move_to_end(solution_id)
+        while len(_differences_cache) > DIFFERENCES_CACHE_SIZE:
+            _differences_cache.popitem(last=False)
+
+
+def _forget_differences(solution_id):
+    with _differences_lock:
+        _differences_cache.pop(solution_id, None)
+
+
 class S3FileStorage:
     def __init__(self):
         self.bucket_name = current_app.config['AWS_S3_BUCKET']
@@ -111,6 +192,31 @@ class S3FileStorage:
             except (ValueError, TypeError):
                 pass
 
+            if is_permanent_solution:
+                # Archivo permanente: blob direccionado por contenido, solo se sube si no existe
+                sha256 = hashlib.sha256(file_data).hexdigest()
+                existing = acquire_blob(sha256)
+                s3_key = existing['key'] if existing else blob_key(sha256)
+                created = existing is None
+                if created:
+                    self.s3_client.put_object(
+                        Bucket=self.bucket_name,
+                        Key=s3_key,
+                        Body=file_data,
+                        ContentType='application/octet-stream',
+                        Metadata={'sha256': sha256, 'file_size': str(len(file_data))}
+                    )
+
+                try:
+                    self._link_files(solution_id, [(file_type, file_name, len(file_data), s3_key, sha256)],
+                                     [s3_key] if created else [], [] if created else [sha256])
+                except Exception as db_error:
+                    logger.error(f"DB write failed after S3 upload — compensating: {s3_key}")
+                    return False
+
+                logger.info(f"File {file_name} ({file_type}) stored in S3 blob: {s3_key}")
+                return True
+
             s3_key = self._get_s3_key(temp_solution_id, file_type, file_name)
 
             self.s3_client.put_object(
@@ -126,15 +232,6 @@ class S3FileStorage:
                 }
             )
 
-            if is_permanent_solution:
-                try:
-                    self._save_file_metadata(solution_id, file_type, file_name, len(file_data), s3_key)
-                except Exception as db_error:
-                    # Compensate: S3 write succeeded but DB failed — delete S3 object
-                    logger.error(f"DB write failed after S3 upload — compensating: {s3_key}")
-                    self._compensate_s3_delete(s3_key)
-                    return False
-
             logger.info(f"File {file_name} ({file_type}) uploaded to S3: {s3_key}")
             return True
 
@@ -142,6 +239,75 @@ class S3FileStorage:
             logger.error(f"Error uploading to S3: {e}")
             return False
     
+    def store_stream(self, solution_id, file_type, file_name, fileobj, sha256=None):
+        """
+        Subir un archivo a S3 leyéndolo en streaming (multipart para archivos grandes)
+
+        Args:
+            solution_id: ID permanente o temporal de la solución
+            file_type (str): Tipo de archivo (ori1, mod1, ori2, mod2)
+            file_name (str): Nombre del archivo
+            fileobj: Objeto file-like abierto en modo binario
+            sha256 (str): Hash del contenido si ya se conoce; si la solución es
+                permanente y ese blob existe no se sube nada y se devuelve su clave
+
+        Returns:
+            dict: {'key', 'size', 'sha256'} (más 'deduplicated' si no se subió) o None si falla
+        """
+        try:
+            temp_solution_id = str(solution_id)
+            is_permanent_solution = False
+
+            try:
+                int_solution_id = int(solution_id)
+                if 0 < int_solution_id < 1000000000:
+                    is_permanent_solution = True
+                    solution_id = int_solution_id
+            except (ValueError, TypeError):
+                pass
+
+            # Solo las soluciones permanentes reutilizan blobs: un archivo temporal
+            # no tiene referencia que impida borrar el blob mientras se usa
+            existing = acquire_blob(sha256) if sha256 and is_permanent_solution else None
+            if existing:
+                try:
+                    self._link_files(solution_id, [(file_type, file_name, existing['size'], existing['key'], sha256)],
+                                     held=[sha256])
+                except Exception as db_error:
+                    logger.error(f"Error linking existing blob {existing['key']}: {db_error}")
+                    return None
+                logger.info(f"File {file_name} ({file_type}) already stored as {existing['key']}, upload skipped")
+                return {'key': existing['key'], 'size': existing['size'], 'sha256': sha256, 'deduplicated': True}
+
+            reader = HashingReader(fileobj)
+
+            if is_permanent_solution:
+                return self._store_blob_stream(solution_id, file_type, file_name, reader, sha256)
+
+            s3_key = self._get_s3_key(temp_solution_id, file_type, file_name)
+
+            self.s3_client.upload_fileobj(
+                reader,
+                self.bucket_name,
+                s3_key,
+                ExtraArgs={
+                    'ContentType': 'application/octet-stream',
+                    'Metadata': {
+                        'solution_id': str(temp_solution_id),
+                        'file_type': file_type,
+                        'original_filename': file_name
+                    }
+                },
+                Config=STREAM_TRANSFER_CONFIG
+            )
+
+            logger.info(f"File {file_name} ({file_type}) streamed to S3: {s3_key} ({reader.size} bytes)")
+            return {'key': s3_key, 'size': reader.size, 'sha256': reader.sha256}
+
+        except Exception as e:
+            logger.error(f"Error streaming upload to S3: {e}")
+            return None
+    
     def upload_temp_file(self, file_data, file_name, file_type, temp_solution_id):
         """Subir archivo temporal a S3 (alias de store_file para archivos temporales)"""
         try:
@@ -154,74 +320,298 @@ class S3FileStorage:
             logger.error(f"Error uploading temp file: {e}")
             return None
     
-    def _save_file_metadata(self, solution_id, file_type, file_name, file_size, s3_key):
-        """Guardar metadatos del archivo en PostgreSQL"""
+    def _store_blob_stream(self, solution_id, file_type, file_name, reader, sha256=None):
+        """Subir en streaming el archivo de una solución permanente a su blob y enlazarlo"""
+        body = reader
+        existing = None
+        if not sha256:
+            # La clave depende del hash: leerlo antes a un buffer (en disco si es grande)
+            body = tempfile.SpooledTemporaryFile(max_size=STREAM_TRANSFER_CONFIG.multipart_chunksize)
+            copy_stream(reader, body)
+            body.seek(0)
+            sha256 = reader.sha256
+            existing = acquire_blob(sha256)
+
+        s3_key = existing['key'] if existing else blob_key(sha256)
+        try:
+            if existing:
+                size = existing['size']
+            else:
+                self.s3_client.upload_fileobj(
+                    body,
+                    self.bucket_name,
+                    s3_key,
+                    ExtraArgs={
+                        'ContentType': 'application/octet-stream',
+                        'Metadata': {'sha256': sha256}
+                    },
+                    Config=STREAM_TRANSFER_CONFIG
+                )
+                size = reader.size
+                if reader.sha256 != sha256:
+                    logger.error(f"Content of {file_name} does not match the given SHA-256 — discarding {s3_key}")
+                    self._compensate_s3_delete(s3_key)
+                    return None
+        finally:
+            if body is not reader:
+                body.close()
+
         try:
+            self._link_files(solution_id, [(file_type, file_name, size, s3_key, sha256)],
+                             [] if existing else [s3_key], [sha256] if existing else [])
+        except Exception as db_error:
+            logger.error(f"DB write failed after S3 upload — compensating: {s3_key}")
+            return None
+
+        logger.info(f"File {file_name} ({file_type}) streamed to S3 blob: {s3_key} ({size} bytes)")
+        return {'key': s3_key, 'size': size, 'sha256': sha256}
+
+    def _link_files(self, solution_id, rows, created=(), held=()):
+        """
+        Registrar archivos de una solución en file_metadata/file_blobs
+
+        Args:
+            solution_id (int): ID de la solución
+            rows (list): Tuplas (file_type, file_name, file_size, s3_key, sha256)
+            created (list): Blobs recién subidos, que se borran si falla la escritura
+            held (list): Hashes ya referenciados con acquire_blob, que se liberan si falla
+
+        Raises:
+            Exception: Si la solución no existe o falla la escritura
+        """
+        try:
+            released = link_files(solution_id, rows, held)
+        except Exception:
+            _forget_file_keys(solution_id)
+            for s3_key in created:
+                # Compensate: S3 write succeeded but DB failed — delete S3 object
+                self._compensate_s3_delete(s3_key)
+            self._release_held(held)
+            raise
+
+        for file_type, file_name, _, s3_key, _ in rows:
+            _cache_file_key(solution_id, file_type, file_name, s3_key)
+        if released:
+            # Blobs que ya no referencia ninguna solución
+            self._delete_objects([{'Key': s3_key} for s3_key in released])
+
+    def _release_held(self, held):
+        """Devolver referencias tomadas con acquire_blob que no se llegaron a enlazar"""
+        if not held:
+            return
+        try:
+            released = release_blobs(list(held))
+        except Exception as e:
+            logger.error(f"Error releasing blob references: {e}")
+            return
+        if released:
+            self._delete_objects([{'Key': s3_key} for s3_key in released])
+
+    def _hash_object(self, s3_key):
+        """Calcular el SHA-256 de un objeto de S3 leyéndolo en streaming"""
+        body = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)['Body']
+        digest = hashlib.sha256()
+        try:
+            for chunk in iter(lambda: body.read(STREAM_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        finally:
+            body.close()
+        return digest.hexdigest()
+
+    def _is_permanent_id(self, solution_id):
+        try:
+            return 0 < int(solution_id) < 1000000000
+        except (ValueError, TypeError):
+            return False
+
+    def _resolve_file_key(self, solution_id, file_type):
+        """Resolver (file_name, s3_key) desde file_metadata; listar el prefijo solo para IDs temporales"""
+        if self._is_permanent_id(solution_id):
+            solution_id = int(solution_id)
+            cached = _cached_file_key(solution_id, file_type)
+            if cached:
+                return cached
+
             with pooled_connection() as conn:
                 cur = conn.cursor()
-                cur.execute("SELECT id FROM solutions WHERE id = %s", (solution_id,))
-                if not cur.fetchone():
-                    logger.error(f"Solution {solution_id} not found — file metadata not saved")
-                    cur.close()
-                    return
-                cur.execute(
-                    "DELETE FROM file_metadata WHERE solution_id = %s AND file_type = %s",
-                    (solution_id, file_type)
-                )
                 cur.execute("""
-                    INSERT INTO file_metadata (solution_id, file_type, file_name, file_size, s3_key)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (solution_id, file_type, file_name, file_size, s3_key))
+                    SELECT file_name, s3_key FROM file_metadata
+                    WHERE solution_id = %s AND file_type = %s
+                """, (solution_id, file_type))
+                result = cur.fetchone()
                 cur.close()
-        except Exception as e:
-            logger.error(f"Error saving file metadata: {e}")
-    
-    def get_file(self, solution_id, file_type):
-        """Obtener archivo desde S3"""
+
+            if not result:
+                logger.error(f"No file metadata found for {solution_id}/{file_type}")
+                return None, None
+
+            _cache_file_key(solution_id, file_type, result[0], result[1])
+            return result[0], result[1]
+
+        # IDs temporales sin clave registrada: buscar por prefijo
+        prefix = f"solutions/{solution_id}/{file_type}/"
+        response = self.s3_client.list_objects_v2(
+            Bucket=self.bucket_name,
+            Prefix=prefix,
+            MaxKeys=1
+        )
+
+        if 'Contents' not in response or not response['Contents']:
+            logger.error(f"No files found for {solution_id}/{file_type}")
+            return None, None
+
+        s3_key = response['Contents'][0]['Key']
+        return s3_key.split('/')[-1], s3_key
+
+    def _copy_object(self, old_key, new_key, size, metadata):
+        """Copia server-side; multipart (UploadPartCopy) para objetos grandes"""
+        if size >= MULTIPART_COPY_CONFIG.multipart_threshold:
+            self.s3_client.copy(
+                {'Bucket': self.bucket_name, 'Key': old_key},
+                self.bucket_name,
+                new_key,
+                ExtraArgs={'MetadataDirective': 'REPLACE', 'Metadata': metadata},
+                Config=MULTIPART_COPY_CONFIG
+            )
+        else:
+            self.s3_client.copy_object(
+                CopySource={'Bucket': self.bucket_name, 'Key': old_key},
+                Bucket=self.bucket_name,
+                Key=new_key,
+                MetadataDirective='REPLACE',
+                Metadata=metadata
+            )
+
+    def get_file(self, solution_id, file_type, file_key=None):
+        """
+        Obtener archivo desde S3 con un único get_object
+
+        file_key: clave S3 ya conocida (p. ej. la devuelta por upload_temp_file);
+        si no se indica se resuelve desde file_metadata. Si la clave resuelta ya
+        no existe (una entrada de caché de un archivo reemplazado), se vuelve a
+        leer de file_metadata y se reintenta una vez
+        """
+        s3_key = file_key
         try:
-            # Manejar tanto IDs temporales como permanentes
-            temp_solution_id = str(solution_id)
-            
-            # Para IDs temporales, construir directamente la clave S3
-            s3_key = self._get_s3_key(temp_solution_id, file_type, None)
-            
-            # Intentar obtener archivo desde S3 (buscar por prefijo si no sabemos el nombre exacto)
+            if file_key:
+                file_name = file_key.split('/')[-1]
+            else:
+                file_name, s3_key = self._resolve_file_key(solution_id, file_type)
+                if not s3_key:
+                    return None, None
+
             try:
-                # Listar objetos con el prefijo para encontrar el archivo
-                prefix = f"solutions/{temp_solution_id}/{file_type}/"
-                response = self.s3_client.list_objects_v2(
+                file_response = self.s3_client.get_object(
                     Bucket=self.bucket_name,
-                    Prefix=prefix
+                    Key=s3_key
                 )
-                
-                if 'Contents' not in response or not response['Contents']:
-                    logger.error(f"No files found for {solution_id}/{file_type}")
-                    return None, None
-                
-                # Usar el primer archivo encontrado
-                s3_key = response['Contents'][0]['Key']
-                file_name = s3_key.split('/')[-1]  # Extraer nombre del archivo
-                
-                # Descargar desde S3
+            except ClientError as e:
+                if file_key or e.response['Error']['Code'] != 'NoSuchKey' or not self._is_permanent_id(solution_id):
+                    raise
+                stale_key = s3_key
+                _forget_file_keys(int(solution_id), file_type)
+                file_name, s3_key = self._resolve_file_key(solution_id, file_type)
+                if not s3_key or s3_key == stale_key:
+                    raise
+                logger.info(f"S3 key {stale_key} no longer exists, retrying with {s3_key}")
                 file_response = self.s3_client.get_object(
                     Bucket=self.bucket_name,
                     Key=s3_key
                 )
-                
-                file_data = file_response['Body'].read()
-                return file_name, file_data
-                
-            except ClientError as e:
-                if e.response['Error']['Code'] == 'NoSuchKey':
-                    logger.error(f"File not found in S3: {s3_key}")
-                else:
-                    logger.error(f"Error accessing S3: {e}")
-                return None, None
-            
+
+            file_data = file_response['Body'].read()
+            return file_name, file_data
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                logger.error(f"File not found in S3: {s3_key}")
+                if self._is_permanent_id(solution_id):
+                    _forget_file_keys(int(solution_id), file_type)
+            else:
+                logger.error(f"Error accessing S3: {e}")
+            return None, None
         except Exception as e:
             logger.error(f"Error getting file from S3: {e}")
             return None, None
     
+    def open_stream(self, solution_id, file_type, file_key=None, range_header=None):
+        """
+        Abrir un archivo de S3 para descargarlo en streaming
+
+        Un rango HTTP simple se reenvía a S3; rangos múltiples o inválidos
+        se ignoran y se sirve el archivo completo.
+
+        Returns:
+            dict: {'file_name', 'body' (StreamingBody), 'content_length', 'content_range'} o None
+        """
+        s3_key = file_key
+        try:
+            if file_key:
+                file_name = file_key.split('/')[-1]
+            else:
+                file_name, s3_key = self._resolve_file_key(solution_id, file_type)
+                if not s3_key:
+                    return None
+
+            request = {'Bucket': self.bucket_name, 'Key': s3_key}
+            byte_range = parse_range_header(range_header) if range_header else None
+            if byte_range and len(byte_range.ranges) == 1:
+                request['Range'] = byte_range.to_header()
+
+            try:
+                response = self.s3_client.get_object(**request)
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'InvalidRange':
+                    raise
+                request.pop('Range')
+                response = self.s3_client.get_object(**request)
+
+            return {
+                'file_name': file_name,
+                'body': response['Body'],
+                'content_length': response['ContentLength'],
+                'content_range': response.get('ContentRange')
+            }
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                logger.error(f"File not found in S3: {s3_key}")
+                if self._is_permanent_id(solution_id):
+                    _forget_file_keys(int(solution_id), file_type)
+            else:
+                logger.error(f"Error accessing S3: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error opening file stream from S3: {e}")
+            return None
+
+    def get_download_url(self, solution_id, file_type, download_name, file_key=None, expires_in=300):
+        """Generar una URL prefirmada de descarga (S3 sirve el archivo, incluidos los rangos)"""
+        try:
+            s3_key = file_key
+            if not s3_key:
+                _, s3_key = self._resolve_file_key(solution_id, file_type)
+                if not s3_key:
+                    return None
+
+            return self.s3_client.generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': self.bucket_name,
+                    'Key': s3_key,
+                    'ResponseContentType': 'application/octet-stream',
+                    'ResponseContentDisposition': f'attachment; filename="{download_name}"'
+                },
+                ExpiresIn=expires_in
+            )
+        except Exception as e:
+            logger.error(f"Error generating presigned URL: {e}")
+            return None
+
+    def get_file_view(self, solution_id, file_type, file_key=None):
+        """Obtener archivo como buffer; en S3 equivale a get_file porque el objeto debe descargarse"""
+        return self.get_file(solution_id, file_type, file_key)
+    
     def get_file_info(self, solution_id, file_type):
         """Obtener información del archivo desde PostgreSQL"""
         try:
@@ -241,44 +631,77 @@ class S3FileStorage:
             logger.error(f"Error getting file info: {e}")
             return None
     
-    def store_differences(self, solution_id, differences_list):
-        """Guardar diferencias como JSON en S3 y metadatos en PostgreSQL"""
+    def store_differences(self, solution_id, differences):
+        """Guardar diferencias en formato binario en S3 y metadatos en PostgreSQL"""
         try:
             solution_id = int(solution_id)
-            s3_key = f"solutions/{solution_id}/differences/differences.json"
+            if not isinstance(differences, PatchSet):
+                differences = PatchSet.from_records(differences)
 
-            differences_data = {
-                'solution_id': solution_id,
-                'total_differences': len(differences_list),
-                'differences': differences_list,
-                'created_at': str(datetime.utcnow())
-            }
+            uploaded = self._upload_differences(solution_id, differences.regions, differences.bit_size)
+            if not uploaded:
+                return False
 
-            self.s3_client.put_object(
+            s3_key, etag, _ = uploaded
+            _cache_differences(solution_id, s3_key, etag, differences)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error storing differences: {e}")
+            return False
+
+    def store_differences_stream(self, solution_id, regions, bit_size):
+        """
+        Guardar un iterable de PatchRegion sin tenerlas todas en memoria
+
+        Las regiones se serializan a un fichero temporal (S3 necesita el tamaño
+        del cuerpo) que se sube en un único put_object.
+
+        Returns:
+            int: Total de diferencias guardadas, o None si falla
+        """
+        try:
+            uploaded = self._upload_differences(int(solution_id), regions, bit_size)
+        except Exception as e:
+            logger.error(f"Error storing differences: {e}")
+            return None
+        return uploaded[2] if uploaded else None
+
+    def _upload_differences(self, solution_id, regions, bit_size):
+        """Subir las diferencias y guardar sus metadatos; devuelve (s3_key, etag, total) o None"""
+        s3_key = f"solutions/{solution_id}/differences/{DIFFERENCES_FILE}"
+
+        _forget_differences(solution_id)
+        with tempfile.TemporaryFile() as tmp:
+            _, total_differences = write_regions(tmp, regions, bit_size)
+            tmp.seek(0)
+            put_response = self.s3_client.put_object(
                 Bucket=self.bucket_name,
                 Key=s3_key,
-                Body=json.dumps(differences_data, indent=2).encode('utf-8'),
-                ContentType='application/json',
+                Body=tmp,
+                ContentType='application/octet-stream',
                 Metadata={
                     'solution_id': str(solution_id),
-                    'total_differences': str(len(differences_list))
+                    'total_differences': str(total_differences)
                 }
             )
 
-            try:
-                self._save_differences_metadata(solution_id, len(differences_list), s3_key)
-            except Exception as db_error:
-                # Compensate: S3 write succeeded but DB failed — delete S3 object
-                logger.error(f"DB write failed after S3 upload — compensating: {s3_key}")
-                self._compensate_s3_delete(s3_key)
-                return False
+        # Eliminar el JSON legado para que no quede un documento obsoleto
+        self.s3_client.delete_object(
+            Bucket=self.bucket_name,
+            Key=f"solutions/{solution_id}/differences/{LEGACY_DIFFERENCES_FILE}"
+        )
 
-            logger.info(f"Differences stored for solution {solution_id}: {s3_key}")
-            return True
+        try:
+            self._save_differences_metadata(solution_id, total_differences, s3_key)
+        except Exception as db_error:
+            # Compensate: S3 write succeeded but DB failed — delete S3 object
+            logger.error(f"DB write failed after S3 upload — compensating: {s3_key}")
+            self._compensate_s3_delete(s3_key)
+            return None
 
-        except Exception as e:
-            logger.error(f"Error storing differences: {e}")
-            return False
+        logger.info(f"Differences stored for solution {solution_id}: {s3_key}")
+        return s3_key, put_response.get('ETag'), total_differences
     
     def _save_differences_metadata(self, solution_id, total_differences, s3_key):
         """Guardar metadatos de diferencias en PostgreSQL"""
@@ -304,134 +727,278 @@ class S3FileStorage:
             logger.error(f"Error saving differences metadata: {e}")
     
     def get_differences(self, solution_id):
-        """Obtener diferencias desde S3"""
+        """
+        Obtener diferencias desde S3 (formato binario o JSON legado)
+
+        Un único get_object por formato: NoSuchKey significa que no existe. Si
+        hay una copia parseada en caché se pide condicionada a su ETag, y un 304
+        reutiliza la copia sin volver a descargarla ni parsearla.
+        """
         try:
             solution_id = int(solution_id)
+            cached = _cached_differences(solution_id)
             
-            s3_key = f"solutions/{solution_id}/differences/differences.json"
-            logger.info(f"Attempting to get differences for solution {solution_id} from S3 key: {s3_key}")
-            
-            # Verificar si el objeto existe
-            try:
-                self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-                logger.info(f"Differences file found in S3 for solution {solution_id}")
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    logger.warning(f"Differences file not found in S3 for solution {solution_id}")
-                    return None, 0
-                else:
-                    logger.error(f"Error checking differences file existence: {e}")
-                    return None, 0
-            
-            # Descargar desde S3
-            response = self.s3_client.get_object(
-                Bucket=self.bucket_name,
-                Key=s3_key
-            )
-            
-            json_data = response['Body'].read().decode('utf-8')
-            differences_data = json.loads(json_data)
+            for file_name in (DIFFERENCES_FILE, LEGACY_DIFFERENCES_FILE):
+                s3_key = f"solutions/{solution_id}/differences/{file_name}"
+                
+                request = {'Bucket': self.bucket_name, 'Key': s3_key}
+                if cached and cached[0] == s3_key:
+                    request['IfNoneMatch'] = cached[1]
+                
+                try:
+                    response = self.s3_client.get_object(**request)
+                except ClientError as e:
+                    error_code = e.response['Error']['Code']
+                    if error_code in ('304', 'NotModified'):
+                        differences = cached[2]
+                        logger.info(f"Differences for solution {solution_id} unchanged, using cached copy")
+                        return differences, differences.total_differences
+                    if error_code in ('NoSuchKey', '404'):
+                        continue
+                    raise
+                
+                differences = load_differences(response['Body'].read())
+                _cache_differences(solution_id, s3_key, response.get('ETag'), differences)
+                
+                logger.info(f"Successfully retrieved {differences.total_differences} differences for solution {solution_id}")
+                return differences, differences.total_differences
             
-            logger.info(f"Successfully retrieved {differences_data['total_differences']} differences for solution {solution_id}")
-            return differences_data['differences'], differences_data['total_differences']
+            _forget_differences(solution_id)
+            logger.warning(f"Differences file not found in S3 for solution {solution_id}")
+            return None, 0
             
         except Exception as e:
             logger.error(f"Error getting differences from S3: {e}")
             return None, 0
     
-    def transfer_temp_files(self, temp_solution_id, real_solution_id):
-        """Transferir ORI1 y MOD1 permanentemente para trazabilidad completa de la solución"""
+    def open_differences(self, solution_id):
+        """
+        Abrir las diferencias de S3 como (bit_size, iterador de PatchRegion)
+
+        El cuerpo de la respuesta se decodifica según avanza el iterador, sin
+        descargarlo entero. Si la copia en caché sigue vigente se itera esa.
+        Devuelve None si no existen o hay un error.
+        """
+        try:
+            solution_id = int(solution_id)
+            cached = _cached_differences(solution_id)
+
+            for file_name in (DIFFERENCES_FILE, LEGACY_DIFFERENCES_FILE):
+                s3_key = f"solutions/{solution_id}/differences/{file_name}"
+
+                request = {'Bucket': self.bucket_name, 'Key': s3_key}
+                if cached and cached[0] == s3_key:
+                    request['IfNoneMatch'] = cached[1]
+
+                try:
+                    response = self.s3_client.get_object(**request)
+                except ClientError as e:
+                    error_code = e.response['Error']['Code']
+                    if error_code in ('304', 'NotModified'):
+                        return cached[2].bit_size, iter(cached[2].regions)
+                    if error_code in ('NoSuchKey', '404'):
+                        continue
+                    raise
+
+                body = response['Body']
+                try:
+                    return read_regions(body, close=True)
+                except Exception:
+                    body.close()
+                    raise
+
+            logger.warning(f"Differences file not found in S3 for solution {solution_id}")
+            return None
+
+        except Exception as e:
+            logger.error(f"Error opening differences from S3: {e}")
+            return None
+
+    def get_differences_info(self, solution_id):
+        """
+        Obtener (bit_size, total_differences) sin cargar las regiones
+
+        El bit size sale de la cabecera del objeto y el total de
+        differences_metadata; sin fila de metadatos se cuentan las regiones.
+        Devuelve (None, 0) si no existen o hay un error.
+        """
+        opened = self.open_differences(solution_id)
+        if not opened:
+            return None, 0
+        bit_size, regions = opened
+        try:
+            total_differences = self._get_total_differences(solution_id)
+            if total_differences is None:
+                total_differences = sum(region.length for region in regions) // (bit_size // 8)
+            return bit_size, total_differences
+        except ValueError as e:
+            logger.error(f"Error reading differences from S3: {e}")
+            return None, 0
+        finally:
+            # Cortar la descarga del resto del objeto
+            close = getattr(regions, 'close', None)
+            if close:
+                close()
+
+    def _get_total_differences(self, solution_id):
+        try:
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                cur.execute(
+                    "SELECT total_differences FROM differences_metadata WHERE solution_id = %s",
+                    (int(solution_id),)
+                )
+                result = cur.fetchone()
+                cur.close()
+        except Exception as e:
+            logger.error(f"Error getting differences metadata: {e}")
+            return None
+        return result[0] if result else None
+
+    def transfer_temp_files(self, temp_solution_id, real_solution_id, files=None):
+        """
+        Transferir ORI1 y MOD1 permanentemente para trazabilidad completa de la solución
+
+        Cada archivo pasa a un blob direccionado por su SHA-256: si el blob ya
+        existe no se copia nada y solo se añade una referencia.
+
+        files: {file_type: {'filename', 'file_key', 'sha256', ...}} tal como los
+        devuelve store_stream; sin él se lista el prefijo temporal y se calcula el hash
+        """
         try:
             real_solution_id = int(real_solution_id)
             temp_solution_id = str(temp_solution_id)
             
             logger.info(f"Transferring ORI1 + MOD1 from temp {temp_solution_id} to solution {real_solution_id}")
             
-            # Listar todos los archivos temporales
+            # Listar todos los archivos temporales (la misma lista sirve luego para borrarlos)
             temp_prefix = f"solutions/{temp_solution_id}/"
             response = self.s3_client.list_objects_v2(
                 Bucket=self.bucket_name,
                 Prefix=temp_prefix
             )
-            
-            if 'Contents' not in response:
-                logger.warning(f"No temp files found for {temp_solution_id}")
-                return False
+            temp_objects = response.get('Contents', [])
+            sizes = {obj['Key']: obj['Size'] for obj in temp_objects}
             
             # Transferir AMBOS archivos (ORI1 + MOD1) permanentemente
-            files_transferred = 0
-            transferred_files = []
+            transfers = []
+            if files:
+                for file_type in ['ori1', 'mod1']:
+                    file_info = files.get(file_type)
+                    if not file_info or not file_info.get('file_key'):
+                        continue
+                    transfers.append({
+                        'file_type': file_type,
+                        'filename': file_info['filename'],
+                        'old_key': file_info['file_key'],
+                        'sha256': file_info.get('sha256'),
+                        'size': sizes.get(file_info['file_key'], file_info.get('size'))
+                    })
+            else:
+                for obj in temp_objects:
+                    # Format: solutions/{temp_id}/{file_type}/{filename}
+                    path_parts = obj['Key'].split('/')
+                    if len(path_parts) >= 4 and path_parts[2] in ['ori1', 'mod1']:
+                        transfers.append({
+                            'file_type': path_parts[2],
+                            'filename': path_parts[3],
+                            'old_key': obj['Key'],
+                            'sha256': None,
+                            'size': obj['Size']
+                        })
+                    elif len(path_parts) >= 4:
+                        logger.info(f"ℹ️ Other file type found: {path_parts[2]} - {obj['Key']}")
             
-            for obj in response['Contents']:
-                old_key = obj['Key']
+            if not transfers:
+                if temp_objects:
+                    self._delete_objects(temp_objects)
+                logger.warning(f"⚠️ No ORI1/MOD1 files found to transfer from {temp_solution_id}")
+                return False
+            
+            def copy_file(transfer):
+                if not transfer['sha256']:
+                    transfer['sha256'] = self._hash_object(transfer['old_key'])
+                transfer['new_key'] = blob_key(transfer['sha256'])
+                transfer['held'] = False
                 
-                # Extraer file_type y filename del path
-                # Format: solutions/{temp_id}/{file_type}/{filename}
-                path_parts = old_key.split('/')
-                if len(path_parts) >= 4:
-                    file_type = path_parts[2]
-                    filename = path_parts[3]
-                    
-                    # Transferir TANTO ORI1 como MOD1 permanentemente
-                    if file_type in ['ori1', 'mod1']:
-                        # Nueva clave para la solución real
-                        new_key = f"solutions/{real_solution_id}/{file_type}/{filename}"
-                        
-                        # Copiar archivo permanentemente
-                        copy_source = {'Bucket': self.bucket_name, 'Key': old_key}
-                        self.s3_client.copy_object(
-                            CopySource=copy_source,
-                            Bucket=self.bucket_name,
-                            Key=new_key,
-                            MetadataDirective='REPLACE',
-                            Metadata={
-                                'solution_id': str(real_solution_id),
-                                'file_type': file_type,
-                                'original_filename': filename
-                            }
-                        )
-
-                        file_size = obj['Size']
-
-                        try:
-                            self._save_file_metadata(real_solution_id, file_type, filename, file_size, new_key)
-                        except Exception as db_error:
-                            logger.error(f"DB write failed after S3 copy — compensating: {new_key}")
-                            self._compensate_s3_delete(new_key)
-                            continue
-                        
-                        transferred_files.append({
-                            'file_type': file_type,
-                            'filename': filename,
-                            'old_key': old_key,
-                            'new_key': new_key,
-                            'size': file_size
-                        })
-                        
-                        logger.info(f"✅ {file_type.upper()} transferred permanently: {old_key} -> {new_key}")
-                        files_transferred += 1
-                    
-                    else:
-                        logger.info(f"ℹ️ Other file type found: {file_type} - {old_key}")
+                existing = acquire_blob(transfer['sha256'])
+                if existing:
+                    # Contenido ya almacenado (p. ej. el mismo ORI1 de stock): sin copia
+                    transfer['new_key'] = existing['key']
+                    transfer['size'] = existing['size']
+                    transfer['created'] = False
+                    transfer['held'] = True
+                    return transfer
+                
+                if transfer['size'] is None:
+                    transfer['size'] = self.s3_client.head_object(
+                        Bucket=self.bucket_name, Key=transfer['old_key']
+                    )['ContentLength']
+                self._copy_object(
+                    transfer['old_key'],
+                    transfer['new_key'],
+                    transfer['size'],
+                    {'sha256': transfer['sha256']}
+                )
+                transfer['created'] = True
+                return transfer
             
-            # Eliminar archivos temporales después de transferir
-            self.delete_temp_files(temp_solution_id)
+            # Copias server-side en paralelo
+            copied = []
+            errors = []
+            with ThreadPoolExecutor(max_workers=min(TRANSFER_MAX_WORKERS, len(transfers))) as executor:
+                futures = [executor.submit(copy_file, transfer) for transfer in transfers]
+                for transfer, future in zip(transfers, futures):
+                    try:
+                        copied.append(future.result())
+                        state = 'transferred permanently' if transfer['created'] else 'already stored, copy skipped'
+                        logger.info(f"✅ {transfer['file_type'].upper()} {state}: {transfer['old_key']} -> {transfer['new_key']}")
+                    except Exception as copy_error:
+                        errors.append(copy_error)
+                        logger.error(f"Error copying {transfer['old_key']}: {copy_error}")
             
-            if files_transferred > 0:
-                logger.info(f"✅ Successfully transferred {files_transferred} files from {temp_solution_id} to {real_solution_id}")
-                for file_info in transferred_files:
-                    logger.info(f"   � {file_info['file_type'].upper()}: {file_info['filename']} ({file_info['size']:,} bytes)")
-                logger.info(f"🗑️ Temporary files deleted from {temp_solution_id}")
-                logger.info(f"🎯 RESULTADO: ORI1 + MOD1 guardados permanentemente para trazabilidad completa")
-                return True
-            else:
-                logger.warning(f"⚠️ No ORI1/MOD1 files found to transfer from {temp_solution_id}")
+            created = [t['new_key'] for t in copied if t['created']]
+            held = [t['sha256'] for t in copied if t['held']]
+            if errors:
+                # Deshacer las copias hechas y conservar los temporales para reintentar
+                for s3_key in created:
+                    self._compensate_s3_delete(s3_key)
+                self._release_held(held)
+                return False
+            
+            try:
+                self._link_files(real_solution_id, [
+                    (t['file_type'], t['filename'], t['size'], t['new_key'], t['sha256']) for t in copied
+                ], created, held)
+            except Exception as db_error:
+                logger.error(f"DB write failed after S3 copy — compensating: {db_error}")
                 return False
             
+            # Eliminar archivos temporales usando el listado ya obtenido
+            if temp_objects:
+                self._delete_objects(temp_objects)
+            
+            logger.info(f"✅ Successfully transferred {len(copied)} files from {temp_solution_id} to {real_solution_id}")
+            for file_info in copied:
+                logger.info(f"   📄 {file_info['file_type'].upper()}: {file_info['filename']} ({file_info['size']:,} bytes)")
+            logger.info(f"🗑️ Temporary files deleted from {temp_solution_id}")
+            logger.info(f"🎯 RESULTADO: ORI1 + MOD1 guardados permanentemente para trazabilidad completa")
+            return True
+            
         except Exception as e:
             logger.error(f"Error transferring temp files: {e}")
             return False
     
+    def _delete_objects(self, objects):
+        """Eliminar en lote objetos de un listado de list_objects_v2"""
+        try:
+            self.s3_client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': obj['Key']} for obj in objects]}
+            )
+        except Exception as e:
+            logger.error(f"Error deleting objects: {e}")
+    
     def delete_temp_files(self, temp_solution_id):
         """Eliminar archivos temporales"""
         try:
@@ -466,7 +1033,10 @@ class S3FileStorage:
         try:
             solution_id = int(solution_id)
             
-            # Listar todos los objetos de la solution
+            # Eliminar metadatos de PostgreSQL y soltar las referencias a blobs
+            released = release_solution_files(solution_id)
+            
+            # Listar todos los objetos de la solution (diferencias y archivos anteriores a los blobs)
             prefix = f"solutions/{solution_id}/"
             response = self.s3_client.list_objects_v2(
                 Bucket=self.bucket_name,
@@ -482,12 +1052,11 @@ class S3FileStorage:
                     Delete={'Objects': objects_to_delete}
                 )
             
-            # Eliminar metadatos de PostgreSQL
-            with pooled_connection() as conn:
-                cur = conn.cursor()
-                cur.execute("DELETE FROM file_metadata WHERE solution_id = %s", (solution_id,))
-                cur.execute("DELETE FROM differences_metadata WHERE solution_id = %s", (solution_id,))
-                cur.close()
+            # Blobs compartidos: solo se borran los que ya no referencia ninguna solución
+            if released:
+                self._delete_objects([{'Key': s3_key} for s3_key in released])
+            _forget_file_keys(solution_id)
+            _forget_differences(solution_id)
             
             logger.info(f"Solution {solution_id} files deleted")
             return True
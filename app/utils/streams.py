@@ -0,0 +1,77 @@
+"""
+Stream Utilities Module
+
+Helpers shared by the storage backends for moving file contents without
+loading them whole into memory:
+- A read-only file wrapper that hashes and counts bytes as they are read
+- A chunked copy between file objects
+- HTTP byte-range resolution and chunked iteration for streamed downloads
+"""
+
+import hashlib
+import shutil
+from werkzeug.http import parse_range_header
+
+# Size of each read when copying a stream (bounds memory per transfer)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class HashingReader:
+    """
+    Wrap a readable file object and compute its SHA-256 and size on the fly.
+
+    The wrapper deliberately exposes no seek/tell, so consumers such as
+    boto3's upload_fileobj treat it as a forward-only stream and read it in
+    order, which keeps the hash consistent with the bytes sent.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self._fileobj.read(size)
+        if chunk:
+            self._sha256.update(chunk)
+            self.size += len(chunk)
+        return chunk
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+
+def copy_stream(src, dst, chunk_size=STREAM_CHUNK_SIZE):
+    """Copy ``src`` into ``dst`` in fixed-size chunks."""
+    shutil.copyfileobj(src, dst, chunk_size)
+
+
+def resolve_byte_range(range_header, size):
+    """
+    Resolve an HTTP ``Range`` header against a file of ``size`` bytes.
+
+    Returns ``(start, stop)`` for a single satisfiable range, or None when the
+    header is absent, malformed, multi-range or unsatisfiable; in those cases
+    the whole file is served, which RFC 7233 allows.
+    """
+    if not range_header:
+        return None
+    byte_range = parse_range_header(range_header)
+    if byte_range is None:
+        return None
+    return byte_range.range_for_length(size)
+
+
+def iter_stream(body, length, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield at most ``length`` bytes from ``body`` in chunks, closing it at the end."""
+    try:
+        remaining = length
+        while remaining > 0:
+            chunk = body.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        body.close()
@@ -28,6 +28,11 @@ class Config:
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_ANON_KEY = os.environ.get('SUPABASE_ANON_KEY') 
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    # Project JWT secret: lets access tokens be verified locally (optional)
+    SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')
+    # Per-process cache of authenticated users (seconds / entries)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 300)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 1024)
     
     # Database PostgreSQL
     # Supports individual DB_* vars (local/.env) or a single DATABASE_URL (Railway auto-inject)
@@ -58,6 +63,38 @@ class Config:
     AWS_S3_BUCKET = os.environ.get('AWS_S3_BUCKET')
     AWS_S3_REGION = os.environ.get('AWS_S3_REGION') or 'us-east-1'
 
+    # Background jobs: worker threads per process
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    # Seconds after which a queued/running job is considered lost and failed at startup
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER') or 3600)
+
+    # Compatibility results memoized in process (on top of the PostgreSQL table)
+    COMPATIBILITY_CACHE_SIZE = int(os.environ.get('COMPATIBILITY_CACHE_SIZE') or 1024)
+
+    # ORI2 vs ORI1 similarity (%) below which compatibility is low; the
+    # comparison stops as soon as a file cannot reach it
+    COMPATIBILITY_MIN_SIMILARITY = float(os.environ.get('COMPATIBILITY_MIN_SIMILARITY') or 70)
+
+    # Compatibility scans: solutions checked in parallel per scan, how many of
+    # the best differences-based matches get a full similarity check, and how
+    # many difference points (from the start of each solution) are read to rank
+    COMPATIBILITY_SCAN_WORKERS = int(os.environ.get('COMPATIBILITY_SCAN_WORKERS') or 4)
+    COMPATIBILITY_SCAN_TOP_K = int(os.environ.get('COMPATIBILITY_SCAN_TOP_K') or 5)
+    COMPATIBILITY_SCAN_MAX_POINTS = int(os.environ.get('COMPATIBILITY_SCAN_MAX_POINTS') or 1000)
+
+    # Solutions proposed from the content of an uploaded ORI2: how many, and the
+    # minimum share of 4 KB blocks its ORI1 must have in common with it (0-1)
+    CONTENT_INDEX_MAX_CANDIDATES = int(os.environ.get('CONTENT_INDEX_MAX_CANDIDATES') or 10)
+    CONTENT_INDEX_MIN_SCORE = float(os.environ.get('CONTENT_INDEX_MIN_SCORE') or 0.5)
+
+    # Binary comparisons: worker processes (0 runs everything inline) and
+    # largest combined input, in bytes, sent to a worker
+    BINARY_POOL_WORKERS = int(os.environ.get('BINARY_POOL_WORKERS') or 2)
+    BINARY_POOL_MAX_TASK_BYTES = int(os.environ.get('BINARY_POOL_MAX_TASK_BYTES') or 64 * 1024 * 1024)
+
+    # MOD2 downloads: 'stream' through the app, or 'presigned' redirect to S3
+    S3_DOWNLOAD_MODE = os.environ.get('S3_DOWNLOAD_MODE') or 'stream'
+
     @staticmethod
     def init_app(app):
         pass
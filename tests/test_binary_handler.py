@@ -0,0 +1,78 @@
+import struct
+
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler
+
+
+def baseline_read(raw, bit_size):
+    # The struct loop read_file used before the single-read decoder
+    width = bit_size // 8
+    format_char = {8: 'B', 16: 'H', 32: 'I'}[bit_size]
+    values = []
+    for start in range(0, len(raw), width):
+        chunk = raw[start:start + width].ljust(width, b'\x00')
+        values.append(struct.unpack(f'<{format_char}', chunk)[0])
+    return values
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+@pytest.mark.parametrize('size', [0, 1, 4096, 4099])
+def test_read_file_matches_baseline_decoder(tmp_path, bit_size, size):
+    raw = np.random.default_rng(size).integers(0, 256, size, dtype=np.uint8).tobytes()
+    path = tmp_path / 'stock.bin'
+    path.write_bytes(raw)
+
+    data = BinaryHandler().read_file(path, bit_size)
+
+    assert data.tolist() == baseline_read(raw, bit_size)
+
+
+def test_read_file_rejects_unknown_extensions(tmp_path):
+    path = tmp_path / 'stock.txt'
+    path.write_bytes(b'\x00' * 4)
+    with pytest.raises(ValueError):
+        BinaryHandler().read_file(path)
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_write_file_round_trip(tmp_path, bit_size):
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+    values = [0, 1, (1 << bit_size) - 1, 0x5A]
+    path = tmp_path / 'out.bin'
+
+    assert handler.write_file(path, values)
+    assert handler.read_file(path).tolist() == values
+
+
+@pytest.mark.parametrize('value', [-1, 1 << 16])
+def test_write_file_rejects_values_out_of_range(tmp_path, value):
+    handler = BinaryHandler()
+    handler.set_read_size(16)
+    path = tmp_path / 'out.bin'
+
+    assert not handler.write_file(path, [0, value])
+
+
+@pytest.mark.parametrize('new_value', [-1, 1 << 16, 1 << 40])
+def test_differences_out_of_range_are_rejected(tmp_path, caplog, new_value):
+    handler = BinaryHandler()
+    handler.set_read_size(16)
+    original = np.arange(8, dtype='<u2')
+    path = tmp_path / 'mod2.bin'
+
+    assert not handler.write_mod2(original, [(2, 1, new_value)], path)
+    assert handler.apply_differences_to_bytes(original.tobytes(), [(2, 1, new_value)]) is None
+    assert f'Value {new_value} out of range for 16-bit storage' in caplog.text
+    assert not path.exists()
+
+
+def test_original_values_out_of_range_are_rejected(tmp_path):
+    handler = BinaryHandler()
+    handler.set_read_size(8)
+
+    assert not handler.write_mod2([0, 256, 2], [(0, 0, 1)], tmp_path / 'mod2.bin')
+    assert handler.write_mod2([0, 255, 2], [(0, 0, 1)], tmp_path / 'mod2.bin')
+    assert handler.read_file(tmp_path / 'mod2.bin').tolist() == [1, 255, 2]
@@ -0,0 +1,251 @@
+import contextlib
+import hashlib
+import io
+
+import pytest
+from flask import Flask
+
+from app.utils import blob_store, file_storage
+from app.utils.diff_engine import PatchRegion
+from app.utils.blob_store import blob_key, acquire_blob, link_files, release_blobs, release_solution_files
+
+
+class FakeBlobDB:
+    """In-memory stand-in for the solutions/file_metadata/file_blobs tables."""
+
+    def __init__(self, solutions=()):
+        self.solutions = set(solutions)
+        self.metadata = {}
+        self.blobs = {}
+        self.differences = {}
+
+    def connection(self):
+        db = self
+
+        @contextlib.contextmanager
+        def pooled_connection():
+            yield FakeConnection(db)
+        return pooled_connection
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def close(self):
+        pass
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def execute(self, sql, params=()):
+        db = self.db
+        sql = ' '.join(sql.split())
+        self.rows = []
+        if sql.startswith('SELECT id FROM solutions'):
+            self.rows = [(params[0],)] if params[0] in db.solutions else []
+        elif sql.startswith('SELECT sha256 FROM file_metadata') and 'file_type = ANY' in sql:
+            solution_id, file_types = params
+            self.rows = [(row['sha256'],) for (sid, ft), row in db.metadata.items()
+                         if sid == solution_id and ft in file_types and row['sha256']]
+        elif sql.startswith('SELECT sha256 FROM file_metadata'):
+            self.rows = [(row['sha256'],) for (sid, _), row in db.metadata.items()
+                         if sid == params[0] and row['sha256']]
+        elif sql.startswith('SELECT file_name, s3_key FROM file_metadata'):
+            row = db.metadata.get(tuple(params))
+            self.rows = [(row['file_name'], row['key'])] if row else []
+        elif sql.startswith('UPDATE file_blobs SET ref_count = ref_count + 1'):
+            blob = db.blobs.get(params[0])
+            if blob and blob['ref_count'] > 0:
+                blob['ref_count'] += 1
+                self.rows = [(blob['key'], blob['size'])]
+        elif sql.startswith('INSERT INTO file_blobs'):
+            sha256, key, size = params
+            if sha256 in db.blobs:
+                db.blobs[sha256]['ref_count'] += 1
+            else:
+                db.blobs[sha256] = {'key': key, 'size': size, 'ref_count': 1}
+        elif sql.startswith('DELETE FROM file_blobs'):
+            gone = [sha for sha in params[0] if sha in db.blobs and db.blobs[sha]['ref_count'] <= 0]
+            self.rows = [(db.blobs.pop(sha)['key'],) for sha in gone]
+        elif sql.startswith('DELETE FROM file_metadata'):
+            for key in [k for k in db.metadata if k[0] == params[0]]:
+                del db.metadata[key]
+        elif sql.startswith('DELETE FROM differences_metadata'):
+            db.differences.pop(params[0], None)
+        elif sql.startswith('INSERT INTO differences_metadata'):
+            db.differences[params[0]] = params[1]
+        elif sql.startswith('SELECT total_differences FROM differences_metadata'):
+            self.rows = [(db.differences[params[0]],)] if params[0] in db.differences else []
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def execute_values(self, sql, values):
+        db = self.db
+        sql = ' '.join(sql.split())
+        if sql.startswith('INSERT INTO file_metadata'):
+            for solution_id, file_type, file_name, file_size, key, sha256 in values:
+                db.metadata[(solution_id, file_type)] = {
+                    'file_name': file_name, 'size': file_size, 'key': key, 'sha256': sha256
+                }
+        elif sql.startswith('UPDATE file_blobs SET ref_count = file_blobs.ref_count - released.n'):
+            for sha256, n in values:
+                if sha256 in db.blobs:
+                    db.blobs[sha256]['ref_count'] -= n
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+
+def fake_execute_values(cur, sql, values, **kwargs):
+    cur.execute_values(sql, list(values))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeBlobDB(solutions={1, 2, 3})
+    monkeypatch.setattr(blob_store, 'pooled_connection', db.connection())
+    monkeypatch.setattr(blob_store, 'execute_values', fake_execute_values)
+    monkeypatch.setattr(file_storage, 'pooled_connection', db.connection())
+    return db
+
+
+def ref_count(db, sha256):
+    return db.blobs[sha256]['ref_count'] if sha256 in db.blobs else 0
+
+
+def test_link_files_counts_one_reference_per_file(db):
+    link_files(1, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa'), ('mod1', 'b.bin', 3, blob_key('bb'), 'bb')])
+    link_files(2, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+
+    assert ref_count(db, 'aa') == 2
+    assert ref_count(db, 'bb') == 1
+
+
+def test_replacing_a_file_releases_the_old_blob(db):
+    link_files(1, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+
+    assert link_files(1, [('ori1', 'c.bin', 3, blob_key('cc'), 'cc')]) == [blob_key('aa')]
+    assert 'aa' not in db.blobs
+    assert ref_count(db, 'cc') == 1
+
+
+def test_release_solution_files_returns_only_unreferenced_blobs(db):
+    link_files(1, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa'), ('mod1', 'b.bin', 3, blob_key('bb'), 'bb')])
+    link_files(2, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+
+    assert release_solution_files(1) == [blob_key('bb')]
+    assert ref_count(db, 'aa') == 1
+    assert release_solution_files(2) == [blob_key('aa')]
+    assert not db.blobs and not db.metadata
+
+
+def test_link_files_rejects_unknown_solution(db):
+    with pytest.raises(ValueError):
+        link_files(99, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+    assert not db.blobs
+
+
+def test_acquired_reference_survives_concurrent_release(db):
+    link_files(1, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+
+    assert acquire_blob('aa') == {'key': blob_key('aa'), 'size': 3}
+    # The only linked solution goes away before the new link is written
+    assert release_solution_files(1) == []
+    link_files(2, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')], held=['aa'])
+
+    assert ref_count(db, 'aa') == 1
+    assert db.metadata[(2, 'ori1')]['key'] == blob_key('aa')
+
+
+def test_acquire_blob_ignores_missing_or_released_blobs(db):
+    assert acquire_blob('aa') is None
+    link_files(1, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+    release_solution_files(1)
+    assert acquire_blob('aa') is None
+
+
+def test_release_blobs_gives_back_unlinked_references(db):
+    link_files(1, [('ori1', 'a.bin', 3, blob_key('aa'), 'aa')])
+    acquire_blob('aa')
+
+    assert release_blobs(['aa']) == []
+    assert ref_count(db, 'aa') == 1
+
+
+def test_local_storage_shares_and_deletes_blobs(db, tmp_path):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        storage = file_storage.PostgreSQLFileStorage()
+        assert storage.store_file(1, 'ori1', 'a.bin', b'stock file')
+        stored = storage.store_stream(2, 'ori1', 'b.bin', io.BytesIO(b'stock file'))
+        sha256 = stored['sha256']
+        deduplicated = storage.store_stream(3, 'ori1', 'c.bin', io.BytesIO(b'stock file'), sha256=sha256)
+
+        assert deduplicated['deduplicated']
+        assert ref_count(db, sha256) == 3
+        blob_path = tmp_path.joinpath(*blob_key(sha256).split('/'))
+
+        # Temp uploads never point at a blob
+        temp = storage.store_stream('temp_1', 'ori1', 'd.bin', io.BytesIO(b'stock file'), sha256=sha256)
+        assert temp['key'].startswith('solutions/temp_1/')
+
+        storage.delete_solution_files(1)
+        storage.delete_solution_files(2)
+        assert blob_path.exists()
+        assert storage.get_file(3, 'ori1') == ('c.bin', b'stock file')
+
+        storage.delete_solution_files(3)
+        assert not blob_path.exists()
+        assert not db.blobs
+
+
+def test_local_storage_replaces_orphan_blob_files(db, tmp_path):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        storage = file_storage.PostgreSQLFileStorage()
+        sha256 = hashlib.sha256(b'stock file').hexdigest()
+        # Left behind by a failed upload: on disk, but no file_blobs row owns it
+        blob_path = tmp_path.joinpath(*blob_key(sha256).split('/'))
+        blob_path.parent.mkdir(parents=True)
+        blob_path.write_bytes(b'partial')
+
+        assert storage.store_file(1, 'ori1', 'a.bin', b'stock file')
+        assert blob_path.read_bytes() == b'stock file'
+        assert ref_count(db, sha256) == 1
+
+        blob_path.write_bytes(b'partial')
+        storage.delete_solution_files(1)
+        stored = storage.store_stream(2, 'ori1', 'b.bin', io.BytesIO(b'stock file'))
+        assert stored['key'] == blob_key(sha256)
+        assert blob_path.read_bytes() == b'stock file'
+        assert ref_count(db, sha256) == 1
+
+
+def test_local_storage_reads_differences_info_without_loading_regions(db, tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    regions = [PatchRegion(0, b'\x00\x00', b'\x01\x00'), PatchRegion(10, b'\x00' * 4, b'\xff' * 4)]
+    with app.app_context():
+        storage = file_storage.PostgreSQLFileStorage()
+        assert storage.get_differences_info(1) == (None, 0)
+        assert storage.store_differences_stream(1, regions, 16) == 3
+        monkeypatch.setattr(storage, 'get_differences', lambda solution_id: pytest.fail('full load'))
+
+        assert storage.get_differences_info(1) == (16, 3)
+        # Without a metadata row the regions are counted instead
+        db.differences.clear()
+        assert storage.get_differences_info(1) == (16, 3)
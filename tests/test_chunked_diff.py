@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler, CHUNKED_MIN_BYTES
+from app.utils.diff_engine import DTYPE_MAP, diff_arrays, diff_arrays_chunked, count_equal_chunked
+
+
+def make_files(size, bit_size, seed=0, changes=5000):
+    rng = np.random.default_rng(seed)
+    raw1 = rng.integers(0, 256, size, dtype=np.uint8)
+    raw2 = raw1.copy()
+    raw2[rng.choice(size, changes, replace=False)] ^= 0x5A
+    raw2[1000:3000] = 0  # a run of changes
+    dtype = DTYPE_MAP[bit_size]
+    return raw1, raw2, raw1.view(dtype), raw2.view(dtype)
+
+
+def assert_same_diff(actual, expected):
+    assert actual.bit_size == expected.bit_size
+    np.testing.assert_array_equal(actual.offsets, expected.offsets)
+    np.testing.assert_array_equal(actual.old_values, expected.old_values)
+    np.testing.assert_array_equal(actual.new_values, expected.new_values)
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+@pytest.mark.parametrize('chunk_bytes', [4096, 100000, 1 << 20])
+def test_chunked_diff_matches_whole_file_diff(bit_size, chunk_bytes):
+    _, _, data1, data2 = make_files(1 << 20, bit_size)
+
+    expected = diff_arrays(data1, data2, bit_size)
+
+    assert_same_diff(diff_arrays_chunked(data1, data2, bit_size, chunk_bytes=chunk_bytes), expected)
+
+
+def test_chunked_diff_of_different_lengths():
+    _, _, data1, data2 = make_files(1 << 20, 16)
+
+    assert_same_diff(diff_arrays_chunked(data1, data2[:-777], 16, chunk_bytes=65536),
+                     diff_arrays(data1, data2[:-777], 16))
+
+
+def test_count_equal_chunked_matches_numpy():
+    _, _, data1, data2 = make_files(1 << 20, 8)
+
+    assert count_equal_chunked(data1, data2, chunk_bytes=50000) == int(np.count_nonzero(data1 == data2))
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_diff_data_above_threshold_matches_whole_file(tmp_path, bit_size):
+    size = CHUNKED_MIN_BYTES
+    raw1, raw2, data1, data2 = make_files(size, bit_size, changes=20000)
+    path1 = tmp_path / 'ori1.bin'
+    path2 = tmp_path / 'mod1.bin'
+    raw1.tofile(path1)
+    raw2.tofile(path2)
+
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+    expected = diff_arrays(data1, data2, bit_size)
+
+    # Files of CHUNKED_MIN_BYTES are memory-mapped and diffed in chunks
+    assert_same_diff(handler.compare_files(str(path1), str(path2)), expected)
+    assert_same_diff(handler.diff_data(data1, data2), expected)
+    assert handler.calculate_similarity(data1, data2)['identical_bytes'] == int(np.count_nonzero(data1 == data2))
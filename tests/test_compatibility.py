@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler, MAX_INCOMPATIBLE_POINTS
+from app.utils.diff_engine import DTYPE_MAP, PatchSet, diff_arrays
+
+
+def baseline_compatibility(ori2_data, differences_data, bit_size):
+    # The per-point loop calculate_compatibility_from_differences used before vectorizing
+    bytes_per_value = bit_size // 8
+    matching_points = 0
+    incompatible_points = []
+    for diff in differences_data:
+        address, expected, modification = diff['memory_address'], diff['ori1_value'], diff['mod1_value']
+        index = address // bytes_per_value
+        if index >= len(ori2_data):
+            incompatible_points.append({'address': address, 'index': index, 'expected_value': expected,
+                                        'actual_value': None, 'reason': 'Address out of bounds',
+                                        'modification_value': modification})
+            continue
+        actual = ori2_data[index]
+        if actual == expected:
+            matching_points += 1
+        else:
+            incompatible_points.append({'address': address, 'index': index, 'expected_value': expected,
+                                        'actual_value': actual, 'reason': 'Value mismatch',
+                                        'modification_value': modification, 'difference': abs(actual - expected)})
+    total_points = len(differences_data)
+    return {
+        'compatibility_percentage': round(matching_points / total_points * 100, 2),
+        'matching_points': matching_points,
+        'total_points': total_points,
+        'incompatible_points': incompatible_points,
+    }
+
+
+def make_case(bit_size, words=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    dtype = DTYPE_MAP[bit_size]
+    ori1 = rng.integers(0, 1 << bit_size, words, dtype=np.uint64).astype(dtype)
+    mod1 = ori1.copy()
+    mod1[rng.choice(words, 3000, replace=False)] ^= dtype.type(0x21)
+    differences = diff_arrays(ori1, mod1, bit_size)
+    # ORI2: a slightly different, shorter revision of ORI1
+    ori2 = ori1[:words - 500].copy()
+    ori2[rng.choice(len(ori2), 2000, replace=False)] ^= dtype.type(0x44)
+    return ori2, differences
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_matches_baseline_loop(bit_size):
+    ori2, differences = make_case(bit_size, seed=bit_size)
+    records = differences.to_records()
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+
+    expected = baseline_compatibility(ori2.tolist(), records, bit_size)
+
+    for data in (records, differences, PatchSet.from_diff(differences)):
+        result = handler.calculate_compatibility_from_differences(ori2, data, max_incompatible_points=None)
+        for key in ('compatibility_percentage', 'matching_points', 'total_points', 'incompatible_points'):
+            assert result[key] == expected[key], key
+        assert result['incompatible_count'] == len(expected['incompatible_points'])
+        assert any(point['reason'] == 'Address out of bounds' for point in result['incompatible_points'])
+
+
+def test_incompatible_details_are_capped():
+    ori2, differences = make_case(16)
+    ori2[::2] ^= np.uint16(1)
+    handler = BinaryHandler()
+    handler.set_read_size(16)
+
+    full = handler.calculate_compatibility_from_differences(ori2, differences, max_incompatible_points=None)
+    capped = handler.calculate_compatibility_from_differences(ori2, differences)
+    few = handler.calculate_compatibility_from_differences(ori2, differences, max_incompatible_points=5)
+
+    assert full['incompatible_count'] > MAX_INCOMPATIBLE_POINTS
+    assert capped['incompatible_count'] == few['incompatible_count'] == full['incompatible_count']
+    assert capped['incompatible_points'] == full['incompatible_points'][:MAX_INCOMPATIBLE_POINTS]
+    assert few['incompatible_points'] == full['incompatible_points'][:5]
+    assert few['matching_points'] == full['matching_points']
+
+
+def test_no_differences_reports_an_error():
+    result = BinaryHandler().calculate_compatibility_from_differences(np.zeros(4, dtype=np.uint8), [])
+
+    assert result['total_points'] == 0
+    assert result['incompatible_count'] == 0
+    assert 'error' in result
@@ -0,0 +1,136 @@
+import contextlib
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from app.main import jobs
+from app.utils import compatibility_cache as cache_module
+from app.utils.compatibility_cache import CompatibilityCache
+
+ORI2 = 'a' * 64
+ORI1 = 'b' * 64
+
+
+class FakeResultsTable:
+    """In-memory stand-in for the compatibility_results table."""
+
+    def __init__(self):
+        self.rows = {}
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.row = None
+
+    def execute(self, sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT result FROM compatibility_results'):
+            result = self.table.rows.get(tuple(params))
+            self.row = (result,) if result is not None else None
+        elif sql.startswith('INSERT INTO compatibility_results'):
+            self.table.rows[tuple(params[:5])] = params[5].adapted
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeResultsTable()
+    monkeypatch.setattr(cache_module, 'pooled_connection', table.connection)
+    return table
+
+
+def test_hit_from_memory_and_from_the_table(table):
+    cache = CompatibilityCache()
+    cache.set(ORI2, ORI1, 8, 70, 'below', {'similarity_percentage': 95.5})
+
+    assert cache.get(ORI2, ORI1, 8, 70, 'below') == {'similarity_percentage': 95.5}
+    # Another worker process only has the table
+    assert CompatibilityCache().get(ORI2, ORI1, 8, 70.0, 'below') == {'similarity_percentage': 95.5}
+
+
+def test_returned_results_are_copies(table):
+    cache = CompatibilityCache()
+    cache.set(ORI2, ORI1, 8, 70, 'below', {'similarity_bounds': [10, 20]})
+
+    cache.get(ORI2, ORI1, 8, 70, 'below')['similarity_bounds'].append(30)
+
+    assert cache.get(ORI2, ORI1, 8, 70, 'below') == {'similarity_bounds': [10, 20]}
+
+
+@pytest.mark.parametrize('key', [
+    ('c' * 64, ORI1, 8, 70, 'below'),
+    (ORI2, 'c' * 64, 8, 70, 'below'),
+    (ORI2, ORI1, 16, 70, 'below'),
+    (ORI2, ORI1, 8, 50, 'below'),
+    (ORI2, ORI1, 8, 70, 'decided'),
+])
+def test_miss_on_any_other_key(table, key):
+    cache = CompatibilityCache()
+    cache.set(ORI2, ORI1, 8, 70, 'below', {'similarity_percentage': 95.5})
+
+    assert cache.get(*key) is None
+    assert CompatibilityCache().get(*key) is None
+
+
+def test_lru_drops_the_oldest_entry(table):
+    cache = CompatibilityCache(max_size=1)
+    cache.set(ORI2, ORI1, 8, 70, 'below', {'similarity_percentage': 1})
+    cache.set(ORI2, ORI1, 16, 70, 'below', {'similarity_percentage': 2})
+    table.rows.clear()
+
+    assert cache.get(ORI2, ORI1, 8, 70, 'below') is None
+    assert cache.get(ORI2, ORI1, 16, 70, 'below') == {'similarity_percentage': 2}
+
+
+class CountingStorage:
+    def __init__(self, files):
+        self.files = files
+        self.reads = 0
+
+    def get_file_view(self, solution_id, file_type, file_key=None):
+        self.reads += 1
+        return 'file.bin', self.files[file_type]
+
+
+def test_check_similarity_is_cached_per_threshold(table, monkeypatch):
+    rng = np.random.default_rng(0)
+    ori1 = rng.integers(0, 256, 4 * 1024 * 1024, dtype=np.uint8)
+    ori2 = ori1.copy()
+    # 60% similar: decided early against 70, exact against 50
+    ori2[:len(ori2) * 2 // 5] ^= 1
+    storage = CountingStorage({'ori1': ori1.tobytes(), 'ori2': ori2.tobytes()})
+    monkeypatch.setattr(jobs, 'compatibility_cache', CompatibilityCache())
+    monkeypatch.setattr(jobs, 'get_file_sha256', lambda solution_id, file_type: ORI1)
+    monkeypatch.setattr(jobs, 'index_ori1', lambda *args: None)
+    ori2_info = {'solution_id': 'temp_1', 'sha256': ORI2}
+
+    app = Flask(__name__)
+    app.config['COMPATIBILITY_MIN_SIMILARITY'] = 70
+    with app.app_context():
+        first = jobs.check_similarity(storage, 1, ori2_info, 8)
+        assert first['early_exit']
+        assert jobs.check_similarity(storage, 1, ori2_info, 8) == first
+        assert storage.reads == 2
+
+        # A lower threshold must not be answered with the truncated result
+        app.config['COMPATIBILITY_MIN_SIMILARITY'] = 50
+        second = jobs.check_similarity(storage, 1, ori2_info, 8)
+        assert storage.reads == 4
+        assert 'early_exit' not in second
+        assert second['compatibility_percentage'] == 60.0
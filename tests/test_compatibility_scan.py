@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+from flask import Flask
+
+from app.main import jobs
+from app.utils.diff_engine import PatchSet, PatchRegion, diff_arrays
+
+WORDS = 32768
+POINTS = 400
+
+
+class FakeStorage:
+    def __init__(self, ori2, solutions):
+        self.files = {('temp_1', 'ori2'): ori2.tobytes()}
+        self.differences = {}
+        for solution_id, (ori1, mod1) in solutions.items():
+            self.files[(solution_id, 'ori1')] = ori1.tobytes()
+            if mod1 is not None:
+                self.differences[solution_id] = PatchSet.from_diff(diff_arrays(ori1, mod1, 16))
+
+    def get_file_view(self, solution_id, file_type, file_key=None):
+        data = self.files.get((solution_id, file_type))
+        return ('file.bin', data) if data else (None, None)
+
+    def get_differences(self, solution_id):
+        patch = self.differences.get(solution_id)
+        return (patch, patch.total_differences) if patch else (None, 0)
+
+    def get_differences_info(self, solution_id):
+        patch = self.differences.get(solution_id)
+        return (patch.bit_size, patch.total_differences) if patch else (None, 0)
+
+    def open_differences(self, solution_id):
+        patch = self.differences.get(solution_id)
+        return (patch.bit_size, iter(patch.regions)) if patch else None
+
+
+class FakeDatabaseManager:
+    def get_solution_by_id(self, solution_id):
+        if solution_id == 98:
+            return None
+        return {field: solution_id if field == 'id' else '' for field in (
+            'id', 'vehicle_type', 'make', 'model', 'engine', 'year', 'ecu_type', 'hardware_number', 'software_number')}
+
+
+def make_solution(ori2, rng, masked_words, mismatched_points):
+    """ORI1 differing from ORI2 on ``masked_words`` words, and a MOD1 of it."""
+    order = rng.permutation(WORDS)
+    masked, unmasked = order[:masked_words], order[masked_words:]
+    ori1 = ori2.copy()
+    ori1[masked] ^= np.uint16(0x0101)
+    points = np.concatenate((masked[:mismatched_points], unmasked[:POINTS - mismatched_points]))
+    mod1 = ori1.copy()
+    mod1[points] ^= np.uint16(0x8000)
+    return ori1, mod1
+
+
+def baseline_differences_percentage(ori2, ori1, mod1):
+    # One apply-solution compatibility check per candidate, with the per-point loop
+    records = diff_arrays(ori1, mod1, 16).to_records()
+    matching = sum(1 for record in records if ori2[record['memory_address'] // 2] == record['ori1_value'])
+    return round(matching / len(records) * 100, 2)
+
+
+def baseline_similarity(ori2, ori1):
+    return round(int(np.count_nonzero(ori2 == ori1)) / len(ori2) * 100, 2)
+
+
+@pytest.fixture
+def scan(monkeypatch):
+    rng = np.random.default_rng(0)
+    ori2 = rng.integers(0, 1 << 16, WORDS, dtype=np.uint64).astype('<u2')
+    solutions = {
+        1: make_solution(ori2, rng, WORDS * 2 // 100, 10),
+        2: make_solution(ori2, rng, WORDS * 10 // 100, 0),
+        3: make_solution(ori2, rng, WORDS * 20 // 100, 40),
+        4: make_solution(ori2, rng, WORDS // 100, 100),
+        99: (ori2.copy(), None),
+    }
+    monkeypatch.setattr(jobs, 'get_file_storage', lambda: FakeStorage(ori2, solutions))
+    monkeypatch.setattr(jobs, 'DatabaseManager', FakeDatabaseManager)
+
+    app = Flask(__name__)
+    app.config.update(COMPATIBILITY_SCAN_TOP_K=2, COMPATIBILITY_SCAN_WORKERS=2)
+    with app.app_context():
+        result = jobs.run_compatibility_scan({
+            'solution_ids': [4, 98, 3, 1, 99, 2],
+            'ori2': {'solution_id': 'temp_1', 'filename': 'ori2.bin'}
+        })
+    return ori2, solutions, result
+
+
+def test_scan_ranks_like_one_check_per_candidate(scan):
+    ori2, solutions, result = scan
+    ranking = result['ranking']
+
+    # Top 2 by stored differences, re-ranked by full similarity; the rest by differences; failures last
+    assert [entry['solution_id'] for entry in ranking] == [1, 2, 3, 4, 98, 99]
+    assert result['top_k'] == 2
+    assert result['ori2_filename'] == 'ori2.bin'
+
+    for entry in ranking[:4]:
+        ori1, mod1 = solutions[entry['solution_id']]
+        assert entry['error'] is None
+        assert entry['differences_percentage'] == baseline_differences_percentage(ori2, ori1, mod1)
+    for entry in ranking[:2]:
+        ori1, _ = solutions[entry['solution_id']]
+        assert entry['similarity_percentage'] == baseline_similarity(ori2, ori1)
+    assert all(entry['similarity_percentage'] is None for entry in ranking[2:])
+
+
+def test_scan_reports_failed_candidates(scan):
+    _, _, result = scan
+    errors = {entry['solution_id']: entry['error'] for entry in result['ranking']}
+
+    assert errors[98] == 'Solution not found'
+    assert errors[99] == 'No differences stored'
+
+
+def test_sample_spreads_over_the_whole_stream():
+    # 10 points of 16 bits in three regions
+    regions = [PatchRegion(0, bytes(8), bytes(range(8))), PatchRegion(100, bytes(4), bytes(range(4))),
+               PatchRegion(200, bytes(8), bytes(range(8)))]
+
+    sample, sampled = jobs._read_sample(iter(regions), 16, 10, 4)
+
+    assert sampled
+    assert [region.offset for region in sample] == [0, 4, 102, 202]
+    assert all(region.length == 2 for region in sample)
+    assert jobs._read_sample(iter(regions), 16, 10, 10) == (regions, False)
+
+
+def test_scan_sample_sees_mismatches_at_the_end(monkeypatch):
+    rng = np.random.default_rng(1)
+    ori2 = rng.integers(0, 1 << 16, WORDS, dtype=np.uint64).astype('<u2')
+    ori1 = ori2.copy()
+    points = np.arange(0, WORDS, WORDS // POINTS)[:POINTS]
+    # Only the last half of the difference points disagree with ORI2
+    ori1[points[POINTS // 2:]] ^= np.uint16(0x0101)
+    mod1 = ori1.copy()
+    mod1[points] ^= np.uint16(0x8000)
+    monkeypatch.setattr(jobs, 'get_file_storage', lambda: FakeStorage(ori2, {1: (ori1, mod1)}))
+    monkeypatch.setattr(jobs, 'DatabaseManager', FakeDatabaseManager)
+
+    app = Flask(__name__)
+    app.config.update(COMPATIBILITY_SCAN_TOP_K=0, COMPATIBILITY_SCAN_MAX_POINTS=40)
+    with app.app_context():
+        result = jobs.run_compatibility_scan({'solution_ids': [1], 'ori2': {'solution_id': 'temp_1'}})
+
+    entry = result['ranking'][0]
+    assert entry['sampled']
+    assert entry['checked_points'] == 40
+    assert entry['differences_percentage'] == 50.0
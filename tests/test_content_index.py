@@ -0,0 +1,167 @@
+import contextlib
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.utils import content_index
+from app.utils.content_index import INDEX_BLOCK_SIZE, block_hashes, find_candidates, index_blob, is_indexed
+
+
+class FakeIndexDB:
+    """In-memory stand-in for the blob_signatures/blob_block_hashes/file_metadata tables."""
+
+    def __init__(self):
+        self.signatures = {}
+        self.block_hashes = set()
+        self.ori1 = {}
+
+    @contextlib.contextmanager
+    def pooled_connection(self):
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def close(self):
+        pass
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def execute(self, sql, params=()):
+        db = self.db
+        sql = ' '.join(sql.split())
+        self.rows, self.rowcount = [], 0
+        if sql.startswith('SELECT 1 FROM blob_signatures'):
+            self.rows = [(1,)] if params[0] in db.signatures else []
+        elif sql.startswith('INSERT INTO blob_signatures'):
+            sha256, _, block_count = params
+            if sha256 not in db.signatures:
+                db.signatures[sha256] = block_count
+                self.rowcount = 1
+        elif sql.startswith('SELECT solution_id FROM file_metadata'):
+            self.rows = [(solution_id,) for solution_id, sha256 in db.ori1.items() if sha256 == params[0]]
+        elif sql.startswith('SELECT fm.solution_id, matched.shared, bs.block_count'):
+            hashes, min_shared = set(params[0]), params[1]
+            for solution_id, sha256 in db.ori1.items():
+                shared = sum(1 for block_hash, owner in db.block_hashes if owner == sha256 and block_hash in hashes)
+                if shared and shared >= min_shared:
+                    self.rows.append((solution_id, shared, db.signatures[sha256]))
+        else:
+            raise AssertionError(f'Unexpected SQL: {sql}')
+
+
+def fake_execute_values(cur, sql, rows, page_size=100):
+    assert ' '.join(sql.split()).startswith('INSERT INTO blob_block_hashes')
+    cur.db.block_hashes.update(rows)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeIndexDB()
+    monkeypatch.setattr(content_index, 'pooled_connection', db.pooled_connection)
+    monkeypatch.setattr(content_index, 'execute_values', fake_execute_values)
+    return db
+
+
+def reference_blocks(data):
+    """Distinct hashes of the non-uniform aligned blocks, one block at a time."""
+    blocks = set()
+    for start in range(0, len(data), INDEX_BLOCK_SIZE):
+        block = data[start:start + INDEX_BLOCK_SIZE]
+        if len(set(block)) > 1:
+            blocks.add(int.from_bytes(hashlib.blake2b(block, digest_size=8).digest(), 'little', signed=True))
+    return blocks
+
+
+def make_image(size=64 * INDEX_BLOCK_SIZE + 100, seed=0):
+    image = np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8)
+    # Erased flash: uniform blocks that must not be indexed
+    image[8 * INDEX_BLOCK_SIZE:12 * INDEX_BLOCK_SIZE] = 0xFF
+    return image
+
+
+def revision(image, changed_blocks):
+    image = image.copy()
+    for block in changed_blocks:
+        image[block * INDEX_BLOCK_SIZE + 7] ^= 0x01
+    return image
+
+
+def test_block_hashes_match_per_block_reference():
+    image = make_image()
+
+    hashes = block_hashes(image.tobytes())
+
+    assert hashes.dtype == np.int64
+    assert np.all(np.diff(hashes) > 0)
+    assert set(hashes.tolist()) == reference_blocks(image.tobytes())
+    # 64 full blocks minus 4 erased ones, plus the partial tail
+    assert len(hashes) == 61
+
+
+def test_block_hashes_of_uniform_or_empty_data():
+    assert len(block_hashes(b'')) == 0
+    assert len(block_hashes(b'\xff' * (3 * INDEX_BLOCK_SIZE + 5))) == 0
+
+
+def test_changed_block_changes_one_hash():
+    image = make_image()
+    before = set(block_hashes(image.tobytes()).tolist())
+    after = set(block_hashes(revision(image, [3]).tobytes()).tolist())
+
+    assert len(before - after) == len(after - before) == 1
+
+
+def test_find_candidates_ranks_by_block_similarity(db):
+    ori2 = make_image()
+    ori1s = {
+        1: revision(ori2, range(0, 4)),
+        2: revision(ori2, range(0, 20)),
+        3: revision(ori2, range(0, 50)),
+        4: ori2.copy(),
+    }
+    for solution_id, ori1 in ori1s.items():
+        sha256 = hashlib.sha256(ori1.tobytes()).hexdigest()
+        db.ori1[solution_id] = sha256
+        assert index_blob(sha256, ori1.tobytes())
+        assert is_indexed(sha256)
+
+    ori2_sha256 = hashlib.sha256(ori2.tobytes()).hexdigest()
+    candidates = find_candidates(ori2.tobytes(), ori2_sha256)
+
+    ori2_blocks = reference_blocks(ori2.tobytes())
+    expected = {}
+    for solution_id, ori1 in ori1s.items():
+        blocks = reference_blocks(ori1.tobytes())
+        expected[solution_id] = round(len(ori2_blocks & blocks) / len(ori2_blocks | blocks), 4)
+
+    assert candidates[0] == {'solution_id': 4, 'score': 1.0, 'exact': True}
+    assert [candidate['solution_id'] for candidate in candidates] == [4, 1, 2]
+    for candidate in candidates[1:]:
+        assert not candidate['exact']
+        assert candidate['score'] == expected[candidate['solution_id']]
+    # Solution 3 shares too few blocks to reach the minimum score
+    assert expected[3] < content_index.MIN_CANDIDATE_SCORE
+    assert find_candidates(ori2.tobytes(), ori2_sha256, limit=2, min_score=0.1) == candidates[:2]
+
+
+def test_index_blob_is_idempotent(db):
+    image = make_image().tobytes()
+
+    assert index_blob('aa', image)
+    assert index_blob('aa', image)
+
+    assert db.signatures['aa'] == len(reference_blocks(image))
+    assert len(db.block_hashes) == len(reference_blocks(image))
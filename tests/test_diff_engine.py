@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler
+from app.utils.diff_engine import DiffResult, diff_arrays, as_arrays
+
+
+def baseline_compare(data1, data2, bit_size):
+    # The per-word loop compare_files used before the diff engine
+    width = bit_size // 8
+    return [(i * width, data1[i], data2[i])
+            for i in range(min(len(data1), len(data2))) if data1[i] != data2[i]]
+
+
+def make_files(tmp_path, size1, size2, seed=0):
+    rng = np.random.default_rng(seed)
+    raw1 = rng.integers(0, 256, max(size1, size2), dtype=np.uint8)
+    raw2 = raw1.copy()
+    changed = rng.choice(len(raw2), len(raw2) // 20, replace=False)
+    raw2[changed] ^= 0x5A
+    path1, path2 = tmp_path / 'ori1.bin', tmp_path / 'mod1.bin'
+    path1.write_bytes(raw1[:size1].tobytes())
+    path2.write_bytes(raw2[:size2].tobytes())
+    return path1, path2
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+@pytest.mark.parametrize('sizes', [(8192, 8192), (8192, 6001), (4099, 8192)])
+def test_compare_files_matches_baseline_loop(tmp_path, bit_size, sizes):
+    path1, path2 = make_files(tmp_path, *sizes, seed=bit_size)
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+
+    differences = handler.compare_files(path1, path2)
+
+    expected = baseline_compare(handler.read_file(path1).tolist(), handler.read_file(path2).tolist(), bit_size)
+    assert isinstance(differences, DiffResult)
+    assert differences.bit_size == bit_size
+    assert list(differences) == expected
+    assert differences[:3] == expected[:3]
+    assert differences[-1] == expected[-1]
+    assert differences.to_list() == [list(difference) for difference in expected]
+
+
+def test_identical_files_have_no_differences(tmp_path):
+    path1, _ = make_files(tmp_path, 4096, 4096)
+    handler = BinaryHandler()
+
+    assert len(handler.compare_files(path1, path1)) == 0
+
+
+def test_to_records_uses_storage_keys():
+    differences = diff_arrays(np.array([1, 2, 3], dtype='<u2'), np.array([1, 9, 3], dtype='<u2'), 16)
+
+    assert differences.to_records() == [{'memory_address': 2, 'ori1_value': 2, 'mod1_value': 9, 'bit_size': 16}]
+
+
+def test_as_arrays_accepts_tuples_and_empty_input():
+    offsets, old_values, new_values = as_arrays([(0, 1, 2), (4, 3, 4)])
+    assert offsets.tolist() == [0, 4]
+    assert old_values.tolist() == [1, 3]
+    assert new_values.tolist() == [2, 4]
+
+    assert all(len(array) == 0 for array in as_arrays([]))
@@ -0,0 +1,235 @@
+import io
+import json
+import zlib
+
+import numpy as np
+import pytest
+
+from app.utils import diff_engine
+from app.utils.diff_engine import (FORMAT_HEADER, FORMAT_MAGIC, FORMAT_VERSION, COMPRESSION_NONE, COMPRESSION_ZLIB,
+                                   DTYPE_MAP, PatchSet, PatchRegion, diff_arrays, diff_arrays_chunked,
+                                   iter_differences, iter_regions, load_differences, read_regions, write_regions,
+                                   apply_regions)
+
+
+def make_patch(bit_size, size=200000, seed=0):
+    rng = np.random.default_rng(seed)
+    original = rng.integers(0, 256, size, dtype=np.uint8)
+    modified = original.copy()
+    modified[rng.choice(size, 3000, replace=False)] ^= 0x0F
+    modified[5000:9000] = 0xFF
+    dtype = DTYPE_MAP[bit_size]
+    data1, data2 = original.view(dtype), modified.view(dtype)
+    return data1, data2, PatchSet.from_diff(diff_arrays(data1, data2, bit_size))
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+@pytest.mark.parametrize('compress', [True, False])
+def test_binary_round_trip(bit_size, compress):
+    _, _, patch = make_patch(bit_size)
+
+    raw = patch.to_bytes(compress)
+
+    magic, version, header_bit_size, compression, _ = FORMAT_HEADER.unpack_from(raw)
+    assert (magic, version, header_bit_size) == (FORMAT_MAGIC, FORMAT_VERSION, bit_size)
+    assert compression == (COMPRESSION_ZLIB if compress else COMPRESSION_NONE)
+    loaded = load_differences(raw)
+    assert loaded.bit_size == bit_size
+    assert loaded.regions == patch.regions
+
+
+def test_binary_format_is_smaller_than_json():
+    _, _, patch = make_patch(16)
+
+    assert len(patch.to_bytes()) < len(json.dumps(patch.to_document())) / 2
+
+
+@pytest.mark.parametrize('bit_size', [8, 16])
+def test_load_differences_reads_json_documents(bit_size):
+    _, _, patch = make_patch(bit_size)
+    documents = [
+        patch.to_document(),
+        # Legacy per-word document
+        {'differences': patch.to_diff().to_records()},
+    ]
+
+    for document in documents:
+        loaded = load_differences(json.dumps(document).encode('utf-8'))
+        assert loaded.bit_size == bit_size
+        assert loaded.regions == patch.regions
+
+
+@pytest.mark.parametrize('raw', [
+    FORMAT_HEADER.pack(FORMAT_MAGIC, 2, 8, 7, 0),
+    FORMAT_MAGIC + b'\x02',
+])
+def test_read_regions_closes_source_on_invalid_header(raw):
+    source = io.BytesIO(raw)
+
+    with pytest.raises(ValueError):
+        read_regions(source, close=True)
+
+    assert source.closed
+
+
+def test_empty_patch_round_trip():
+    loaded = load_differences(PatchSet([], 16).to_bytes())
+    assert (loaded.bit_size, loaded.regions) == (16, [])
+
+
+def test_unknown_header_raises_value_error():
+    raw = PatchSet([], 8).to_bytes()
+    with pytest.raises(ValueError):
+        PatchSet.from_bytes(b'XXXX' + raw[4:])
+    with pytest.raises(ValueError):
+        PatchSet.from_bytes(FORMAT_HEADER.pack(FORMAT_MAGIC, 9, 8, COMPRESSION_NONE, 0))
+
+
+def encode_v1(patch, compress=True):
+    """Version 1 layout: offsets, lengths, then all originals and all modifieds."""
+    payload = b''.join([
+        np.array([region.offset for region in patch.regions], dtype='<u8').tobytes(),
+        np.array([region.length for region in patch.regions], dtype='<u4').tobytes(),
+        b''.join(region.original for region in patch.regions),
+        b''.join(region.modified for region in patch.regions),
+    ])
+    compression = COMPRESSION_ZLIB if compress else COMPRESSION_NONE
+    header = FORMAT_HEADER.pack(FORMAT_MAGIC, 1, patch.bit_size, compression, len(patch.regions))
+    return header + (zlib.compress(payload) if compress else payload)
+
+
+def write_v2(regions, bit_size, compress=True):
+    buffer = io.BytesIO()
+    count, total = write_regions(buffer, regions, bit_size, compress)
+    return buffer.getvalue(), count, total
+
+
+def read_all(raw):
+    bit_size, regions = read_regions(io.BytesIO(raw))
+    return bit_size, list(regions)
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+@pytest.mark.parametrize('compress', [True, False])
+def test_v2_round_trip(bit_size, compress):
+    _, _, patch = make_patch(bit_size)
+
+    raw, count, total = write_v2(patch.regions, bit_size, compress)
+
+    assert FORMAT_HEADER.unpack_from(raw)[1] == 2
+    assert (count, total) == (len(patch.regions), patch.total_differences)
+    assert read_all(raw) == (bit_size, patch.regions)
+    assert PatchSet.from_bytes(raw).regions == patch.regions
+    assert load_differences(raw).regions == patch.regions
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+@pytest.mark.parametrize('compress', [True, False])
+def test_v1_converts_to_v2(bit_size, compress):
+    _, _, patch = make_patch(bit_size)
+
+    bit_size_read, regions = read_all(encode_v1(patch, compress))
+    assert (bit_size_read, regions) == (bit_size, patch.regions)
+
+    raw, _, _ = write_v2(regions, bit_size_read)
+    assert read_all(raw) == (bit_size, patch.regions)
+
+
+@pytest.mark.parametrize('bit_size', [8, 16])
+def test_json_documents_convert_to_v2(bit_size):
+    _, _, patch = make_patch(bit_size)
+    documents = [
+        patch.to_document(),
+        # Legacy per-word document
+        {'differences': patch.to_diff().to_records()},
+    ]
+
+    for document in documents:
+        bit_size_read, regions = read_all(json.dumps(document).encode('utf-8'))
+        assert bit_size_read == bit_size
+        raw, _, total = write_v2(regions, bit_size_read)
+        assert total == patch.total_differences
+        assert PatchSet.from_bytes(raw).to_diff().to_records() == patch.to_diff().to_records()
+
+
+def test_v2_converts_to_json():
+    _, _, patch = make_patch(16)
+    raw, _, _ = write_v2(patch.regions, 16)
+
+    bit_size, regions = read_all(raw)
+    document = json.loads(json.dumps(PatchSet(regions, bit_size).to_document()))
+
+    assert PatchSet.from_document(document).regions == patch.regions
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_streamed_regions_apply_like_the_whole_patch(bit_size, monkeypatch):
+    data1, data2, patch = make_patch(bit_size)
+    # Small reads exercise record boundaries across decompression steps
+    monkeypatch.setattr(diff_engine, 'STREAM_READ_SIZE', 61)
+
+    raw, _, total = write_v2(iter_regions(iter_differences(data1, data2, bit_size, chunk_bytes=4096)), bit_size)
+    _, regions = read_regions(io.BytesIO(raw))
+
+    assert total == patch.total_differences
+    np.testing.assert_array_equal(apply_regions(data1.copy(), regions), data2)
+    np.testing.assert_array_equal(patch.apply(data1.copy()), data2)
+
+
+def test_read_regions_closes_source_when_exhausted():
+    _, _, patch = make_patch(8, size=10000)
+    raw, _, _ = write_v2(patch.regions, 8)
+    source = io.BytesIO(raw)
+
+    _, regions = read_regions(source, close=True)
+    list(regions)
+
+    assert source.closed
+
+
+def test_empty_stream_round_trip():
+    raw, count, total = write_v2([], 16)
+    assert (count, total) == (0, 0)
+    assert read_all(raw) == (16, [])
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda raw: raw[:len(raw) // 2],
+    lambda raw: raw[:7],
+    lambda raw: raw[:FORMAT_HEADER.size] + b'\x00' * 64,
+    lambda raw: raw[:40] + bytes([raw[40] ^ 0xFF]) + raw[41:],
+])
+def test_corrupt_data_raises_value_error(corrupt):
+    _, _, patch = make_patch(8)
+    raw, _, _ = write_v2(patch.regions, 8)
+
+    with pytest.raises(ValueError):
+        read_all(corrupt(raw))
+
+
+def test_unsupported_version_raises_value_error():
+    raw = FORMAT_HEADER.pack(FORMAT_MAGIC, 9, 8, COMPRESSION_NONE, 0)
+    with pytest.raises(ValueError):
+        load_differences(raw)
+    with pytest.raises(ValueError):
+        read_all(raw)
+
+
+def test_regions_beyond_the_data_are_skipped():
+    data = np.zeros(8, dtype=np.uint8)
+    regions = [PatchRegion(6, b'\x00\x00\x00\x00', b'\x01\x02\x03\x04'), PatchRegion(20, b'\x00', b'\x05')]
+
+    apply_regions(data, regions)
+
+    assert data.tolist() == [0, 0, 0, 0, 0, 0, 1, 2]
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_iter_differences_matches_chunked_diff(bit_size):
+    data1, data2, patch = make_patch(bit_size)
+
+    parts = list(iter_differences(data1, data2, bit_size, chunk_bytes=4096))
+
+    expected = diff_arrays_chunked(data1, data2, bit_size, chunk_bytes=4096)
+    assert sum(len(part) for part in parts) == len(expected) == patch.total_differences
+    np.testing.assert_array_equal(np.concatenate([part.offsets for part in parts]), expected.offsets)
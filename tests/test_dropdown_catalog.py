@@ -0,0 +1,78 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app.database.dropdown_catalog import DEFAULT_CATALOG_PATH, DropdownCatalog
+
+CASCADE = ['vehicle_type', 'make', 'model', 'engine', 'ecu_type']
+
+
+def baseline_field_values(df, field_name, filters=None):
+    # DatabaseManager.get_field_values before the catalog: filter the sheet on every call
+    if field_name not in df.columns:
+        return []
+    if field_name != 'vehicle_type' and filters:
+        for key, value in filters.items():
+            if key in df.columns and value:
+                df = df[df[key] == value]
+    return df[field_name].dropna().unique().tolist()
+
+
+@pytest.fixture(scope='module')
+def workbook():
+    df = pd.read_excel(DEFAULT_CATALOG_PATH)
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return DropdownCatalog(DEFAULT_CATALOG_PATH)
+
+
+def selections(df, depth, limit=15):
+    """Partial selections along the cascade, taken from real rows of the workbook."""
+    rows = df[CASCADE[:depth]].dropna().drop_duplicates().head(limit)
+    return [dict(zip(CASCADE[:depth], row)) for row in rows.itertuples(index=False)]
+
+
+@pytest.mark.parametrize('field_name', CASCADE + ['year', 'hardware_number'])
+def test_unfiltered_values_match_baseline(workbook, catalog, field_name):
+    assert catalog.get_field_values(field_name) == baseline_field_values(workbook, field_name)
+
+
+@pytest.mark.parametrize('depth', [1, 2, 3, 4])
+def test_cascade_filters_match_baseline(workbook, catalog, depth):
+    for selection in selections(workbook, depth):
+        for field_name in CASCADE[depth:] + ['year']:
+            expected = baseline_field_values(workbook, field_name, selection)
+            assert catalog.get_field_values(field_name, selection) == expected, (field_name, selection)
+
+
+def test_root_field_ignores_filters(workbook, catalog):
+    make = workbook['make'].dropna().iloc[0]
+    assert catalog.get_field_values('vehicle_type', {'make': make}) == \
+        baseline_field_values(workbook, 'vehicle_type', {'make': make})
+
+
+def test_unknown_fields_and_values(workbook, catalog):
+    assert catalog.get_field_values('no_such_field') == []
+    assert catalog.get_field_values('model', {'make': 'No such make'}) == []
+    # Empty and unknown filter keys are ignored, as before
+    assert catalog.get_field_values('make', {'model': '', 'no_such_field': 'x'}) == \
+        baseline_field_values(workbook, 'make', {'model': '', 'no_such_field': 'x'})
+
+
+def test_workbook_is_reloaded_when_it_changes(tmp_path):
+    path = str(tmp_path / 'Dropdowninfo.xlsx')
+    pd.DataFrame({'Vehicle_Type': ['CAR'], 'Make': ['Audi']}).to_excel(path, index=False)
+    catalog = DropdownCatalog(path)
+    assert catalog.get_field_values('make') == ['Audi']
+
+    pd.DataFrame({'Vehicle_Type': ['CAR', 'CAR'], 'Make': ['Audi', 'BMW']}).to_excel(path, index=False)
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+    assert catalog.get_field_values('make') == ['Audi', 'BMW']
+    assert catalog.get_field_values('make', {'vehicle_type': 'CAR'}) == ['Audi', 'BMW']
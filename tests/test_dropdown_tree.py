@@ -0,0 +1,96 @@
+import pandas as pd
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+
+from app.database import dropdown_catalog
+from app.database.dropdown_catalog import CASCADE_FIELDS, DEFAULT_CATALOG_PATH, DropdownCatalog
+
+
+def baseline_field_values(df, field_name, filters):
+    # One /api/dropdown-values request per level, as main.js did before the tree
+    for key, value in filters.items():
+        df = df[df[key] == value]
+    return df[field_name].dropna().unique().tolist()
+
+
+@pytest.fixture(scope='module')
+def workbook():
+    df = pd.read_excel(DEFAULT_CATALOG_PATH)
+    df.columns = [c.strip().lower() for c in df.columns]
+    return df
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    return DropdownCatalog(DEFAULT_CATALOG_PATH)
+
+
+def assert_tree_matches(df, tree, fields, path):
+    expected = baseline_field_values(df, fields[0], path)
+    if len(fields) == 1:
+        assert tree == expected, path
+        return
+    assert [value for value, _ in tree] == expected, path
+    for value, children in tree:
+        assert_tree_matches(df, children, fields[1:], dict(path, **{fields[0]: value}))
+
+
+def test_full_tree_matches_per_level_requests(workbook, catalog):
+    fields = ('vehicle_type', 'make', 'model')
+    tree, etag = catalog.get_tree(fields)
+
+    assert etag
+    assert_tree_matches(workbook, tree, fields, {})
+
+
+def test_tree_is_pruned_to_the_selection(workbook, catalog):
+    row = workbook[list(CASCADE_FIELDS)].dropna().iloc[0]
+    selection = {'vehicle_type': row['vehicle_type'], 'make': row['make']}
+
+    tree, _ = catalog.get_tree(CASCADE_FIELDS, selection)
+
+    assert [value for value, _ in tree] == [row['vehicle_type']]
+    (_, makes), = tree
+    assert [value for value, _ in makes] == [row['make']]
+    assert_tree_matches(workbook, makes[0][1], CASCADE_FIELDS[2:], selection)
+
+
+def test_etag_follows_selection_and_unknown_fields(catalog):
+    assert catalog.get_tree_etag() == catalog.get_tree()[1]
+    assert catalog.get_tree_etag(selection={'vehicle_type': 'CAR'}) != catalog.get_tree_etag()
+    assert catalog.get_tree_etag(['make', 'no_such_field']) is None
+    assert catalog.get_tree(['no_such_field']) is None
+
+
+@pytest.fixture
+def client(monkeypatch, catalog):
+    from app.main import bp
+    monkeypatch.setattr(dropdown_catalog, '_catalog', catalog)
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='test', LOGIN_DISABLED=True)
+    LoginManager(app)
+    app.register_blueprint(bp)
+    return app.test_client()
+
+
+def test_dropdown_tree_endpoint_revalidates_with_etag(client, catalog):
+    response = client.get('/api/dropdown-tree?fields=vehicle_type,make&vehicle_type=CAR')
+
+    assert response.status_code == 200
+    assert response.get_json()['tree'] == catalog.get_tree(['vehicle_type', 'make'], {'vehicle_type': 'CAR'})[0]
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    etag = response.headers['ETag']
+
+    cached = client.get('/api/dropdown-tree?fields=vehicle_type,make&vehicle_type=CAR',
+                        headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert cached.headers['Cache-Control'] == 'private, no-cache'
+
+    other = client.get('/api/dropdown-tree?fields=vehicle_type,make', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+
+
+def test_dropdown_tree_endpoint_rejects_unknown_fields(client):
+    assert client.get('/api/dropdown-tree?fields=no_such_field').status_code == 400
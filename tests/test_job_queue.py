@@ -0,0 +1,109 @@
+import contextlib
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from app.utils import job_queue
+from app.utils.job_queue import (JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED, JOB_FAILED, STALE_JOB_ERROR,
+                                 JobError, init_job_queue)
+
+
+class FakeJobsTable:
+    """In-memory stand-in for the jobs table."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def add(self, job_id, status, age, started=True):
+        created_at = datetime.now() - timedelta(seconds=age)
+        self.jobs[job_id] = {'status': status, 'error': None, 'result': None, 'created_at': created_at,
+                             'started_at': created_at if started else None, 'finished_at': None}
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.rows = []
+
+    def execute(self, sql, params):
+        jobs = self.table.jobs
+        sql = ' '.join(sql.split())
+        now = datetime.now()
+        self.rows = []
+        if sql.startswith('INSERT INTO jobs'):
+            job_id, _, status, _, _ = params
+            self.table.add(job_id, status, 0, started=False)
+        elif sql.startswith('UPDATE jobs SET status = %s, started_at'):
+            jobs[params[1]].update(status=params[0], started_at=now)
+        elif sql.startswith('UPDATE jobs SET status = %s, result = %s'):
+            status, result, error, job_id = params
+            jobs[job_id].update(status=status, result=result and result.adapted, error=error, finished_at=now)
+        elif sql.startswith('UPDATE jobs SET status = %s, error = %s') and 'RETURNING id' in sql:
+            status, error, queued, running, max_age = params
+            for job_id, job in jobs.items():
+                since = job['started_at'] or job['created_at']
+                if job['status'] in (queued, running) and since < now - timedelta(seconds=max_age):
+                    job.update(status=status, error=error, finished_at=now)
+                    self.rows.append((job_id,))
+        else:
+            raise AssertionError(f"Unexpected SQL: {sql}")
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeJobsTable()
+    monkeypatch.setattr(job_queue, 'pooled_connection', table.connection)
+    return table
+
+
+def test_startup_fails_jobs_left_by_a_dead_worker(table):
+    table.add('lost-running', JOB_RUNNING, 7200)
+    table.add('lost-queued', JOB_QUEUED, 7200, started=False)
+    table.add('live-running', JOB_RUNNING, 60)
+    table.add('done', JOB_SUCCEEDED, 7200)
+
+    app = Flask(__name__)
+    app.config['JOB_STALE_AFTER'] = 3600
+    init_job_queue(app).shutdown()
+
+    assert table.jobs['lost-running']['status'] == JOB_FAILED
+    assert table.jobs['lost-running']['error'] == STALE_JOB_ERROR
+    assert table.jobs['lost-queued']['status'] == JOB_FAILED
+    assert table.jobs['live-running']['status'] == JOB_RUNNING
+    assert table.jobs['done']['status'] == JOB_SUCCEEDED
+    assert table.jobs['done']['error'] is None
+
+
+def echo(params):
+    if params.get('fail'):
+        raise JobError('Bad input')
+    return {'echo': params['value']}
+
+
+def test_jobs_report_results_and_user_errors(table, monkeypatch):
+    monkeypatch.setitem(job_queue._handlers, 'test_echo', echo)
+
+    app = Flask(__name__)
+    queue = init_job_queue(app)
+    succeeded = queue.submit('test_echo', {'value': 1})
+    failed = queue.submit('test_echo', {'fail': True})
+    queue.shutdown()
+
+    assert table.jobs[succeeded]['status'] == JOB_SUCCEEDED
+    assert table.jobs[succeeded]['result'] == {'echo': 1}
+    assert (table.jobs[failed]['status'], table.jobs[failed]['error']) == (JOB_FAILED, 'Bad input')
+    assert queue.submit('test_unknown', {}) is None
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler
+from app.utils.diff_engine import DTYPE_MAP, PatchRegion, PatchSet, diff_arrays
+
+
+def baseline_write_mod2(original, differences, bit_size):
+    # The per-difference loop write_mod2 applied before patch regions
+    width = bit_size // 8
+    modified = list(original)
+    for offset, _, new_value in differences:
+        index = offset // width
+        if index < len(modified):
+            modified[index] = new_value
+    return modified
+
+
+def make_pair(bit_size, words=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    dtype = DTYPE_MAP[bit_size]
+    data1 = rng.integers(0, 1 << bit_size, words, dtype=np.uint64).astype(dtype)
+    data2 = data1.copy()
+    # Clustered changes (maps) plus isolated single-word edits
+    for start in rng.choice(words - 64, 20, replace=False):
+        data2[start:start + rng.integers(1, 64)] ^= dtype.type(1)
+    data2[rng.choice(words, 50, replace=False)] ^= dtype.type(3)
+    return data1, data2
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_regions_cover_every_difference(bit_size):
+    data1, data2 = make_pair(bit_size, seed=bit_size)
+    differences = diff_arrays(data1, data2, bit_size)
+
+    patch = PatchSet.from_diff(differences)
+
+    assert patch.total_differences == len(differences)
+    assert list(patch.to_diff()) == list(differences)
+    width = bit_size // 8
+    for previous, region in zip(patch.regions, patch.regions[1:]):
+        # Runs are maximal: adjacent differing words always share a region
+        assert region.offset > previous.offset + previous.length
+        assert region.length % width == 0
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_write_mod2_matches_baseline_loop(tmp_path, bit_size):
+    data1, data2 = make_pair(bit_size, seed=bit_size + 1)
+    differences = diff_arrays(data1, data2, bit_size)
+    ori2 = data1.copy()
+    ori2[::7] ^= DTYPE_MAP[bit_size].type(0x11)
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+    expected = baseline_write_mod2(ori2.tolist(), list(differences), bit_size)
+
+    assert handler.write_mod2(ori2, PatchSet.from_diff(differences), tmp_path / 'regions.bin')
+    assert handler.write_mod2(ori2, differences, tmp_path / 'words.bin')
+
+    assert handler.read_file(tmp_path / 'regions.bin').tolist() == expected
+    assert handler.read_file(tmp_path / 'words.bin').tolist() == expected
+
+
+def test_apply_skips_regions_beyond_the_data():
+    patch = PatchSet([PatchRegion(2, b'\x00\x00\x00\x00', b'\x01\x02\x03\x04'),
+                      PatchRegion(10, b'\x00', b'\xff')], 8)
+
+    assert patch.apply(np.zeros(4, dtype=np.uint8)).tolist() == [0, 0, 1, 2]
+
+
+def test_legacy_records_convert_to_regions():
+    records = [
+        {'memory_address': 4, 'ori1_value': 1, 'mod1_value': 2, 'bit_size': 16},
+        {'memory_address': 0, 'ori1_value': 3, 'mod1_value': 4, 'bit_size': 16},
+        {'memory_address': 2, 'ori1_value': 5, 'mod1_value': 6, 'bit_size': 16},
+    ]
+
+    patch = PatchSet.from_records(records)
+
+    assert patch.bit_size == 16
+    assert patch.regions == [PatchRegion(0, b'\x03\x00\x05\x00\x01\x00', b'\x04\x00\x06\x00\x02\x00')]
+    assert PatchSet.from_document({'differences': records}).regions == patch.regions
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_document_round_trip(bit_size):
+    data1, data2 = make_pair(bit_size)
+    patch = PatchSet.from_diff(diff_arrays(data1, data2, bit_size))
+
+    document = patch.to_document()
+    loaded = PatchSet.from_document(document)
+
+    assert document['total_differences'] == patch.total_differences
+    assert loaded.bit_size == bit_size
+    assert loaded.regions == patch.regions
@@ -0,0 +1,100 @@
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+from app.utils import process_pool
+from app.utils.binary_handler import BinaryHandler, CHUNKED_MIN_BYTES
+from app.utils.process_pool import POOL_MIN_BYTES, BinaryProcessPool, _run_operation, _share
+
+
+@pytest.fixture(scope='module')
+def pool():
+    pool = BinaryProcessPool(max_workers=1, max_task_bytes=CHUNKED_MIN_BYTES)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.fixture
+def pooled(monkeypatch, pool):
+    monkeypatch.setattr(process_pool, '_pool', pool)
+    return pool
+
+
+def make_pair(bit_size, seed=0):
+    # Above POOL_MIN_BYTES, below the in-process chunked path
+    words = POOL_MIN_BYTES // (bit_size // 8)
+    rng = np.random.default_rng(seed)
+    raw1 = rng.integers(0, 256, words * (bit_size // 8), dtype=np.uint8)
+    raw2 = raw1.copy()
+    raw2[rng.choice(len(raw2), len(raw2) // 10, replace=False)] ^= 0x33
+    handler = BinaryHandler()
+    return handler.parse_bytes(raw1.tobytes(), bit_size), handler.parse_bytes(raw2.tobytes(), bit_size)
+
+
+def make_handler(bit_size):
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+    return handler
+
+
+@pytest.mark.parametrize('bit_size', [8, 16, 32])
+def test_pooled_diff_matches_inline(monkeypatch, pool, bit_size):
+    data1, data2 = make_pair(bit_size, seed=bit_size)
+    handler = make_handler(bit_size)
+    inline = handler.diff_data(data1, data2)
+
+    monkeypatch.setattr(process_pool, '_pool', pool)
+    assert pool.accepts((data1, data2))
+    differences = handler.diff_data(data1, data2)
+
+    assert differences.bit_size == bit_size
+    np.testing.assert_array_equal(differences.offsets, inline.offsets)
+    np.testing.assert_array_equal(differences.old_values, inline.old_values)
+    np.testing.assert_array_equal(differences.new_values, inline.new_values)
+
+
+@pytest.mark.parametrize('threshold', [None, 50, 95])
+def test_pooled_similarity_matches_inline(monkeypatch, pool, threshold):
+    data1, data2 = make_pair(16)
+    handler = make_handler(16)
+    inline = handler.calculate_similarity(data1, data2, threshold=threshold)
+
+    monkeypatch.setattr(process_pool, '_pool', pool)
+    assert handler.calculate_similarity(data1, data2, threshold=threshold) == inline
+
+
+def test_pooled_errors_propagate(pooled):
+    data1, data2 = make_pair(8)
+
+    with pytest.raises(ValueError, match='not allowed'):
+        pooled.run('write_file', 8, data1, data2)
+    with pytest.raises(TypeError):
+        pooled.run('diff_data', 8, data1, data2, unknown_option=True)
+    # The pool is still usable afterwards
+    assert len(pooled.run('diff_data', 8, data1, data2)) == len(make_handler(8).diff_data(data1, data2))
+
+
+def test_failing_operation_leaves_no_view_on_shared_memory(monkeypatch):
+    views = []
+
+    def fail(self, file1_data, file2_data):
+        views.append(weakref.ref(file1_data))
+        raise RuntimeError('operation failed')
+
+    monkeypatch.setattr(BinaryHandler, 'diff_data', fail)
+    array = np.arange(1024, dtype=np.uint16)
+    blocks = [_share(array), _share(array)]
+    try:
+        specs = [(block.name, array.dtype.str, len(array)) for block in blocks]
+        with pytest.raises(RuntimeError, match='operation failed') as excinfo:
+            _run_operation('diff_data', 16, specs, {})
+        # The traceback is still alive here, but must not keep the mapped arrays
+        assert excinfo.tb is not None
+        gc.collect()
+        assert views and views[0]() is None
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
@@ -0,0 +1,86 @@
+import contextlib
+import io
+
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from flask import Flask
+
+from app.utils import s3_storage
+
+
+class FakeMetadataDB:
+    """file_metadata rows as {(solution_id, file_type): (file_name, s3_key)}."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    @contextlib.contextmanager
+    def pooled_connection(self):
+        yield self
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        assert 'FROM file_metadata' in sql
+        self.queries += 1
+        self.result = self.rows.get(tuple(params))
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def storage():
+    app = Flask(__name__)
+    app.config.update(AWS_S3_BUCKET='bucket', AWS_S3_REGION='us-east-1',
+                      AWS_ACCESS_KEY_ID='test', AWS_SECRET_ACCESS_KEY='test')
+    with app.app_context():
+        storage = s3_storage.S3FileStorage()
+    with Stubber(storage.s3_client) as stubber:
+        storage.stubber = stubber
+        yield storage
+        stubber.assert_no_pending_responses()
+    s3_storage._forget_file_keys(7)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeMetadataDB({(7, 'ori1'): ('new.bin', 'blobs/bb/bb')})
+    monkeypatch.setattr(s3_storage, 'pooled_connection', db.pooled_connection)
+    return db
+
+
+def object_body(data):
+    return {'Body': StreamingBody(io.BytesIO(data), len(data))}
+
+
+def test_get_file_retries_once_after_a_stale_cached_key(storage, db):
+    # Cached before the solution's ORI1 was replaced
+    s3_storage._cache_file_key(7, 'ori1', 'old.bin', 'blobs/aa/aa')
+    storage.stubber.add_client_error('get_object', 'NoSuchKey', expected_params={'Bucket': 'bucket', 'Key': 'blobs/aa/aa'})
+    storage.stubber.add_response('get_object', object_body(b'new file'), {'Bucket': 'bucket', 'Key': 'blobs/bb/bb'})
+
+    assert storage.get_file(7, 'ori1') == ('new.bin', b'new file')
+    assert db.queries == 1
+    assert s3_storage._cached_file_key(7, 'ori1') == ('new.bin', 'blobs/bb/bb')
+
+
+def test_get_file_gives_up_when_metadata_has_the_same_key(storage, db):
+    storage.stubber.add_client_error('get_object', 'NoSuchKey', expected_params={'Bucket': 'bucket', 'Key': 'blobs/bb/bb'})
+
+    assert storage.get_file(7, 'ori1') == (None, None)
+    assert db.queries == 2
+    assert s3_storage._cached_file_key(7, 'ori1') is None
+
+
+def test_get_file_does_not_retry_explicit_keys(storage, db):
+    storage.stubber.add_client_error('get_object', 'NoSuchKey', expected_params={'Bucket': 'bucket', 'Key': 'solutions/temp_1/ori1/a.bin'})
+
+    assert storage.get_file('temp_1', 'ori1', 'solutions/temp_1/ori1/a.bin') == (None, None)
+    assert db.queries == 0
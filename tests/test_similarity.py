@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler
+
+Z95 = 1.959963984540054
+
+
+@pytest.fixture
+def handler():
+    handler = BinaryHandler()
+    handler.set_read_size(8)
+    return handler
+
+
+def with_similarity(size, share, seed=0):
+    """Two files whose words are equal at exactly ``share`` of the positions, at random."""
+    rng = np.random.default_rng(seed)
+    file1 = rng.integers(0, 256, size, dtype=np.uint8)
+    file2 = file1.copy()
+    changed = rng.choice(size, int(round(size * (1 - share))), replace=False)
+    file2[changed] ^= 0xFF
+    return file1, file2
+
+
+def test_wilson_interval_at_the_extremes(handler):
+    n = 100
+    file1 = np.zeros(100000, dtype=np.uint8)
+
+    same = handler.estimate_similarity(file1, file1.copy(), sample_size=n, seed=1)
+    assert same['estimated']
+    assert same['similarity_percentage'] == 100.0
+    assert same['confidence_interval'] == [round(n / (n + Z95 ** 2) * 100, 2), 100.0]
+
+    different = handler.estimate_similarity(file1, file1 + 1, sample_size=n, seed=1)
+    assert different['similarity_percentage'] == 0.0
+    assert different['confidence_interval'] == [0.0, round(Z95 ** 2 / (n + Z95 ** 2) * 100, 2)]
+
+
+def test_wilson_interval_known_value(handler, monkeypatch):
+    # 50 matches out of 100 at 95%: (0.4038, 0.5962)
+    file1 = np.zeros(1000, dtype=np.uint8)
+    file2 = np.zeros(1000, dtype=np.uint8)
+    file2[1::2] = 1
+
+    class Alternating:
+        def integers(self, low, high, size):
+            return np.arange(size)
+
+    monkeypatch.setattr(np.random, 'default_rng', lambda seed=None: Alternating())
+    result = handler.estimate_similarity(file1, file2, sample_size=100)
+
+    assert result['similarity_percentage'] == 50.0
+    assert result['confidence_interval'] == [40.38, 59.62]
+
+
+def test_wilson_interval_covers_true_similarity(handler):
+    file1, file2 = with_similarity(200000, 0.8)
+
+    covered = 0
+    for seed in range(200):
+        low, high = handler.estimate_similarity(file1, file2, sample_size=500, seed=seed)['confidence_interval']
+        covered += low <= 80.0 <= high
+
+    assert covered >= 180
+
+
+def test_wider_confidence_gives_wider_interval(handler):
+    file1, file2 = with_similarity(100000, 0.7)
+
+    narrow = handler.estimate_similarity(file1, file2, sample_size=1000, confidence=0.8, seed=3)
+    wide = handler.estimate_similarity(file1, file2, sample_size=1000, confidence=0.99, seed=3)
+
+    assert narrow['similarity_percentage'] == wide['similarity_percentage']
+    assert wide['confidence_interval'][0] < narrow['confidence_interval'][0]
+    assert wide['confidence_interval'][1] > narrow['confidence_interval'][1]
+
+
+def test_estimate_is_scaled_by_size_difference(handler):
+    file1 = np.zeros(100000, dtype=np.uint8)
+    file2 = np.zeros(200000, dtype=np.uint8)
+
+    result = handler.estimate_similarity(file1, file2, sample_size=100, seed=1)
+
+    assert result['similarity_percentage'] == 50.0
+    assert result['confidence_interval'][1] == 50.0
+    assert not result['size_match']
+
+
+def test_sample_covering_the_file_falls_back_to_exact(handler):
+    file1, file2 = with_similarity(1000, 0.9)
+
+    result = handler.estimate_similarity(file1, file2, sample_size=1000)
+
+    assert result['estimated'] is False
+    assert result['similarity_percentage'] == 90.0
+    assert 'confidence_interval' not in result
+
+
+def test_early_exit_bounds_contain_exact_similarity(handler):
+    file1, file2 = with_similarity(4 * 1024 * 1024, 0.3)
+    exact = handler.calculate_similarity(file1, file2)['similarity_percentage']
+
+    result = handler.calculate_similarity(file1, file2, threshold=70)
+
+    assert result['early_exit']
+    assert result['meets_threshold'] is False
+    assert result['compared_bytes'] < len(file1)
+    low, high = result['similarity_bounds']
+    assert low <= exact <= high < 70
+    # Counts and percentage describe the compared prefix only
+    assert result['total_bytes'] == result['compared_bytes']
+    assert result['similarity_percentage'] == round(result['identical_bytes'] / result['total_bytes'] * 100, 2)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from app.utils.binary_handler import BinaryHandler, STRUCTURE_BLOCK_BYTES
+
+
+def baseline_structure_similarity(file1_data, file2_data):
+    """Structure score as computed before per-word-size wrapping (8-bit only)."""
+    diff1 = np.diff(np.asarray(file1_data, dtype=np.int64))
+    diff2 = np.diff(np.asarray(file2_data, dtype=np.int64))
+    diff1 = np.where(diff1 < -128, diff1 + 256, np.where(diff1 > 127, diff1 - 256, diff1))
+    diff2 = np.where(diff2 < -128, diff2 + 256, np.where(diff2 > 127, diff2 - 256, diff2))
+    return np.count_nonzero(np.abs(diff1 - diff2) <= 1) / (len(file1_data) - 1) * 95
+
+
+def handler_for(bit_size):
+    handler = BinaryHandler()
+    handler.set_read_size(bit_size)
+    return handler
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_8bit_matches_baseline(seed):
+    rng = np.random.default_rng(seed)
+    file1 = rng.integers(0, 256, 300000, dtype=np.uint8)
+    file2 = file1.copy()
+    noisy = rng.choice(len(file1), 100000, replace=False)
+    file2[noisy] = rng.integers(0, 256, len(noisy), dtype=np.uint8)
+    # Extremes, where the wrapping matters
+    file1[:64] = [0, 255] * 32
+    file2[:64] = [255, 0] * 32
+
+    result = handler_for(8)._structure_similarity(file1, file2)
+
+    assert result['similarity'] == pytest.approx(baseline_structure_similarity(file1, file2))
+
+
+def test_constant_offset_still_matches():
+    rng = np.random.default_rng(0)
+    file1 = rng.integers(0, 1 << 16, 50000, dtype=np.uint16)
+    shifted = file1 + np.uint16(40000)  # wraps around 2**16
+
+    result = handler_for(16)._structure_similarity(file1, shifted)
+
+    assert result['similarity'] == pytest.approx(95)
+
+
+def test_blocks_cover_the_file_and_average_to_the_total():
+    rng = np.random.default_rng(1)
+    region = STRUCTURE_BLOCK_BYTES // 2  # words per region
+    words = 2 * region + region // 2
+    file1 = rng.integers(0, 1 << 16, words, dtype=np.uint16)
+    file2 = file1.copy()
+    # Only the second region diverges
+    file2[region:2 * region] = rng.integers(0, 1 << 16, region, dtype=np.uint16)
+
+    result = handler_for(16)._structure_similarity(file1, file2)
+    blocks = result['blocks']
+
+    assert [block['offset'] for block in blocks] == [0, STRUCTURE_BLOCK_BYTES, 2 * STRUCTURE_BLOCK_BYTES]
+    # Its first delta (across the boundary) is counted in the first region
+    assert blocks[0]['similarity'] == pytest.approx(95, abs=0.01)
+    assert blocks[1]['similarity'] < 5
+    assert blocks[2]['similarity'] == 95
+
+    sizes = np.array([region, region, words - 1 - 2 * region])
+    weighted = np.dot(sizes, [block['similarity'] for block in blocks]) / sizes.sum()
+    assert result['similarity'] == pytest.approx(weighted, abs=0.01)
+
+
+def test_single_word_files_have_no_structure():
+    assert handler_for(8)._structure_similarity(np.array([1], dtype=np.uint8), np.array([1], dtype=np.uint8)) == \
+        {'similarity': 0, 'blocks': []}
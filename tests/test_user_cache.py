@@ -0,0 +1,105 @@
+import time
+from unittest import mock
+
+import jwt
+import pytest
+from flask import Flask, session
+
+from app.auth import user_cache as user_cache_module
+from app.auth.supabase_client import SupabaseAuthClient
+from app.auth.user_cache import UserCache, user_cache, token_expiry
+
+SECRET = 'test-secret-0123456789abcdef0123456789'
+
+
+def make_token(exp, secret=SECRET, sub='user-1'):
+    return jwt.encode({'sub': sub, 'exp': exp}, secret, algorithm='HS256')
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    user_cache.configure(16, 300)
+    yield
+    user_cache.clear()
+
+
+@pytest.fixture
+def client():
+    client = SupabaseAuthClient()
+    client.jwt_secret = SECRET
+    client.supabase = mock.Mock()
+    client.get_user = mock.Mock(side_effect=lambda token: {'id': jwt.decode(token, options={'verify_signature': False})['sub']})
+    return client
+
+
+def test_token_expiry_validates_signature_and_exp():
+    exp = int(time.time()) + 600
+    assert token_expiry(make_token(exp), SECRET) == exp
+    assert token_expiry(make_token(exp, secret='other-secret-0123456789abcdef012345'), SECRET) is None
+    assert token_expiry(make_token(int(time.time()) - 1), SECRET) is None
+    # Without a secret only exp is checked
+    assert token_expiry(make_token(exp, secret='other-secret-0123456789abcdef012345')) == exp
+    assert token_expiry('not-a-token', SECRET) is None
+
+
+def test_get_cached_user_fetches_once(client):
+    token = make_token(int(time.time()) + 600)
+
+    assert client.get_cached_user(token) == {'id': 'user-1'}
+    assert client.get_cached_user(token) == {'id': 'user-1'}
+    assert client.get_user.call_count == 1
+
+
+def test_get_cached_user_rejects_expired_token_locally(client):
+    assert client.get_cached_user(make_token(int(time.time()) - 1)) is None
+    client.get_user.assert_not_called()
+
+
+def test_entry_expires_with_ttl_or_token(client):
+    now = time.time()
+    token = make_token(int(now) + 60)
+    client.get_cached_user(token)
+
+    # The token expires before the 300 s TTL: the entry goes with it
+    with mock.patch.object(user_cache_module.time, 'time', return_value=now + 61):
+        assert user_cache.get(token) is None
+
+    long_token = make_token(int(now) + 3600, sub='user-2')
+    client.get_cached_user(long_token)
+    with mock.patch.object(user_cache_module.time, 'time', return_value=now + 299):
+        assert user_cache.get(long_token) == {'id': 'user-2'}
+    with mock.patch.object(user_cache_module.time, 'time', return_value=now + 301):
+        assert user_cache.get(long_token) is None
+
+
+def test_sign_out_invalidates_cached_user(client):
+    token = make_token(int(time.time()) + 600)
+    client.get_cached_user(token)
+
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    with app.test_request_context():
+        session['access_token'] = token
+        client.sign_out()
+
+    assert user_cache.get(token) is None
+    client.get_cached_user(token)
+    assert client.get_user.call_count == 2
+
+
+def test_lru_evicts_oldest_entry():
+    cache = UserCache(max_size=2, ttl=300)
+    cache.set('a', {'id': 'a'})
+    cache.set('b', {'id': 'b'})
+    cache.get('a')
+    cache.set('c', {'id': 'c'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'id': 'a'}
+    assert cache.get('c') == {'id': 'c'}
+
+
+def test_disabled_cache_stores_nothing():
+    cache = UserCache(max_size=0, ttl=300)
+    cache.set('a', {'id': 'a'})
+    assert cache.get('a') is None